@@ -0,0 +1,101 @@
+"""Measures how long decoding responses stalls the event loop, inline and on a thread or process pool.
+
+Run from the repository root:
+
+    python benchmarks/decode.py [--runs 20]
+
+For each page size, a heartbeat task that wakes up every millisecond runs next to the decoding, and its worst and
+median lateness is reported together with the median latency of a page, for decoding inline, on a
+:class:`ThreadPoolExecutor` and on a :class:`ProcessPoolExecutor`. The lateness is what every other coroutine waits
+for. The default ``offload_threshold`` of :class:`HTTPClient` is based on these results.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from njuns.http import _decode_json
+from njuns.models.entity import entities_from_json
+
+HEARTBEAT: float = 0.001
+
+
+def page(entities: int, fields: int) -> bytes:
+    return json.dumps(
+        [
+            {
+                "_entity_name": "njuns$TicketWallEntry",
+                "_instance_name": f"entry {i}",
+                "id": str(uuid.uuid4()),
+                "version": i,
+                **{f"field{f}": f"value {f} of entity {i}" for f in range(fields)},
+                "ticket": {"_entity_name": "njuns$Ticket", "id": str(uuid.uuid4()), "ticketNumber": str(i)},
+            }
+            for i in range(entities)
+        ]
+    ).encode()
+
+
+async def heartbeat(lags: List[float]) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(HEARTBEAT)
+        lags.append(loop.time() - start - HEARTBEAT)
+
+
+async def measure(body: bytes, executor: Optional[Executor], runs: int) -> Tuple[float, float, float]:
+    """Decodes ``body`` ``runs`` times while the heartbeat ticks.
+
+    :return: The median latency of a page, and the worst and median heartbeat lateness, in seconds.
+    """
+    loop = asyncio.get_running_loop()
+    lags: List[float] = []
+    beat = asyncio.create_task(heartbeat(lags))
+    await asyncio.sleep(HEARTBEAT * 2)
+    lags.clear()
+
+    samples: List[float] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        if executor is None:
+            _decode_json(body, entities_from_json)
+        else:
+            await loop.run_in_executor(executor, _decode_json, body, entities_from_json)
+        samples.append(time.perf_counter() - start)
+        # Lets the heartbeat catch up, so each stall is measured on its own
+        await asyncio.sleep(HEARTBEAT * 2)
+
+    beat.cancel()
+    lags = lags or [0.0]
+    return statistics.median(samples), max(lags), statistics.median(lags)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    executors = {"inline": None, "thread": ThreadPoolExecutor(1), "process": ProcessPoolExecutor(1)}
+    for executor in executors.values():
+        if executor is not None:
+            await measure(page(1, 1), executor, 3)  # warm up the worker
+
+    print(f"{'bytes':>10} {'executor':>9} {'page latency':>14} {'worst loop lag':>16} {'median loop lag':>17}")
+    for entities, fields in ((1, 5), (10, 10), (50, 10), (50, 40), (50, 150), (50, 600)):
+        body = page(entities, fields)
+        for name, executor in executors.items():
+            latency, worst, median = await measure(body, executor, args.runs)
+            print(f"{len(body):>10} {name:>9} {latency * 1000:>11.3f} ms {worst * 1000:>13.3f} ms {median * 1000:>14.3f} ms")
+
+    for executor in executors.values():
+        if executor is not None:
+            executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+"""Measures the startup cost of the library for short-lived processes.
+
+Run from the repository root:
+
+    python benchmarks/startup.py [--runs N]
+
+It reports the wall time of ``import njuns`` and of the first ``NJUNSClient`` construction in fresh interpreters,
+and the time of constructing further clients in the same process. For a per-module breakdown, run
+``python -X importtime -c "import njuns"``.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+IMPORT_ONLY = "import time; t = time.perf_counter(); import njuns; print(time.perf_counter() - t)"
+FIRST_CLIENT = "import time; t = time.perf_counter(); import njuns; njuns.NJUNSClient(); print(time.perf_counter() - t)"
+
+
+def fresh_interpreter(code: str, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def repeated_construction(count: int) -> float:
+    import njuns
+
+    njuns.NJUNSClient()
+    start = time.perf_counter()
+    for _ in range(count):
+        njuns.NJUNSClient()
+    return (time.perf_counter() - start) / count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters per measurement")
+    args = parser.parse_args()
+
+    print(f"import njuns:                 {fresh_interpreter(IMPORT_ONLY, args.runs) * 1000:8.2f} ms (median)")
+    print(f"import + first NJUNSClient(): {fresh_interpreter(FIRST_CLIENT, args.runs) * 1000:8.2f} ms (median)")
+    print(f"each further NJUNSClient():   {repeated_construction(1000) * 1e6:8.2f} us (mean of 1000)")
+
+
+if __name__ == "__main__":
+    main()
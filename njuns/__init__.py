@@ -1,7 +1,54 @@
-from .client import NJUNSClient
-from .routes.entities import (
-    EntitySearchOperator,
-    EntitySearchGroup,
-    EntitySearchCondition,
-    Entity
-)
+import logging
+from importlib import import_module
+from typing import Any, Dict, List
+
+# Submodules are only imported when one of their names is first accessed, so that ``import njuns`` does not pull in
+# aiohttp and every route module up front. See ``benchmarks/startup.py``.
+_LAZY_ATTRIBUTES: Dict[str, str] = {
+    "NJUNSClient": ".client",
+    "EntitySearchOperator": ".routes.entities",
+    "EntitySearchGroup": ".routes.entities",
+    "EntitySearchCondition": ".routes.entities",
+    "Entity": ".models.entity",
+    "FileDescriptor": ".models.file_descriptor",
+    "EntityFrame": ".models.entity_frame",
+    "Priority": ".scheduler",
+    "RequestScheduler": ".scheduler",
+    "setup_logging": ".utils",
+    "TokenStore": ".token_store",
+    "FileTokenStore": ".token_store",
+    "SQLiteTokenStore": ".token_store",
+    "RateLimiter": ".ratelimit",
+    "LocalRateLimiter": ".ratelimit",
+    "SQLiteRateLimiter": ".ratelimit",
+    "PreparedQuery": ".prepared_query",
+    "SearchBatcher": ".batcher",
+    "Outbox": ".outbox",
+    "OutboxEntry": ".outbox",
+    "OutboxStatus": ".outbox",
+    "OutboxStore": ".outbox",
+    "SQLiteOutboxStore": ".outbox",
+    "EntityIndex": ".evaluator",
+    "filter_entities": ".evaluator",
+    "deadline": ".timeouts",
+    "DeadlineExceeded": ".exceptions",
+}
+
+__all__ = tuple(_LAZY_ATTRIBUTES)
+
+# The library does not emit log records anywhere unless the application, or setup_logging, configures a handler.
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -0,0 +1,336 @@
+import asyncio
+import json
+import logging
+import re
+from contextvars import ContextVar, Token
+from logging import Logger
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .evaluator import _key, _kind, _lookup, compile_conditions
+from .models.entity import Entity
+from .route import Route
+from .scheduler import Priority
+from .timeouts import _current_deadline, wait_shared
+from .utils import MISSING
+
+_log: Logger = logging.getLogger(__name__)
+
+_current_batcher: ContextVar[Optional["SearchBatcher"]] = ContextVar("njuns_search_batcher", default=None)
+
+# (entity name, view, sort, return nulls, priority)
+_BatchKey = Tuple[str, Optional[str], Optional[str], bool, Priority]
+
+# Operators whose local evaluation matches the server. String operators may differ in case handling, and range
+# comparisons are only merged for numbers, whose order does not depend on a date or text format.
+_MERGEABLE_OPERATORS = frozenset(("=", "<>", "in", "notin", "notEmpty"))
+_NUMERIC_OPERATORS = frozenset(("<", "<=", ">", ">="))
+# Operators comparing values for equality, whose values must compare with the JSON values of the rows as they are
+_EQUALITY_OPERATORS = frozenset(("=", "<>", "in", "notin"))
+
+# Strings the server may convert before comparing, ex. to a number, date or UUID, so they can match a JSON value that
+# is not the same string
+_DATE_LIKE = re.compile(r"^\d{1,4}[-./:]\d")
+_UUID_LIKE = re.compile(r"^[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}$")
+_CANONICAL_UUID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+# The amount of rows the server returns for a search without a limit
+_DEFAULT_LIMIT = 50
+
+
+def current_search_batcher() -> Optional["SearchBatcher"]:
+    """Returns the :class:`SearchBatcher` active in the current context, if any."""
+    return _current_batcher.get()
+
+
+def _exact(value: Any) -> bool:
+    """Whether a condition value can only match a JSON value equal to it, without a conversion by the server."""
+    if isinstance(value, (bool, int, float)):
+        return True
+    if not isinstance(value, str):
+        # None, dates, entities and other objects are sent in a form that differs from the rows
+        return False
+    if _UUID_LIKE.match(value):
+        return _CANONICAL_UUID.match(value) is not None
+    if value.lower() in ("true", "false") or _DATE_LIKE.match(value):
+        return False
+    try:
+        float(value)
+    except ValueError:
+        return True
+    return False
+
+
+def _mergeable(conditions: List[Any]) -> bool:
+    for condition in conditions:
+        if condition.group:
+            if not _mergeable(condition.conditions or []):
+                return False
+            continue
+        op = getattr(condition.operator, "value", condition.operator)
+        if op in _EQUALITY_OPERATORS:
+            values = condition.value if op in ("in", "notin") else [condition.value]
+            if isinstance(values, (str, bytes)) or not all(_exact(v) for v in values):
+                return False
+            continue
+        if op in _MERGEABLE_OPERATORS:
+            continue
+        if op in _NUMERIC_OPERATORS and isinstance(condition.value, (int, float)) and not isinstance(condition.value, bool):
+            continue
+        return False
+    return True
+
+
+def _properties(conditions: List[Any]) -> Set[str]:
+    """Returns the property paths, ex. ``ticket.status``, a condition tree filters on."""
+    paths: Set[str] = set()
+    for condition in conditions:
+        if condition.group:
+            paths |= _properties(condition.conditions or [])
+        else:
+            paths.add(condition.property)
+    return paths
+
+
+def _kinds(conditions: List[Any]) -> List[Tuple[str, Set[Any]]]:
+    """Returns the property paths compared for equality with the kinds of values, ex. strings, they are compared with."""
+    kinds: List[Tuple[str, Set[Any]]] = []
+    for condition in conditions:
+        if condition.group:
+            kinds += _kinds(condition.conditions or [])
+            continue
+        op = getattr(condition.operator, "value", condition.operator)
+        if op in _EQUALITY_OPERATORS:
+            values = condition.value if op in ("in", "notin") else [condition.value]
+            kinds.append((condition.property, {_kind(v) for v in values}))
+    return kinds
+
+
+class _Search:
+    """One distinct search waiting in a batch, shared by every caller that sent the same conditions and limit."""
+
+    __slots__ = ("conditions", "limit", "future", "predicate", "properties", "kinds", "mismatched", "rows")
+
+    def __init__(self, conditions: List[Any], limit: int, future: asyncio.Future) -> None:
+        self.conditions: List[Any] = conditions
+        self.limit: int = limit
+        self.future: asyncio.Future = future
+        self.predicate = compile_conditions(conditions, sql_nulls=True)
+        self.properties: Set[str] = _properties(conditions)
+        self.kinds: List[Tuple[str, Set[Any]]] = _kinds(conditions)
+        # Whether a row holds a value of another type than a condition compares it with, ex. a number for a string
+        self.mismatched: bool = False
+        self.rows: List[Dict[str, Any]] = []
+
+    @property
+    def satisfied(self) -> bool:
+        return len(self.rows) >= self.limit
+
+
+class SearchBatcher:
+    """Merges ``search_entities`` calls made within a short delay into one OR-grouped search per entity type.
+
+    While a batcher is active (``async with client.search_batcher():``), compatible searches from any coroutine in
+    that context are collected, sent as a single search whose filter is the OR of their conditions, and paged through
+    until every caller has its rows. Each caller receives only the rows matching its own conditions, evaluated locally
+    with :func:`compile_conditions`, in the server's order and up to its own ``limit``, or the 50 rows the server
+    returns by default.
+
+    Searches are merged if they share the entity, view, sort and ``return_nulls``, use no ``offset``, ``return_count``
+    or ``dynamic_attributes``, and only use operators whose local evaluation matches the server: ``=``, ``<>``,
+    ``in``, ``notin``, ``notEmpty``, and ranges over numbers. Values are compared with the JSON values of the rows as
+    they are, so searches for values the server converts first, ex. numeric strings, dates, booleans given as strings or
+    UUIDs in upper case, are sent as usual, like other searches. A caller filtering on a property path that no returned
+    row holds, ex. a field of a reference loaded with the ``_minimal`` view, or on a property whose values turn out to
+    have another type than the condition value, is sent its own search. So is a caller whose rows exceed ``max_rows``,
+    and, unless the searches are sorted, a caller whose rows reach its limit, as the rows that fill the limit of an
+    unsorted search depend on the query the server runs. Pass a ``sort`` to merge searches expected to fill their limit.
+
+    Each caller waits for its rows within its own :func:`njuns.deadline` and the client timeout. The merged request
+    itself is sent without the deadline of the caller that happened to start the batch.
+    """
+
+    def __init__(self, client: Any, *, delay: float = 0.002, max_batch: int = 20, page_size: int = 50, max_rows: int = 5000) -> None:
+        """Initializes a batcher.
+
+        :param client: The :class:`HTTPClient` to send the searches with.
+        :param delay: How long, in seconds, to collect searches before sending them.
+        :type delay: float
+        :param max_batch: The maximum amount of distinct searches merged into one request.
+        :type max_batch: int
+        :param page_size: The amount of rows per page of a merged search. Capped at the page limit of 50.
+        :type page_size: int
+        :param max_rows: The maximum amount of rows paged through for one merged search.
+        :type max_rows: int
+        """
+        self.client: Any = client
+        self.delay: float = delay
+        self.max_batch: int = max_batch
+        self.page_size: int = min(page_size, 50)
+        self.max_rows: int = max_rows
+        self.__pending: Dict[_BatchKey, Dict[str, _Search]] = {}
+        self.__flush_handle: Optional[asyncio.TimerHandle] = None
+        self.__tasks: Set[asyncio.Task] = set()
+        self.__token: Optional[Token] = None
+
+    async def __aenter__(self) -> "SearchBatcher":
+        self.__token = _current_batcher.set(self)
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        _current_batcher.reset(self.__token)
+        self.__token = None
+        self.__flush()
+        if self.__tasks:
+            await asyncio.gather(*self.__tasks, return_exceptions=True)
+
+    @staticmethod
+    def accepts(conditions: List[Any]) -> bool:
+        """Whether searches with these conditions can be merged."""
+        return bool(conditions) and _mergeable(conditions)
+
+    async def search(
+        self,
+        entity_name: str,
+        conditions: List[Any],
+        *,
+        view: Optional[str] = MISSING,
+        limit: Optional[int] = MISSING,
+        sort: Optional[str] = MISSING,
+        return_nulls: Optional[bool] = MISSING,
+        priority: Priority = Priority.NORMAL,
+    ) -> List[Entity]:
+        """Searches for entities as part of the next batch. See :meth:`EntitiesRoute.search_entities`.
+
+        :raises ValueError: The conditions cannot be merged, see :meth:`accepts`.
+        """
+        if not self.accepts(conditions):
+            raise ValueError("Conditions cannot be merged into a batched search")
+        key: _BatchKey = (entity_name, view or None, sort or None, bool(return_nulls), priority)
+        limit = limit if isinstance(limit, int) else _DEFAULT_LIMIT
+        identity = json.dumps([[c.as_dict for c in conditions], limit], sort_keys=True, default=str)
+
+        searches = self.__pending.setdefault(key, {})
+        search = searches.get(identity)
+        if search is None:
+            search = _Search(conditions, limit, asyncio.get_running_loop().create_future())
+            searches[identity] = search
+            if len(searches) >= self.max_batch:
+                self.__flush()
+            elif self.__flush_handle is None:
+                self.__flush_handle = asyncio.get_running_loop().call_later(self.delay, self.__flush)
+        # Bounded by this caller's deadline, without cancelling the result shared with other callers
+        route = Route("POST", "/entities/{}/search".format(entity_name))
+        rows: List[Dict[str, Any]] = await wait_shared(search.future, route, timeout=self.client.timeout)
+        # Every caller gets its own entities, so changes made by one are not seen by another
+        return [Entity(**row) for row in rows]
+
+    def __flush(self) -> None:
+        if self.__flush_handle is not None:
+            self.__flush_handle.cancel()
+            self.__flush_handle = None
+        pending, self.__pending = self.__pending, {}
+        for key, searches in pending.items():
+            task = asyncio.get_running_loop().create_task(self.__dispatch(key, list(searches.values())))
+            self.__tasks.add(task)
+            task.add_done_callback(self.__tasks.discard)
+
+    async def __dispatch(self, key: _BatchKey, searches: List[_Search]) -> None:
+        # Searches sent from here must not be batched again, and are not bound by the deadline of the caller whose
+        # context started the flush timer; every caller enforces its own deadline while waiting.
+        _current_batcher.set(None)
+        _current_deadline.set(None)
+        try:
+            if len(searches) == 1:
+                await self.__send_alone(key, searches[0])
+                return
+            await self.__send_merged(key, searches)
+        except BaseException as e:
+            for search in searches:
+                if search.future.done():
+                    continue
+                if isinstance(e, asyncio.CancelledError):
+                    search.future.cancel()
+                else:
+                    search.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+
+    async def __send_alone(self, key: _BatchKey, search: _Search) -> None:
+        entity_name, view, sort, return_nulls, priority = key
+        entities: List[Entity] = await self.client.search_entities(
+            entity_name,
+            search.conditions,
+            view=view or MISSING,
+            limit=search.limit,
+            sort=sort or MISSING,
+            return_nulls=return_nulls or MISSING,
+            priority=priority,
+        )
+        if not search.future.done():
+            search.future.set_result([e.json for e in entities])
+
+    async def __send_merged(self, key: _BatchKey, searches: List[_Search]) -> None:
+        entity_name, view, sort, return_nulls, priority = key
+        _log.debug(f"Merging {len(searches)} {entity_name} searches into one")
+        groups = [
+            s.conditions[0].as_dict if len(s.conditions) == 1 else {"group": "AND", "conditions": [c.as_dict for c in s.conditions]}
+            for s in searches
+        ]
+        json_body: dict = {"filter": {"conditions": [{"group": "OR", "conditions": groups}]}, "limit": self.page_size}
+        if view:
+            json_body["view"] = view
+        if sort:
+            json_body["sort"] = sort
+        if return_nulls:
+            json_body["nulls"] = return_nulls
+
+        # Property paths held by at least one row, so the local evaluation of conditions on them can be trusted
+        paths: Set[str] = set().union(*(s.properties for s in searches))
+        seen: Set[str] = set()
+        offset = 0
+        complete = False
+        while offset < self.max_rows:
+            json_body["offset"] = offset
+            page: List[Dict[str, Any]] = await self.client.request(
+                Route("POST", "/entities/{}/search".format(entity_name)), json=json_body, priority=priority
+            )
+            for row in page:
+                if len(seen) < len(paths):
+                    seen.update(p for p in paths - seen if _lookup(row, p) is not None)
+                for search in searches:
+                    if search.mismatched:
+                        continue
+                    for path, kinds in search.kinds:
+                        actual = _key(_lookup(row, path))
+                        if actual is not None and _kind(actual) not in kinds:
+                            # The server may convert the condition value, so local evaluation cannot be trusted
+                            search.mismatched = True
+                            break
+                    else:
+                        if not search.satisfied and search.predicate(row):
+                            search.rows.append(row)
+            offset += len(page)
+            if len(page) < self.page_size:
+                complete = True
+                break
+            if all(s.satisfied or s.mismatched for s in searches):
+                break
+
+        fallback: List[_Search] = []
+        for search in searches:
+            if offset and not search.properties <= seen:
+                # A filtered property is not in the view, or null in every row, so the rows cannot be told apart
+                fallback.append(search)
+            elif search.mismatched:
+                fallback.append(search)
+            elif not sort and search.satisfied:
+                # Without a sort, which rows fill the limit depends on the plan the server picks for the merged query
+                fallback.append(search)
+            elif not complete and not search.satisfied:
+                fallback.append(search)
+            else:
+                search.future.set_result(search.rows[:search.limit])
+
+        if fallback:
+            _log.debug(f"Sending {len(fallback)} {entity_name} searches on their own")
+            await asyncio.gather(*(self.__send_alone(key, s) for s in fallback))
@@ -1,9 +1,13 @@
 import logging
+from concurrent.futures import Executor
 from logging import Logger
+from typing import Dict, Optional
 
-from .http import HTTPClient
+from .http import DEFAULT_COMPRESS_THRESHOLD, DEFAULT_OFFLOAD_THRESHOLD, HTTPClient
 from .models.user import UserInfo
-from .route import _set_api_environment
+from .ratelimit import RateLimiter
+from .route import api_base_url
+from .token_store import TokenStore
 from .utils import MISSING, setup_logging
 
 _log: Logger = logging.getLogger(__name__)
@@ -15,12 +19,90 @@ class NJUNSClient(HTTPClient):
     The NJUNS OAuth Client that handles the current session and authentication as well as requests to endpoints.
     """
 
-    def __init__(self, *, log_level: int = logging.INFO) -> None:
-        """Represents a client connection that connects to NJUNS."""
-        setup_logging(level=log_level)
-        super().__init__()
+    def __init__(
+        self,
+        *,
+        log_level: Optional[int] = MISSING,
+        base_url: Optional[str] = MISSING,
+        max_concurrency: int = 64,
+        route_limits: Optional[Dict[str, int]] = None,
+        query_catalog_ttl: float = 300.0,
+        validate_requests: bool = False,
+        metadata_cache_path: Optional[str] = None,
+        token_store: Optional[TokenStore] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        decode_executor: Optional[Executor] = None,
+        offload_threshold: int = DEFAULT_OFFLOAD_THRESHOLD,
+        compression: bool = False,
+        compress_threshold: int = DEFAULT_COMPRESS_THRESHOLD,
+        timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+    ) -> None:
+        """Represents a client connection that connects to NJUNS.
+
+        :param log_level: If given, installs a log handler at this level with :func:`setup_logging`.
+                By default the client leaves logging configuration to the application.
+        :type log_level: Optional[int]
+        :param base_url: The API environment of this client, see :func:`api_base_url`. Defaults to production.
+        :type base_url: Optional[str]
+        :param max_concurrency: The maximum amount of requests in flight, shared by every priority class.
+        :type max_concurrency: int
+        :param route_limits: Per-route concurrency caps keyed by path prefix, ex. ``{"/entities/njuns$Ticket": 4}``.
+        :type route_limits: Optional[Dict[str, int]]
+        :param query_catalog_ttl: How long, in seconds, a cached predefined query catalog is reused.
+        :type query_catalog_ttl: float
+        :param validate_requests: Whether to check views, sorts, filters and updated fields against the entity metadata before sending requests.
+        :type validate_requests: bool
+        :param metadata_cache_path: A file to persist the entity metadata to, so it is not fetched again by every process.
+        :type metadata_cache_path: Optional[str]
+        :param token_store: A store to persist the session in, so that restarted processes and other processes on the
+                same host reuse or refresh it instead of logging in again. See :class:`FileTokenStore` and :class:`SQLiteTokenStore`.
+        :type token_store: Optional[TokenStore]
+        :param rate_limiter: Paces the requests of this client, see :class:`LocalRateLimiter` and :class:`SQLiteRateLimiter`.
+                Share one limiter between clients, or one database between processes, to stay under an account-wide limit.
+        :type rate_limiter: Optional[RateLimiter]
+        :param decode_executor: A thread or process pool that decodes large responses and builds their entities,
+                so the event loop stays responsive. By default everything is decoded on the event loop.
+        :type decode_executor: Optional[concurrent.futures.Executor]
+        :param offload_threshold: The response size in bytes from which decoding moves to ``decode_executor``.
+        :type offload_threshold: int
+        :param compression: Whether to request gzip, deflate, and if installed brotli and zstd responses, and to gzip JSON
+                request bodies of at least ``compress_threshold`` bytes. Bytes per route are counted in :attr:`transfer_stats`.
+        :type compression: bool
+        :param compress_threshold: The request body size in bytes from which bodies are compressed.
+        :type compress_threshold: int
+        :param timeout: The default time budget in seconds of each request, including its retries. Can be overridden per
+                call, and is shortened by an enclosing :func:`njuns.deadline` block.
+        :type timeout: Optional[float]
+        :param connect_timeout: How long, in seconds, a single attempt may take to connect. Defaults to 30.
+        :type connect_timeout: Optional[float]
+        :param read_timeout: How long, in seconds, a single attempt may wait for more response data.
+        :type read_timeout: Optional[float]
+        """
+        if log_level is not MISSING:
+            setup_logging(level=log_level)
+        super().__init__(
+            base_url=base_url,
+            max_concurrency=max_concurrency,
+            route_limits=route_limits,
+            token_store=token_store,
+            rate_limiter=rate_limiter,
+            decode_executor=decode_executor,
+            offload_threshold=offload_threshold,
+            compression=compression,
+            compress_threshold=compress_threshold,
+            timeout=timeout,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+        )
+        self.query_catalog_ttl = query_catalog_ttl
+        self.validate_requests = validate_requests
+        self.metadata_cache_path = metadata_cache_path
 
         self.user_info: UserInfo = MISSING
+        # The environment this client used before a login switched it to UAT
+        self.__base_url_before_uat: Optional[str] = None
 
     async def login(
         self, *, username: str, password: str, use_uat_environment: bool = False
@@ -31,7 +113,8 @@ class NJUNSClient(HTTPClient):
         :type username: str
         :param password: The password to authenticate with.
         :type password: str
-        :param use_uat_environment: Whether to use UAT environment or stay on production.
+        :param use_uat_environment: Whether to switch this client to the UAT environment. Other clients are not affected.
+                A client switched to UAT by an earlier login returns to its previous environment if this is ``False``.
         :type use_uat_environment: bool
         :rtype: None
         """
@@ -44,8 +127,21 @@ class NJUNSClient(HTTPClient):
                 f"got username:{username.__class__.__name__}, password:{password.__class__.__name__} instead"
             )
 
+        uat_base_url = api_base_url(host="test.njuns.com", app="app2018")
         if use_uat_environment:
-            _set_api_environment(host="test.njuns.com", app="app2018")
+            if self.base_url != uat_base_url:
+                self.__base_url_before_uat = self.base_url
+                self.base_url = uat_base_url
+        elif self.__base_url_before_uat is not None:
+            if self.base_url == uat_base_url:
+                # Not changed since the earlier login switched it to UAT
+                self.base_url = self.__base_url_before_uat
+            self.__base_url_before_uat = None
+
+        if self.token_store is not None:
+            # Reuse or refresh a stored session if possible, the user info is stored along with it
+            self.user_info = await self._stored_login(username=username.strip(), password=password.strip())
+            return
 
         # Try to log in
         await self._static_login(username=username.strip(), password=password.strip())
@@ -0,0 +1,100 @@
+import gzip
+import logging
+import zlib
+from logging import Logger
+from typing import Optional
+
+_log: Logger = logging.getLogger(__name__)
+
+# Optional codecs, used when installed.
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def accept_encoding() -> str:
+    """Returns the ``Accept-Encoding`` header value for the codecs available in this environment."""
+    codings = ["gzip", "deflate"]
+    if brotli is not None:
+        codings.append("br")
+    if zstandard is not None:
+        codings.append("zstd")
+    return ", ".join(codings)
+
+
+def compress(body: bytes) -> bytes:
+    """Compresses a request body with gzip, which every server that accepts compressed bodies supports."""
+    return gzip.compress(body, compresslevel=6)
+
+
+def decompress(body: bytes, content_encoding: Optional[str]) -> bytes:
+    """Reverses the ``Content-Encoding`` of a response body.
+
+    :param body: The body as received.
+    :type body: bytes
+    :param content_encoding: The ``Content-Encoding`` header of the response, if any.
+    :type content_encoding: Optional[str]
+    :return: The decoded body.
+    :raises ValueError: The body uses a coding whose codec is not installed.
+    """
+    if not content_encoding:
+        return body
+    # Codings are listed in the order they were applied
+    for coding in reversed([c.strip().lower() for c in content_encoding.split(",")]):
+        if coding in ("", "identity"):
+            continue
+        if coding in ("gzip", "x-gzip"):
+            body = gzip.decompress(body)
+        elif coding == "deflate":
+            try:
+                body = zlib.decompress(body)
+            except zlib.error:
+                # Some servers send raw deflate streams without the zlib header
+                body = zlib.decompress(body, -zlib.MAX_WBITS)
+        elif coding == "br" and brotli is not None:
+            body = brotli.decompress(body)
+        elif coding == "zstd" and zstandard is not None:
+            body = zstandard.ZstdDecompressor().decompressobj().decompress(body)
+        else:
+            raise ValueError(f"Unsupported Content-Encoding {coding!r}")
+    return body
+
+
+class TransferStats:
+    """A class counting the bytes sent and received for one route, on the wire and before or after compression."""
+
+    __slots__ = ("requests", "sent", "sent_uncompressed", "received", "received_uncompressed")
+
+    def __init__(self):
+        self.requests: int = 0
+        self.sent: int = 0
+        self.sent_uncompressed: int = 0
+        self.received: int = 0
+        self.received_uncompressed: int = 0
+
+    def record(self, sent: int, sent_uncompressed: int, received: int, received_uncompressed: int) -> None:
+        self.requests += 1
+        self.sent += sent
+        self.sent_uncompressed += sent_uncompressed
+        self.received += received
+        self.received_uncompressed += received_uncompressed
+
+    @property
+    def saved(self) -> int:
+        """The amount of bytes compression kept off the wire."""
+        return self.sent_uncompressed - self.sent + self.received_uncompressed - self.received
+
+    def __repr__(self) -> str:
+        return (
+            f"<TransferStats requests={self.requests} sent={self.sent}/{self.sent_uncompressed} "
+            f"received={self.received}/{self.received_uncompressed}>"
+        )
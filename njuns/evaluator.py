@@ -0,0 +1,312 @@
+import logging
+from bisect import bisect_left, bisect_right
+from logging import Logger
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple, TYPE_CHECKING, Union
+
+from .models.entity import Entity
+from .models.entity_frame import EntityRow, _NULL_SAFE, _OPERATORS
+
+if TYPE_CHECKING:
+    from .routes.entities import EntitySearchCondition
+
+_log: Logger = logging.getLogger(__name__)
+
+Conditions = Union["EntitySearchCondition", Sequence["EntitySearchCondition"]]
+Predicate = Callable[[Any], bool]
+
+# Sorts after every string starting with a given prefix
+_PREFIX_END = "\U0010ffff"
+
+# Operators answered by each index kind
+_HASH_OPERATORS = frozenset(("=", "in"))
+_SORTED_OPERATORS = frozenset(("=", "in", "<", "<=", ">", ">=", "startsWith"))
+
+
+def _lookup(item: Any, path: str) -> Any:
+    """Reads a possibly dotted property path, ex. ``ticket.status``, from an entity, frame row or JSON object."""
+    value = item.json if isinstance(item, Entity) else item
+    for name in path.split("."):
+        if isinstance(value, Mapping):
+            value = value.get(name)
+        elif isinstance(value, EntityRow):
+            try:
+                value = value[name]
+            except KeyError:
+                return None
+        elif isinstance(value, Entity):
+            value = value.json.get(name)
+        else:
+            return None
+        if value is None:
+            return None
+    return value
+
+
+def _key(value: Any) -> Any:
+    """Reduces a referenced entity to its ID, which is what conditions on reference properties compare with."""
+    return value.get("id") if isinstance(value, Mapping) else value
+
+
+def _alternatives(value: Any) -> Tuple[Optional[float], Optional[bool]]:
+    """Returns the number and boolean a string condition value stands for, as NJUNS converts them server side."""
+    if not isinstance(value, str):
+        return None, None
+    try:
+        number = float(value)
+    except ValueError:
+        number = None
+    flag = {"true": True, "false": False}.get(value.lower())
+    return number, flag
+
+
+def _kind(value: Any) -> Any:
+    """Groups values that compare equal across types, so ints and floats share a kind but bools do not."""
+    if isinstance(value, bool):
+        return bool
+    if isinstance(value, (int, float)):
+        return float
+    return type(value)
+
+
+def _operator(condition: "EntitySearchCondition") -> str:
+    return getattr(condition.operator, "value", condition.operator)
+
+
+def _group(condition: "EntitySearchCondition") -> str:
+    return getattr(condition.group, "value", condition.group)
+
+
+def _children(conditions: Conditions) -> Tuple[str, Sequence["EntitySearchCondition"]]:
+    """Returns the group type and child conditions of a condition tree. A plain list is an AND group, as in a search."""
+    if isinstance(conditions, (list, tuple)):
+        return "AND", conditions
+    if conditions.group:
+        return _group(conditions), conditions.conditions or []
+    return "", ()
+
+
+def compile_conditions(conditions: Conditions, *, sql_nulls: bool = False) -> Predicate:
+    """Compiles a condition tree, as passed to :meth:`EntitiesRoute.search_entities`, into a predicate.
+
+    The predicate accepts :class:`Entity` objects, :class:`EntityRow` views and decoded entity JSON. Properties can be
+    dotted paths into referenced entities, and a referenced entity is compared by its ID. As in
+    :meth:`EntityFrame.where`, missing values only match ``=``, ``<>``, ``notEmpty``, ``in`` and ``notin``, string
+    operators ignore case like the search endpoint, and values that cannot be compared never match.
+
+    :param conditions: A condition, a condition group or a list of conditions that must all match.
+    :type conditions: Union[EntitySearchCondition, Sequence[EntitySearchCondition]]
+    :param sql_nulls: Whether missing values match no condition at all, as in the queries run by the server.
+    :type sql_nulls: bool
+    :return: A function returning whether an entity matches.
+    :raises ValueError: A condition uses an unknown operator or group.
+    """
+    group, children = _children(conditions)
+    if group:
+        predicates = [compile_conditions(c, sql_nulls=sql_nulls) for c in children]
+        if group == "AND":
+            return lambda item: all(p(item) for p in predicates)
+        if group == "OR":
+            return lambda item: any(p(item) for p in predicates)
+        raise ValueError(f"Unknown condition group {group!r}")
+
+    op = _operator(conditions)
+    try:
+        compare = _OPERATORS[op]
+    except KeyError:
+        raise ValueError(f"Unknown search operator {op!r}") from None
+    path: str = conditions.property
+    value: Any = conditions.value
+    if op in ("in", "notin"):
+        try:
+            value = frozenset(value)
+        except TypeError:
+            value = list(value)
+    number, flag = _alternatives(value)
+    null_safe = op in _NULL_SAFE and not sql_nulls
+    nested = "." in path
+
+    def predicate(item: Any) -> bool:
+        if not nested and type(item) is Entity:
+            # Fast path for the common case of a top-level property of an entity
+            actual = item.json.get(path)
+        else:
+            actual = _lookup(item, path)
+        if isinstance(actual, Mapping):
+            actual = actual.get("id")
+        if actual is None and not null_safe:
+            return False
+        other = value
+        if isinstance(actual, bool):
+            other = value if flag is None else flag
+        elif isinstance(actual, (int, float)) and number is not None:
+            other = number
+        try:
+            return compare(actual, other)
+        except TypeError:
+            return False
+
+    return predicate
+
+
+def filter_entities(entities: Iterable[Any], conditions: Conditions) -> List[Any]:
+    """Returns the entities matching a condition tree, in their original order. See :func:`compile_conditions`.
+
+    For repeated queries against the same collection, build an :class:`EntityIndex` instead.
+    """
+    predicate = compile_conditions(conditions)
+    return [e for e in entities if predicate(e)]
+
+
+class EntityIndex:
+    """An in-memory collection of entities that answers :class:`EntitySearchCondition` trees locally.
+
+    Hash indexes answer ``=`` and ``in`` conditions on their property, sorted indexes also answer ``<``, ``<=``, ``>``,
+    ``>=`` and ``startsWith``. The candidates of indexed conditions are intersected for AND groups and united for OR
+    groups, and only the remaining conditions are evaluated row by row. Queries without any usable index scan the
+    whole collection. Indexes are built once; build a new index after the entities changed::
+
+        index = EntityIndex(tickets, hash_on=("status", "region.id"), sort_on=("createTs",))
+        open_tickets = index.filter([EntitySearchCondition("status", EntitySearchOperator.EQ, "OPEN")])
+    """
+
+    def __init__(self, entities: Iterable[Any], *, hash_on: Sequence[str] = (), sort_on: Sequence[str] = ()) -> None:
+        """Initializes an index.
+
+        :param entities: The :class:`Entity` objects, :class:`EntityRow` views or entity JSON objects to index.
+        :type entities: Iterable[Any]
+        :param hash_on: Property paths to build hash indexes on, for equality lookups.
+        :type hash_on: Sequence[str]
+        :param sort_on: Property paths to build sorted indexes on, for equality, range and prefix lookups.
+        :type sort_on: Sequence[str]
+        :raises ValueError: A hashed property holds unhashable values, or a sorted property values of mixed types.
+        """
+        self.entities: List[Any] = list(entities)
+        self.__hashed: Dict[str, Dict[Any, List[int]]] = {}
+        self.__hashed_kinds: Dict[str, Set[Any]] = {}
+        self.__sorted: Dict[str, Tuple[List[Any], List[int]]] = {}
+        # Lowercased string keys of the sorted indexes, for startsWith, which ignores case
+        self.__folded: Dict[str, Tuple[List[str], List[int]]] = {}
+
+        for path in hash_on:
+            buckets: Dict[Any, List[int]] = {}
+            for position, entity in enumerate(self.entities):
+                try:
+                    buckets.setdefault(_key(_lookup(entity, path)), []).append(position)
+                except TypeError:
+                    raise ValueError(f"Cannot hash the values of {path!r}, index a nested property instead") from None
+            self.__hashed[path] = buckets
+            self.__hashed_kinds[path] = {_kind(key) for key in buckets if key is not None}
+
+        for path in sort_on:
+            pairs = [(v, i) for i, v in ((i, _key(_lookup(e, path))) for i, e in enumerate(self.entities)) if v is not None]
+            try:
+                pairs.sort(key=itemgetter(0))
+            except TypeError:
+                raise ValueError(f"Cannot sort the values of {path!r}, they have mixed types") from None
+            self.__sorted[path] = ([v for v, _ in pairs], [i for _, i in pairs])
+            if all(isinstance(v, str) for v, _ in pairs):
+                folded = sorted(((v.lower(), i) for v, i in pairs), key=itemgetter(0))
+                self.__folded[path] = ([v for v, _ in folded], [i for _, i in folded])
+
+        _log.debug(f"Indexed {len(self.entities)} entities on {len(self.__hashed)} hashed and {len(self.__sorted)} sorted properties")
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def __repr__(self) -> str:
+        return f"<EntityIndex entities={len(self.entities)} hashed={list(self.__hashed)} sorted={list(self.__sorted)}>"
+
+    def filter(self, conditions: Conditions) -> List[Any]:
+        """Returns the entities matching a condition tree, in their original order.
+
+        :param conditions: A condition, a condition group or a list of conditions that must all match.
+        :type conditions: Union[EntitySearchCondition, Sequence[EntitySearchCondition]]
+        :return: The matching entities.
+        """
+        return [self.entities[i] for i in self.positions(conditions)]
+
+    def count(self, conditions: Conditions) -> int:
+        """Returns the number of entities matching a condition tree."""
+        return len(self.positions(conditions))
+
+    def positions(self, conditions: Conditions) -> List[int]:
+        """Returns the sorted positions in :attr:`entities` of the entities matching a condition tree."""
+        candidates, exact = self.__plan(conditions)
+        if candidates is None:
+            predicate = compile_conditions(conditions)
+            return [i for i, e in enumerate(self.entities) if predicate(e)]
+        if exact:
+            return sorted(candidates)
+        predicate = compile_conditions(conditions)
+        return sorted(i for i in candidates if predicate(self.entities[i]))
+
+    def __plan(self, conditions: Conditions) -> Tuple[Optional[Set[int]], bool]:
+        """Narrows a condition tree down with the indexes.
+
+        :return: The candidate positions, or ``None`` if the indexes cannot narrow it down, and whether every
+                 candidate is known to match.
+        """
+        group, children = _children(conditions)
+        if not group:
+            candidates = self.__lookup(conditions)
+            return candidates, candidates is not None
+
+        plans = [self.__plan(c) for c in children]
+        if group == "OR":
+            if not plans or any(candidates is None for candidates, _ in plans):
+                return None, False
+            return set().union(*(candidates for candidates, _ in plans)), all(exact for _, exact in plans)
+
+        narrowed = sorted((p for p in plans if p[0] is not None), key=lambda p: len(p[0]))
+        if not narrowed:
+            return None, False
+        candidates = set(narrowed[0][0])
+        for other, _ in narrowed[1:]:
+            candidates.intersection_update(other)
+        return candidates, len(narrowed) == len(plans) and all(exact for _, exact in narrowed)
+
+    def __lookup(self, condition: "EntitySearchCondition") -> Optional[Set[int]]:
+        """Returns the positions matching a single condition from an index, or ``None`` if no index answers it."""
+        op = _operator(condition)
+        path = condition.property
+        value = condition.value
+
+        buckets = self.__hashed.get(path)
+        if buckets is not None and op in _HASH_OPERATORS and value is not None:
+            keys = [value] if op == "=" else list(value)
+            kinds = self.__hashed_kinds[path]
+            # Other kinds, ex. numeric strings for a number property, are converted by the row by row check instead
+            if all(key is None or _kind(key) in kinds for key in keys):
+                try:
+                    return {i for key in keys for i in buckets.get(key, ())}
+                except TypeError:
+                    return None
+
+        index = self.__sorted.get(path)
+        if index is None or op not in _SORTED_OPERATORS or value is None:
+            return None
+        keys, positions = index
+        try:
+            if op == "=":
+                return set(positions[bisect_left(keys, value):bisect_right(keys, value)])
+            if op == "in":
+                return {i for v in value for i in positions[bisect_left(keys, v):bisect_right(keys, v)]}
+            if op == "<":
+                return set(positions[:bisect_left(keys, value)])
+            if op == "<=":
+                return set(positions[:bisect_right(keys, value)])
+            if op == ">":
+                return set(positions[bisect_right(keys, value):])
+            if op == ">=":
+                return set(positions[bisect_left(keys, value):])
+            folded = self.__folded.get(path)
+            if folded is None or not isinstance(value, str):
+                return None
+            # startsWith
+            keys, positions = folded
+            prefix = value.lower()
+            return set(positions[bisect_left(keys, prefix):bisect_left(keys, prefix + _PREFIX_END)])
+        except TypeError:
+            # Values of another type than the indexed ones, ex. a numeric string, are left to the row by row check
+            return None
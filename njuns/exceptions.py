@@ -1,9 +1,11 @@
-from typing import Optional
-
-from aiohttp import ClientResponse
+import asyncio
+from typing import Optional, TYPE_CHECKING
 
 from .route import Route
 
+if TYPE_CHECKING:
+    from aiohttp import ClientResponse
+
 
 class HTTPException(Exception):
     """Raised when an HTTP request returns a non-200 status code."""
@@ -12,7 +14,7 @@ class HTTPException(Exception):
         self,
         message: str,
         route: Route,
-        response: Optional[ClientResponse],
+        response: Optional["ClientResponse"],
         content: Optional[str],
     ):
         self.route = route
@@ -52,3 +54,25 @@ class NotFound(HTTPException):
     """Raised when an HTTP request returns a 404 status code."""
 
     pass
+
+
+class Conflict(HTTPException):
+    """Raised when an HTTP request returns a 409 status code, ex. when an update was based on an outdated entity version."""
+
+    pass
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Raised when a request, or a retry it would need, does not fit in the remaining time of its timeout or deadline."""
+
+    def __init__(self, message: str, route: Route):
+        self.route = route
+        self.message = message
+
+        super().__init__("{}: {}".format(self.message, self.route))
+
+
+class ValidationError(ValueError):
+    """Raised when a request fails validation against the cached entity metadata before it is sent."""
+
+    pass
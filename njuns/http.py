@@ -4,52 +4,154 @@ import json
 import logging
 import socket
 import sys
+import time
+import zlib
+from concurrent.futures import Executor
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from logging import Logger
-from typing import Optional, Any, Dict, Union
+from typing import Optional, Any, AsyncIterator, Callable, Dict, Tuple, Union
+from weakref import WeakKeyDictionary
 
 import aiohttp
 from aiohttp import TCPConnector
 
+from .compression import TransferStats, accept_encoding, compress, decompress
+from . import timeouts
+from .timeouts import _current_deadline, resolve_deadline
 from .exceptions import (
     AuthenticationException,
+    Conflict,
+    DeadlineExceeded,
     HTTPException,
     Forbidden,
     NotFound,
     ServerError,
 )
+from .models.response import ResponseEnvelope
 from .models.user import UserInfo
+from .ratelimit import RateLimiter
 from .route import Route
 from .routes.entities import EntitiesRoute
+from .routes.files import FilesRoute
+from .routes.metadata import MetadataRoute
 from .routes.queries import QueriesRoute
 from .routes.services import ServicesRoute
+from .scheduler import Priority, RequestScheduler
+from .token_store import StoredToken, TokenStore
 from .utils import MISSING, Response
 
 _log: Logger = logging.getLogger(__name__)
 
+# Response size in bytes from which decoding moves to the decode executor, see benchmarks/decode.py.
+DEFAULT_OFFLOAD_THRESHOLD: int = 64 * 1024
 
-async def json_or_text(response: aiohttp.ClientResponse) -> Union[Dict[str, Any], str]:
+# Request body size in bytes from which bodies are compressed when compression is enabled.
+DEFAULT_COMPRESS_THRESHOLD: int = 8 * 1024
+
+# Longest pause, in seconds, between two reads of a streamed transfer when no read_timeout is set. Streamed transfers
+# have no overall time limit, as large files may take longer than the session timeout.
+DEFAULT_TRANSFER_READ_TIMEOUT: float = 60.0
+
+# Serializes the clients of this process waiting for the lock of a token store, see HTTPClient._token_store_lock().
+_token_store_locks: "WeakKeyDictionary[TokenStore, asyncio.Lock]" = WeakKeyDictionary()
+
+
+def _decode_json(body: bytes, transform: Optional[Callable[[Any], Any]] = None) -> Any:
+    """Decodes a JSON body and applies ``transform`` to the result. Module level, so it can run in a process pool."""
+    data = json.loads(body)
+    return transform(data) if transform is not None else data
+
+
+async def json_or_text(
+    response: aiohttp.ClientResponse,
+    *,
+    executor: Optional[Executor] = None,
+    offload_threshold: int = 0,
+    transform: Optional[Callable[[Any], Any]] = None,
+    body: Optional[bytes] = None,
+) -> Union[Dict[str, Any], str]:
     """Takes in a response from aiohttp and returns the data as a string or dictionary
 
     :param response: The :class:`aiohttp.ClientResponse` instance.
     :type response: aiohttp.ClientResponse
+    :param executor: If given, JSON bodies of at least ``offload_threshold`` bytes are decoded on it instead of the event loop.
+    :type executor: Optional[concurrent.futures.Executor]
+    :param offload_threshold: The body size in bytes from which decoding is offloaded to ``executor``.
+    :type offload_threshold: int
+    :param transform: Applied to decoded JSON, on the executor if decoding is offloaded. Must be picklable for process pools.
+    :type transform: Optional[Callable[[Any], Any]]
+    :param body: The already read and decompressed body. Read from ``response`` if omitted.
+    :type body: Optional[bytes]
     :return: The response contents as a string or a dictionary.
     :rtype: Union[Dict[str, Any], str]
     """
-    text = await response.text(encoding="utf-8")
+    if body is None:
+        body = await response.read()
+    if "application/json" not in response.headers.get("Content-Type", ""):
+        return body.decode("utf-8")
+    if executor is not None and len(body) >= offload_threshold:
+        return await asyncio.get_running_loop().run_in_executor(executor, _decode_json, body, transform)
+    return _decode_json(body, transform)
+
+
+def _retry_after(response: aiohttp.ClientResponse, *, default: float) -> float:
+    """Reads the delay in seconds from the ``Retry-After`` header of a response.
+
+    :param response: The :class:`aiohttp.ClientResponse` instance.
+    :type response: aiohttp.ClientResponse
+    :param default: The delay to use if the header is missing or not a number of seconds.
+    :type default: float
+    :rtype: float
+    """
     try:
-        if "application/json" in response.headers["Content-Type"]:
-            return json.loads(text)
-    except KeyError:
-        pass
-    return text
+        return max(0.0, float(response.headers["Retry-After"]))
+    except (KeyError, ValueError):
+        return default
 
 
-class HTTPClient(EntitiesRoute, QueriesRoute, ServicesRoute):
+class HTTPClient(EntitiesRoute, FilesRoute, MetadataRoute, QueriesRoute, ServicesRoute):
     """Represents an HTTP client sending requests to the NJUNs API"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        *,
+        base_url: Optional[str] = MISSING,
+        max_concurrency: int = 64,
+        route_limits: Optional[Dict[str, int]] = None,
+        token_store: Optional[TokenStore] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        decode_executor: Optional[Executor] = None,
+        offload_threshold: int = DEFAULT_OFFLOAD_THRESHOLD,
+        compression: bool = False,
+        compress_threshold: int = DEFAULT_COMPRESS_THRESHOLD,
+        timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+    ):
         super().__init__(self)
+        self.__base_url: str = base_url
+        self.token_store: Optional[TokenStore] = token_store
+        self.rate_limiter: Optional[RateLimiter] = rate_limiter
+        self.decode_executor: Optional[Executor] = decode_executor
+        self.offload_threshold: int = offload_threshold
+        # Compressed transport: responses are requested with every available coding and decoded here, so their size
+        # on the wire can be counted, and JSON bodies of at least compress_threshold bytes are sent gzipped.
+        self.compression: bool = compression
+        self.compress_threshold: int = compress_threshold
+        self.__accept_encoding: str = accept_encoding() if compression else ""
+        # Turned off for good once the server rejects a compressed body
+        self.__compress_requests: bool = compression
+        self.transfer_stats: Dict[str, TransferStats] = {}
+        # Default time budget of a request including its retries, see request()
+        self.timeout: Optional[float] = timeout
+        # Per attempt limits for opening a connection and for each read from it
+        self.connect_timeout: Optional[float] = connect_timeout
+        self.read_timeout: Optional[float] = read_timeout
+        self.__token_key: Optional[str] = None
+        # Kept for logging in again if the server rejects a stored token that it revoked or lost, see __replace_rejected_token()
+        self.__credentials: Optional[Tuple[str, str]] = None
+        self.scheduler: RequestScheduler = RequestScheduler(max_concurrency=max_concurrency, route_limits=route_limits)
         self.__access_token: Optional[str] = None
         self.__refresh_token: Optional[str] = None
         self.__expires_in: Optional[datetime] = None
@@ -62,10 +164,189 @@ class HTTPClient(EntitiesRoute, QueriesRoute, ServicesRoute):
         )
         self.__session: aiohttp.ClientSession = MISSING  # gets set in static_login
 
-        _log.info(
-            "Initialized HTTP client, using API base URL: {}".format(Route("", ""))
+        _log.debug("Initialized HTTP client, using API base URL: %s", self.base_url)
+
+    @property
+    def base_url(self) -> str:
+        """The API environment of this client. Falls back to :attr:`Route.BASE` if the client was not given one."""
+        return Route.BASE if self.__base_url is MISSING else self.__base_url
+
+    @base_url.setter
+    def base_url(self, value: str) -> None:
+        _log.info(f"Setting API environment of this client to {value}")
+        self.__base_url = value
+
+    def _ensure_session(self) -> None:
+        """Creates the :class:`aiohttp.ClientSession` if it does not exist yet."""
+        if self.__session is MISSING:
+            self.__session = aiohttp.ClientSession(
+                connector=TCPConnector(limit=0, family=socket.AF_INET),
+                auto_decompress=not self.compression,
+                # The overall limit is enforced per request in request_envelope(), across retries
+                timeout=aiohttp.ClientTimeout(
+                    total=5 * 60,
+                    sock_connect=30 if self.connect_timeout is None else self.connect_timeout,
+                    sock_read=self.read_timeout,
+                ),
+            )
+
+    def _transfer_timeout(self, remaining: Optional[float] = None) -> aiohttp.ClientTimeout:
+        """The timeout of a streamed transfer, bounded by ``remaining`` seconds if the request has a deadline."""
+        return aiohttp.ClientTimeout(
+            total=remaining,
+            sock_connect=30 if self.connect_timeout is None else self.connect_timeout,
+            sock_read=DEFAULT_TRANSFER_READ_TIMEOUT if self.read_timeout is None else self.read_timeout,
+        )
+
+    def _current_token(self, *, user_info: Optional[Dict[str, Any]] = None) -> StoredToken:
+        """Returns the session tokens of this client in their persisted form."""
+        return StoredToken(
+            access_token=self.__access_token,
+            refresh_token=self.__refresh_token,
+            expires_at=self.__expires_in.timestamp(),
+            scope=self.__scope,
+            user_info=user_info,
         )
 
+    def _adopt_token(self, token: StoredToken) -> None:
+        """Replaces the session tokens of this client with a persisted token."""
+        self.__access_token = token.access_token
+        self.__refresh_token = token.refresh_token
+        self.__expires_in = datetime.fromtimestamp(token.expires_at)
+        self.__scope = token.scope
+
+    @asynccontextmanager
+    async def _token_store_lock(self) -> AsyncIterator[None]:
+        """Holds the lock of :attr:`token_store` without blocking the event loop.
+
+        Clients of one process first queue on an :class:`asyncio.Lock` of the store, so at most one executor thread
+        blocks on the store lock. Otherwise, enough waiting clients could take every executor thread, leaving none for
+        the ``load`` and ``save`` calls of the client holding the lock.
+        """
+        local_lock = _token_store_locks.get(self.token_store)
+        if local_lock is None:
+            local_lock = _token_store_locks[self.token_store] = asyncio.Lock()
+        async with local_lock:
+            async with self.__store_lock():
+                yield
+
+    @asynccontextmanager
+    async def __store_lock(self) -> AsyncIterator[None]:
+        """Holds the blocking lock of :attr:`token_store` in an executor thread."""
+        loop = asyncio.get_running_loop()
+        lock = self.token_store.lock()
+        acquiring = loop.run_in_executor(None, lock.__enter__)
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The executor thread keeps waiting for the lock, release it as soon as it is acquired.
+            acquiring.add_done_callback(
+                lambda f: f.cancelled() or f.exception() is not None or loop.run_in_executor(None, lock.__exit__, None, None, None)
+            )
+            raise
+
+        try:
+            yield
+        except BaseException as e:
+            await loop.run_in_executor(None, lock.__exit__, type(e), e, e.__traceback__)
+            raise
+        else:
+            await loop.run_in_executor(None, lock.__exit__, None, None, None)
+
+    async def _stored_login(self, *, username: str, password: str) -> UserInfo:
+        """Logs in through :attr:`token_store`. A valid stored token is reused as is, an expired one is refreshed, and
+        the password grant is only sent if neither works. Other processes sharing the store wait for the lock and then
+        reuse the resulting token. If the server rejects a reused token later on, the client logs in again once, see
+        :meth:`request`.
+
+        :param username: The username to authenticate with.
+        :type username: str
+        :param password: The password to authenticate with.
+        :type password: str
+        :return: The logged-in user.
+        """
+        self._ensure_session()
+        self.__token_key = "{}|{}".format(self.base_url, username)
+        self.__credentials = (username, password)
+        loop = asyncio.get_running_loop()
+
+        async with self._token_store_lock():
+            stored: Optional[StoredToken] = await loop.run_in_executor(None, self.token_store.load, self.__token_key)
+            user_info: Optional[Dict[str, Any]] = stored.user_info if stored else None
+
+            if stored is not None and not stored.expires_within(60):
+                _log.info("Reusing stored access token")
+                self._adopt_token(stored)
+            else:
+                refreshed = False
+                if stored is not None and stored.refresh_token:
+                    try:
+                        await self._static_login(refresh_token=stored.refresh_token, grant_type="refresh_token")
+                        refreshed = True
+                        _log.info("Refreshed stored access token")
+                    except HTTPException as e:
+                        _log.info(f"Stored refresh token was rejected, logging in again: {e.message}")
+                if not refreshed:
+                    await self._static_login(username=username, password=password)
+                    user_info = None
+
+            if user_info is None:
+                user_info = vars(await self.fetch_user_info())
+            await loop.run_in_executor(None, self.token_store.save, self.__token_key, self._current_token(user_info=user_info))
+
+        return UserInfo(**user_info)
+
+    async def __refresh_session(self) -> None:
+        """Refreshes the expired access token, or adopts the token another process sharing :attr:`token_store` already refreshed."""
+        if self.token_store is None or self.__token_key is None:
+            await self._static_login(refresh_token=self.__refresh_token, grant_type="refresh_token")
+            return
+
+        loop = asyncio.get_running_loop()
+        async with self._token_store_lock():
+            stored: Optional[StoredToken] = await loop.run_in_executor(None, self.token_store.load, self.__token_key)
+            if stored is not None and stored.access_token != self.__access_token and not stored.expires_within(60):
+                _log.info("Adopting access token refreshed by another client")
+                self._adopt_token(stored)
+                return
+
+            await self._static_login(refresh_token=self.__refresh_token, grant_type="refresh_token")
+            await loop.run_in_executor(
+                None, self.token_store.save, self.__token_key, self._current_token(user_info=stored.user_info if stored else None)
+            )
+
+    async def __replace_rejected_token(self, rejected: str) -> None:
+        """Replaces an access token the server rejected although it has not expired, ex. because it was revoked or the
+        server lost its sessions in a restart.
+
+        The stored token is dropped, unless another client sharing :attr:`token_store` already replaced it. The session
+        is then refreshed, or if the refresh token is rejected as well, logged in again with the stored credentials.
+
+        :param rejected: The access token the server rejected.
+        :type rejected: str
+        """
+        loop = asyncio.get_running_loop()
+        async with self._token_store_lock():
+            stored: Optional[StoredToken] = await loop.run_in_executor(None, self.token_store.load, self.__token_key)
+            if stored is not None and stored.access_token != rejected and not stored.expires_within(60):
+                _log.info("Adopting access token renewed by another client")
+                self._adopt_token(stored)
+                return
+
+            _log.warning("Access token was rejected by the server, logging in again")
+            await loop.run_in_executor(None, self.token_store.delete, self.__token_key)
+            try:
+                await self._static_login(refresh_token=self.__refresh_token, grant_type="refresh_token")
+            except HTTPException as e:
+                if self.__credentials is None:
+                    raise
+                _log.info(f"Refresh token was rejected as well, logging in with the password: {e.message}")
+                username, password = self.__credentials
+                await self._static_login(username=username, password=password)
+            await loop.run_in_executor(
+                None, self.token_store.save, self.__token_key, self._current_token(user_info=stored.user_info if stored else None)
+            )
+
     async def _static_login(
         self,
         *,
@@ -82,10 +363,7 @@ class HTTPClient(EntitiesRoute, QueriesRoute, ServicesRoute):
         :param grant_type:
         :return:
         """
-        if self.__session is MISSING:
-            self.__session = aiohttp.ClientSession(
-                connector=TCPConnector(limit=0, family=socket.AF_INET)
-            )
+        self._ensure_session()
 
         route: Route = Route(
             "POST",
@@ -119,14 +397,11 @@ class HTTPClient(EntitiesRoute, QueriesRoute, ServicesRoute):
         try:
             data = await self.request(
                 route,
-                headers=(
-                    {
-                        "Authorization": "Basic "
-                        + base64.b64encode("client:secret".encode()).decode()
-                    }
-                    if refresh_token is MISSING
-                    else None
-                ),
+                # The token endpoint authenticates the OAuth client for both grants
+                headers={
+                    "Authorization": "Basic "
+                    + base64.b64encode("client:secret".encode()).decode()
+                },
             )
 
             self.__access_token = data["access_token"]
@@ -141,14 +416,14 @@ class HTTPClient(EntitiesRoute, QueriesRoute, ServicesRoute):
                     "Authentication failed, ex. invalid CUBA username or password.",
                     route,
                     e.response,
-                    await e.response.text(),
+                    e.content,
                 )
             if e.response.status == 401:
                 raise AuthenticationException(
                     "Basic authentication failed",
                     route,
                     e.response,
-                    await e.response.text(),
+                    e.content,
                 )
 
             # Reraise if other than failed authentication
@@ -162,10 +437,8 @@ class HTTPClient(EntitiesRoute, QueriesRoute, ServicesRoute):
         await self.__session.close()
         self.__session = MISSING
 
-    async def request(self, route: Route, *_, **kwargs: Any) -> Response:
-        method: str = route.method
-        url: str = route.url
-
+    async def _prepare_request(self, kwargs: Dict[str, Any]) -> None:
+        """Refreshes the access token if needed and fills in the request headers and body of ``kwargs`` in place."""
         headers: Dict[str, str] = {"User-Agent": self.__user_agent}
 
         # Append token if present
@@ -180,12 +453,12 @@ class HTTPClient(EntitiesRoute, QueriesRoute, ServicesRoute):
                 self.__expires_in = datetime.now() + timedelta(seconds=3600)
 
                 # Send a request for a new token using the refresh token.
-                await self._static_login(
-                    username=None,
-                    password=None,
-                    refresh_token=self.__refresh_token,
-                    grant_type="refresh_token",
-                )
+                try:
+                    await self.__refresh_session()
+                except BaseException:
+                    # Abandoned, ex. by a deadline, so let the next request try again
+                    self.__expires_in = datetime.now()
+                    raise
 
             # If an access token is present, assign it in the headers
             headers["Authorization"] = f"Bearer {self.__access_token}"
@@ -197,92 +470,370 @@ class HTTPClient(EntitiesRoute, QueriesRoute, ServicesRoute):
         else:
             headers["Content-Type"] = "application/x-www-form-urlencoded"
 
+        if self.compression:
+            headers["Accept-Encoding"] = self.__accept_encoding
+
         # Update headers with overridden ones from kwargs
         if "headers" in kwargs and isinstance(kwargs["headers"], dict):
             headers.update(kwargs["headers"])
 
-        # Assign headers to kwargs, so it can be passed in the below request call
+        # Assign headers to kwargs, so it can be passed in the request call
         kwargs["headers"] = headers
 
+    async def _error_text(self, response: aiohttp.ClientResponse) -> str:
+        """Reads the body of an error response as text, reversing its ``Content-Encoding`` if compression is enabled."""
+        body = await response.read()
+        if self.compression:
+            try:
+                body = decompress(body, response.headers.get("Content-Encoding"))
+            except (OSError, ValueError, zlib.error):
+                pass
+        return body.decode("utf-8", errors="replace")
+
+    async def _raise_for_status(self, route: Route, response: aiohttp.ClientResponse, content: Optional[str] = None) -> None:
+        """Raises the exception matching a non-2xx response.
+
+        :param route: The route the request was sent to.
+        :type route: Route
+        :param response: The response to check.
+        :type response: aiohttp.ClientResponse
+        :param content: The already decoded body of the response. Read from ``response`` if omitted.
+        :type content: Optional[str]
+        """
+        if 300 > response.status >= 200:
+            return
+        if content is None:
+            content = await self._error_text(response)
+        if response.status == 403:
+            raise Forbidden("Access is denied", route, response, content)
+        elif response.status == 404:
+            raise NotFound("Not found", route, response, content)
+        elif response.status == 409:
+            raise Conflict("Conflict", route, response, content)
+        elif response.status >= 500:
+            raise ServerError("Server error", route, response, content)
+        else:
+            raise HTTPException("Request failed", route, response, content)
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        route: Route,
+        *_,
+        priority: Priority = Priority.NORMAL,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Sends a request and yields the :class:`aiohttp.ClientResponse` before its body is read, so it can be consumed in chunks.
+
+        Unlike :meth:`request`, the request is not retried. The scheduler slot is held until the block exits. The
+        transfer has no overall time limit, only ``read_timeout`` between reads, unless ``timeout`` or ``deadline`` is
+        given or it runs inside a :func:`njuns.deadline` block. Then the response must also be consumed in time.
+
+        :param route: The route to send the request to.
+        :type route: Route
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for sending the request and consuming the response.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        :raises DeadlineExceeded: The deadline passed before the response was consumed.
+        """
+        route.base = self.base_url
+        await self._prepare_request(kwargs)
+        if self.compression:
+            # Streamed bodies are passed through as is, so they must not be encoded
+            kwargs["headers"]["Accept-Encoding"] = "identity"
+        if self.rate_limiter is not None:
+            # Before taking a slot, see __send()
+            await self.rate_limiter.acquire()
+        async with self.scheduler.slot(route.key, priority):
+            limit = resolve_deadline(timeout, deadline)
+            remaining: Optional[float] = None
+            if limit is not None:
+                remaining = limit - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceeded("Deadline passed before the request was sent", route)
+            kwargs["timeout"] = self._transfer_timeout(remaining)
+            try:
+                async with self.__session.request(route.method, route.url, **kwargs) as response:
+                    _log.debug("%s %s -> %s (streamed)", route.method, route.url, response.status)
+                    await self._raise_for_status(route, response)
+                    yield response
+            except DeadlineExceeded:
+                raise
+            except asyncio.TimeoutError:
+                if limit is None or time.monotonic() < limit:
+                    raise
+                raise DeadlineExceeded("Streamed request did not complete before its deadline", route) from None
+
+    async def request(
+        self,
+        route: Route,
+        *_,
+        priority: Priority = Priority.NORMAL,
+        transform: Optional[Callable[[Any], Any]] = None,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        **kwargs: Any,
+    ) -> Response:
+        """Sends a request, retrying on rate limits, server errors and dropped connections.
+
+        :param route: The route to send the request to.
+        :type route: Route
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param transform: Applied to a successful JSON response body, together with decoding on :attr:`decode_executor`
+                if the body is large. Must be picklable if that executor is a process pool.
+        :type transform: Optional[Callable[[Any], Any]]
+        :param timeout: The time budget in seconds for the request including its retries. Defaults to :attr:`timeout`.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds. The earliest of this, ``timeout``
+                and the deadline of an enclosing :func:`njuns.deadline` block applies.
+        :type deadline: Optional[float]
+        :return: The decoded and transformed response body.
+        :raises DeadlineExceeded: The request did not complete in time.
+        """
+        return (
+            await self.request_envelope(route, priority=priority, transform=transform, timeout=timeout, deadline=deadline, **kwargs)
+        ).data
+
+    async def request_envelope(
+        self,
+        route: Route,
+        *_,
+        priority: Priority = Priority.NORMAL,
+        transform: Optional[Callable[[Any], Any]] = None,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        **kwargs: Any,
+    ) -> ResponseEnvelope:
+        """Sends a request like :meth:`request`, but returns the body together with the status, headers and timings.
+
+        :param route: The route to send the request to.
+        :type route: Route
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param transform: Applied to a successful JSON response body, see :meth:`request`.
+        :type transform: Optional[Callable[[Any], Any]]
+        :param timeout: The time budget in seconds for the request including its retries, see :meth:`request`.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :meth:`request`.
+        :type deadline: Optional[float]
+        :return: The response of the successful attempt.
+        :raises DeadlineExceeded: The request did not complete in time.
+        """
+        # Bound before anything can fail, so the route of a raised exception names this client's environment
+        route.base = self.base_url
+        limit = resolve_deadline(self.timeout if timeout is None else timeout, deadline)
+        if limit is None:
+            return await self.__send(route, priority, transform, kwargs)
+
+        remaining = limit - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("Deadline passed before the request was sent", route)
+        # Published to the retries and to token refreshes sent on behalf of this request
+        token = _current_deadline.set(limit)
+        try:
+            # Cancels the attempt in flight, which hands back its scheduler slot and connection
+            return await asyncio.wait_for(self.__send(route, priority, transform, kwargs), remaining)
+        except DeadlineExceeded:
+            raise
+        except asyncio.TimeoutError:
+            if time.monotonic() < limit:
+                # A timeout of aiohttp itself, ex. read_timeout
+                raise
+            raise DeadlineExceeded("Request did not complete before its deadline", route) from None
+        finally:
+            _current_deadline.reset(token)
+
+    async def __backoff(self, route: Route, delay: float) -> None:
+        """Waits before a retry, unless the retry could not start before the deadline of the request."""
+        limit = _current_deadline.get()
+        if limit is not None and time.monotonic() + delay >= limit:
+            raise DeadlineExceeded("Retry in {} seconds would exceed the deadline".format(delay), route)
+        await asyncio.sleep(delay)
+
+    async def __send(
+        self,
+        route: Route,
+        priority: Priority,
+        transform: Optional[Callable[[Any], Any]],
+        kwargs: Dict[str, Any],
+    ) -> ResponseEnvelope:
+        """Sends a request with its retries, see :meth:`request_envelope`."""
+        started: float = time.perf_counter()
+        queue_time: float = 0.0
+        # Bind the route to this client's environment, so clients of different environments can share a process
+        route.base = self.base_url
+        method: str = route.method
+        url: str = route.url
+
+        await self._prepare_request(kwargs)
+
+        body: Any = kwargs.get("data")
+        if body is not None and not isinstance(body, (str, bytes)):
+            # A streamed upload, which may take longer than the session timeout. Deadlines still apply, see request_envelope()
+            kwargs["timeout"] = self._transfer_timeout()
+        sent: int = len(body) if isinstance(body, (str, bytes)) else 0
+        sent_uncompressed: int = sent
+        if (
+            self.__compress_requests
+            and isinstance(body, (str, bytes))
+            and sent >= self.compress_threshold
+            and "Content-Encoding" not in kwargs["headers"]
+        ):
+            raw_body = body.encode("utf-8") if isinstance(body, str) else body
+            kwargs["data"] = compress(raw_body)
+            kwargs["headers"]["Content-Encoding"] = "gzip"
+            sent_uncompressed, sent = len(raw_body), len(kwargs["data"])
+
         response: Optional[aiohttp.ClientResponse] = None
+        # The decoded body of the last error response, as the session does not decode compressed bodies itself
+        content: Optional[str] = None
+
+        # A stored token is only checked by the server, so a 401 for one is answered by logging in again, once
+        authorization: str = kwargs["headers"].get("Authorization", "")
+        reauthenticate: bool = self.__token_key is not None and authorization.startswith("Bearer ")
 
         for tries in range(5):
+            # Set when the attempt is retried after a delay, which is waited out after handing back the slot
+            retry_delay: Optional[float] = None
+            # Set when the access token was rejected, which is replaced after handing back the slot
+            rejected: Optional[str] = None
             try:
                 _log.debug(kwargs)
-                async with self.__session.request(method, url, **kwargs) as response:
-                    _log.debug(
-                        "{} {} ({}) -> {}".format(
-                            method, url, kwargs.get("data"), response.status
+                queued: float = time.perf_counter()
+                if self.rate_limiter is not None:
+                    # Waited for before taking a slot, so requests held back by the limiter do not keep the slots
+                    # from higher priority requests
+                    await self.rate_limiter.acquire()
+                async with self.scheduler.slot(route.key, priority):
+                    sending: float = time.perf_counter()
+                    queue_time += sending - queued
+                    async with self.__session.request(method, url, **kwargs) as response:
+                        # Lazy %-style arguments, so large bodies are only formatted when debug logging is enabled.
+                        _log.debug("%s %s (%s) -> %s", method, url, kwargs.get("data"), response.status)
+
+                        reading: float = time.perf_counter()
+                        received = await response.read()
+                        decoded = decompress(received, response.headers.get("Content-Encoding")) if self.compression else received
+                        decoding: float = time.perf_counter()
+                        self.transfer_stats.setdefault(route.key, TransferStats()).record(sent, sent_uncompressed, len(received), len(decoded))
+
+                        if response.status == 415 and kwargs["headers"].get("Content-Encoding") == "gzip" and body is not kwargs["data"]:
+                            # The server does not accept compressed bodies, send this and later requests uncompressed
+                            _log.warning("%s %s - Compressed request body rejected, disabling request compression", method, url)
+                            self.__compress_requests = False
+                            kwargs["data"] = body
+                            del kwargs["headers"]["Content-Encoding"]
+                            sent = sent_uncompressed
+                            continue
+
+                        # Only successful bodies are offloaded and transformed, error bodies are small and kept raw
+                        success = 300 > response.status >= 200
+                        if not success:
+                            content = decoded.decode("utf-8", errors="replace")
+                        data: Optional[Union[Dict[str, Any], str]] = await json_or_text(
+                            response,
+                            executor=self.decode_executor if success else None,
+                            offload_threshold=self.offload_threshold,
+                            transform=transform if success else None,
+                            body=decoded,
                         )
-                    )
-
-                    data: Optional[Union[Dict[str, Any], str]] = await json_or_text(
-                        response
-                    )
-
-                    if 300 > response.status >= 200:
-                        # Successful response, return data
-                        _log.debug("{} {} -> {}".format(method, url, data))
-                        return data
-
-                    if response.status == 429:
-                        # Rate limited, try again after a delay
-                        _log.debug("{} {} -> {}".format(method, url, data))
-                        _log.error(
-                            "{} {} - Rate limited, trying again in 3 seconds".format(
-                                method, url
+
+                        if success:
+                            # Successful response, return data
+                            _log.debug("%s %s -> %s", method, url, data)
+                            finished: float = time.perf_counter()
+                            return ResponseEnvelope(
+                                route=route,
+                                status=response.status,
+                                headers=response.headers,
+                                data=data,
+                                attempts=tries + 1,
+                                elapsed=finished - started,
+                                queue_time=queue_time,
+                                server_time=reading - sending,
+                                transfer_time=decoding - reading,
+                                decode_time=finished - decoding,
                             )
-                        )
-                        await asyncio.sleep(3)
-                        continue
-
-                    if response.status in (500, 502, 504, 524) and not (
-                        isinstance(data, dict) and "error" in data
-                    ):
-                        # Server error, try again after a delay
-                        _log.error(
-                            "{} {} - Server error, trying again in {} seconds".format(
-                                method, url, (1 + tries * 2)
+
+                        if response.status == 429:
+                            # Rate limited, try again after the delay requested by the server
+                            retry_after = _retry_after(response, default=3.0)
+                            _log.debug("%s %s -> %s", method, url, data)
+                            _log.error(
+                                "{} {} - Rate limited, trying again in {} seconds".format(
+                                    method, url, retry_after
+                                )
                             )
-                        )
-                        await asyncio.sleep(1 + tries * 2)
-                        continue
+                            if self.rate_limiter is not None:
+                                # Hold back every user of the limiter, the next acquire() waits out the delay
+                                await self.rate_limiter.penalize(retry_after)
+                                limit = _current_deadline.get()
+                                if limit is not None and time.monotonic() + retry_after >= limit:
+                                    raise DeadlineExceeded("Rate limit delay would exceed the deadline", route)
+                            else:
+                                retry_delay = retry_after
+
+                        elif response.status in (500, 502, 504, 524) and not (
+                            isinstance(data, dict) and "error" in data
+                        ):
+                            # Server error, try again after a delay
+                            _log.error(
+                                "{} {} - Server error, trying again in {} seconds".format(
+                                    method, url, (1 + tries * 2)
+                                )
+                            )
+                            retry_delay = 1 + tries * 2
 
-                    # Errors for other cases that should not be retried
-                    if response.status == 403:
-                        raise Forbidden(
-                            "Access is denied", route, response, await response.text()
-                        )
-                    elif response.status == 404:
-                        raise NotFound(
-                            "Not found", route, response, await response.text()
-                        )
-                    elif response.status >= 500:
-                        raise ServerError(
-                            "Server error", route, response, await response.text()
-                        )
-                    else:
-                        raise HTTPException(
-                            "Request failed", route, response, await response.text()
-                        )
+                        elif response.status == 401 and reauthenticate:
+                            rejected = kwargs["headers"]["Authorization"][len("Bearer "):]
+
+                        else:
+                            # Errors for other cases that should not be retried
+                            await self._raise_for_status(route, response, content)
             except OSError as e:
                 # Socket error, try again if possible
                 if tries < 4 and e.errno in (54, 10054):
-                    await asyncio.sleep(1 + tries * 2)
-                    continue
-                raise
+                    retry_delay = 1 + tries * 2
+                else:
+                    raise
+
+            if rejected is not None:
+                reauthenticate = False
+                await self.__replace_rejected_token(rejected)
+                kwargs["headers"]["Authorization"] = f"Bearer {self.__access_token}"
+            if retry_delay is not None:
+                # Outside of the scheduler slot, so failing requests waiting to be retried do not hold back others
+                await self.__backoff(route, retry_delay)
         if response is not None:
             if response.status >= 500:
-                raise ServerError(
-                    "Server error", route, response, await response.text()
-                )
+                raise ServerError("Server error", route, response, content)
 
-            raise HTTPException(
-                "Request failed", route, response, await response.text()
-            )
+            raise HTTPException("Request failed", route, response, content)
 
         raise RuntimeError("Unreachable code in HTTP handler")
 
-    async def fetch_user_info(self, /) -> UserInfo:
-        """Fetches the currently logged-in user"""
-        return UserInfo(**await self.request(Route("GET", "/userInfo")))
+    async def fetch_user_info(
+        self,
+        /,
+        *,
+        priority: Priority = Priority.NORMAL,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> UserInfo:
+        """Fetches the currently logged-in user
+
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        """
+        with timeouts.deadline(timeout, at=deadline):
+            return UserInfo(**await self.request(Route("GET", "/userInfo"), priority=priority))
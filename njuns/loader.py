@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import uuid
+from contextvars import ContextVar, Token
+from logging import Logger
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .exceptions import NotFound
+from .models.entity import Entity
+from .route import Route
+from .scheduler import Priority
+from .timeouts import _current_deadline, wait_shared
+from .utils import MISSING
+
+_log: Logger = logging.getLogger(__name__)
+
+_current_loader: ContextVar[Optional["EntityLoader"]] = ContextVar("njuns_entity_loader", default=None)
+
+# (entity name, view, priority)
+_BatchKey = Tuple[str, Optional[str], Priority]
+
+
+def current_entity_loader() -> Optional["EntityLoader"]:
+    """Returns the :class:`EntityLoader` active in the current context, if any."""
+    return _current_loader.get()
+
+
+def _normalize_id(entity_id: Any) -> str:
+    """Returns the canonical form of an ID, so differently written UUIDs of the same entity are looked up once.
+
+    IDs that are not UUIDs are returned as strings unchanged.
+    """
+    try:
+        return str(uuid.UUID(str(entity_id)))
+    except ValueError:
+        return str(entity_id)
+
+
+class EntityLoader:
+    """Collects single-entity lookups made within a short delay and loads them with one ``in`` search per entity type.
+
+    While a loader is active (``async with client.entity_loader():``), ``fetch_entity`` calls from any coroutine in
+    that context are routed through it, so call sites do not change. Each ID is loaded at most once per loader; later
+    lookups of the same ID reuse the first result. Every caller gets its own :class:`Entity`, so changes made by one are
+    not seen by another.
+    """
+
+    def __init__(self, client: Any, *, delay: float = 0.002, max_batch: int = 50) -> None:
+        """Initializes a loader.
+
+        :param client: The :class:`HTTPClient` to send the searches with.
+        :param delay: How long, in seconds, to collect lookups before sending them.
+        :type delay: float
+        :param max_batch: The maximum amount of IDs per search. Capped at the page limit of 50.
+        :type max_batch: int
+        """
+        self.client: Any = client
+        self.delay: float = delay
+        self.max_batch: int = min(max_batch, 50)
+        self.__cache: Dict[Tuple[str, Optional[str], str], asyncio.Future] = {}
+        self.__pending: Dict[_BatchKey, Dict[str, asyncio.Future]] = {}
+        self.__flush_handle: Optional[asyncio.TimerHandle] = None
+        self.__tasks: Set[asyncio.Task] = set()
+        self.__token: Optional[Token] = None
+
+    async def __aenter__(self) -> "EntityLoader":
+        self.__token = _current_loader.set(self)
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        _current_loader.reset(self.__token)
+        self.__token = None
+        self.__flush()
+        if self.__tasks:
+            await asyncio.gather(*self.__tasks, return_exceptions=True)
+
+    def clear(self) -> None:
+        """Forgets every loaded entity, so that the next lookups are sent again."""
+        self.__cache = {key: future for key, future in self.__cache.items() if not future.done()}
+
+    async def load(
+        self,
+        entity_name: str,
+        entity_id: str,
+        *,
+        view: Optional[str] = MISSING,
+        priority: Priority = Priority.NORMAL,
+    ) -> Entity:
+        """Loads an entity by ID as part of the next batch.
+
+        :param entity_name: The name of the entity type to fetch.
+        :type entity_name: str
+        :param entity_id: The UUID of the entity to fetch.
+        :type entity_id: str
+        :param view: The name of the view to use for loading the entity fields.
+        :type view: str
+        :param priority: The scheduling priority of the batch request.
+        :type priority: Priority
+        :raises NotFound: No entity with this ID exists.
+        :raises DeadlineExceeded: The batch did not complete within this caller's deadline.
+        """
+        view = view or None
+        entity_id = _normalize_id(entity_id)
+        cache_key = (entity_name, view, entity_id)
+        future = self.__cache.get(cache_key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self.__cache[cache_key] = future
+            self.__pending.setdefault((entity_name, view, priority), {})[entity_id] = future
+            if self.__flush_handle is None:
+                self.__flush_handle = asyncio.get_running_loop().call_later(self.delay, self.__flush)
+        # Bounded by this caller's deadline, without cancelling the result shared with other callers
+        route = Route("POST", "/entities/{}/search".format(entity_name))
+        row: Dict[str, Any] = await wait_shared(future, route, timeout=self.client.timeout)
+        return Entity(**row)
+
+    def __flush(self) -> None:
+        if self.__flush_handle is not None:
+            self.__flush_handle.cancel()
+            self.__flush_handle = None
+        pending, self.__pending = self.__pending, {}
+        for key, futures in pending.items():
+            ids = list(futures)
+            for start in range(0, len(ids), self.max_batch):
+                chunk = {i: futures[i] for i in ids[start:start + self.max_batch]}
+                task = asyncio.get_running_loop().create_task(self.__dispatch(key, chunk))
+                self.__tasks.add(task)
+                task.add_done_callback(self.__tasks.discard)
+
+    async def __dispatch(self, key: _BatchKey, futures: Dict[str, asyncio.Future]) -> None:
+        # Not bound by the deadline of the caller whose context started the flush timer, every caller enforces its own
+        _current_deadline.set(None)
+        entity_name, view, priority = key
+        _log.debug(f"Loading {len(futures)} {entity_name} entities in one search")
+        json: dict = {
+            "filter": {"conditions": [{"property": "id", "operator": "in", "value": list(futures)}]},
+            "limit": len(futures),
+        }
+        if view:
+            json["view"] = view
+
+        try:
+            await self.client._validate(entity_name, view=view or MISSING)
+            rows: List[Dict[str, Any]] = await self.client.request(
+                Route("POST", "/entities/{}/search".format(entity_name)), json=json, priority=priority
+            )
+        except BaseException as e:
+            for entity_id, future in futures.items():
+                # Failed lookups are not cached, so they can be retried
+                self.__cache.pop((entity_name, view, entity_id), None)
+                if future.done():
+                    continue
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        found = {_normalize_id(row.get("id")): row for row in rows}
+        for entity_id, future in futures.items():
+            if future.done():
+                continue
+            if entity_id in found:
+                future.set_result(found[entity_id])
+            else:
+                self.__cache.pop((entity_name, view, entity_id), None)
+                route = Route("GET", "/entities/{}/{}".format(entity_name, entity_id))
+                route.base = self.client.base_url
+                future.set_exception(NotFound("Not found", route, None, None))
@@ -0,0 +1,264 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from logging import Logger
+from typing import Any, Dict, List, Optional, Set
+from uuid import UUID
+
+from .exceptions import ValidationError
+from .models.metadata import EntityMetadata, PropertyMetadata, ViewMetadata
+from .utils import MISSING
+
+_log: Logger = logging.getLogger(__name__)
+
+# Bump when the layout of the cache file changes, so stale files are ignored instead of misread.
+METADATA_CACHE_VERSION: int = 1
+
+# Views every entity has without being declared.
+BUILTIN_VIEWS = frozenset(("_local", "_minimal", "_base", "_instance_name"))
+
+_STRING_OPERATORS = frozenset(("startsWith", "endsWith", "contains"))
+_LIST_OPERATORS = frozenset(("in", "notin"))
+
+
+def _is_int(value: Any) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return True
+    try:
+        int(value)
+    except (TypeError, ValueError):
+        return False
+    return isinstance(value, str)
+
+
+def _is_number(value: Any) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+    return isinstance(value, str)
+
+
+def _is_uuid(value: Any) -> bool:
+    if isinstance(value, UUID):
+        return True
+    if isinstance(value, dict):
+        value = value.get("id")
+    try:
+        UUID(str(value))
+    except ValueError:
+        return False
+    return True
+
+
+_DATATYPE_CHECKS = {
+    "int": _is_int,
+    "long": _is_int,
+    "double": _is_number,
+    "decimal": _is_number,
+    "boolean": lambda v: isinstance(v, bool) or v in ("true", "false"),
+    "uuid": _is_uuid,
+    "string": lambda v: isinstance(v, str),
+}
+
+
+class MetadataCache:
+    """Holds the entity and view metadata of one API environment and persists it on disk.
+
+    The cache file records its layout version, the API base URL it was loaded from and when it was fetched. A file
+    that does not match or is older than ``max_age`` is ignored. Entries loaded from disk are not trusted blindly:
+    the owning route refreshes them once before reporting a validation error.
+    """
+
+    def __init__(self, base_url: str, *, path: Optional[str] = None, max_age: float = 86400.0) -> None:
+        """Initializes an empty metadata cache.
+
+        :param base_url: The API base URL the metadata belongs to.
+        :type base_url: str
+        :param path: The file to persist the cache to. If omitted, the cache only lives in memory.
+        :type path: Optional[str]
+        :param max_age: How long, in seconds, a cache file is used before the metadata is fetched again.
+        :type max_age: float
+        """
+        self.base_url: str = base_url
+        self.path: Optional[str] = path
+        self.max_age: float = max_age
+        self.fetched_at: float = 0.0
+
+        self.entities: Dict[str, EntityMetadata] = {}
+        self.views: Dict[str, Dict[str, ViewMetadata]] = {}
+        self.__raw_entities: List[dict] = []
+        self.__raw_views: Dict[str, List[dict]] = {}
+        # Keys fetched from the API by this process, as opposed to read from disk.
+        self.__fresh: Set[str] = set()
+
+    @property
+    def loaded(self) -> bool:
+        """Whether entity metadata is present."""
+        return bool(self.entities)
+
+    def is_fresh(self, entity_name: str) -> bool:
+        """Whether the metadata of ``entity_name`` was fetched by this process."""
+        return "entities" in self.__fresh and (entity_name not in self.views or entity_name in self.__fresh)
+
+    def set_entities(self, raw: List[dict]) -> None:
+        self.__raw_entities = raw
+        self.entities = {e["entityName"]: EntityMetadata(**e) for e in raw}
+        self.fetched_at = time.time()
+        self.__fresh.add("entities")
+
+    def set_views(self, entity_name: str, raw: List[dict]) -> None:
+        self.__raw_views[entity_name] = raw
+        self.views[entity_name] = {v["name"]: ViewMetadata(**v) for v in raw}
+        self.__fresh.add(entity_name)
+
+    def load(self) -> bool:
+        """Reads the cache file. Blocking, run it in an executor.
+
+        :return: Whether a usable cache file was found.
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data: Dict[str, Any] = json.load(f)
+        except (OSError, ValueError) as e:
+            _log.warning(f"Ignoring unreadable metadata cache {self.path}: {e}")
+            return False
+
+        if data.get("version") != METADATA_CACHE_VERSION or data.get("base") != self.base_url:
+            _log.info(f"Ignoring metadata cache {self.path} written for another version or environment")
+            return False
+        if time.time() - data.get("fetched_at", 0) >= self.max_age:
+            _log.info(f"Ignoring expired metadata cache {self.path}")
+            return False
+
+        self.__raw_entities = data["entities"]
+        self.entities = {e["entityName"]: EntityMetadata(**e) for e in self.__raw_entities}
+        self.__raw_views = data.get("views", {})
+        self.views = {name: {v["name"]: ViewMetadata(**v) for v in raw} for name, raw in self.__raw_views.items()}
+        self.fetched_at = data["fetched_at"]
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the contents of the cache file. Take it on the event loop, so :meth:`save` does not read the cache
+        while another coroutine changes it."""
+        return {
+            "version": METADATA_CACHE_VERSION,
+            "base": self.base_url,
+            "fetched_at": self.fetched_at,
+            "entities": self.__raw_entities,
+            "views": dict(self.__raw_views),
+        }
+
+    def save(self, snapshot: Optional[Dict[str, Any]] = None) -> None:
+        """Writes the cache file atomically. Blocking, run it in an executor.
+
+        :param snapshot: The contents to write, see :meth:`snapshot`. Taken from the cache if omitted.
+        :type snapshot: Optional[Dict[str, Any]]
+        """
+        if self.path is None:
+            return
+        if snapshot is None:
+            snapshot = self.snapshot()
+        directory, name = os.path.split(os.path.abspath(self.path))
+        # A temporary file of its own, so concurrent saves do not replace each other's file
+        fd, tmp = tempfile.mkstemp(prefix=f"{name}.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def resolve_property(self, entity_name: str, path: str) -> PropertyMetadata:
+        """Resolves a dotted property path, following references to other entities.
+
+        :raises ValidationError: The entity or one of the path segments does not exist.
+        """
+        current = entity_name
+        prop: PropertyMetadata = MISSING
+        for segment in path.split("."):
+            if prop is not MISSING:
+                if not prop.is_reference:
+                    raise ValidationError(f"{entity_name}: property {prop.name!r} is not a reference, cannot resolve {path!r}")
+                current = prop.type
+            meta = self.entities.get(current)
+            if meta is None:
+                raise ValidationError(f"Unknown entity {current!r}")
+            prop = meta.properties.get(segment)
+            if prop is None:
+                raise ValidationError(f"{current}: unknown property {segment!r} in {path!r}")
+        return prop
+
+    def validate_view(self, entity_name: str, view: str) -> None:
+        if entity_name not in self.entities:
+            raise ValidationError(f"Unknown entity {entity_name!r}")
+        if view in BUILTIN_VIEWS or view in self.views.get(entity_name, {}):
+            return
+        raise ValidationError(f"{entity_name}: unknown view {view!r}")
+
+    def validate_sort(self, entity_name: str, sort: str) -> None:
+        for field in sort.split(","):
+            self.resolve_property(entity_name, field.strip().lstrip("+-"))
+
+    def validate_changes(self, entity_name: str, changes: Dict[str, Any]) -> None:
+        """Checks the property names and value types of the fields of an update. Fields starting with ``_`` are skipped.
+
+        :raises ValidationError: A property does not exist, is read-only or the value has the wrong type.
+        """
+        for name, value in changes.items():
+            if name.startswith("_"):
+                continue
+            if "." in name:
+                raise ValidationError(f"{entity_name}: cannot update the nested property {name!r}")
+            prop = self.resolve_property(entity_name, name)
+            if prop.readOnly:
+                raise ValidationError(f"{entity_name}: property {name!r} is read-only")
+            if value is None or isinstance(value, (list, tuple)):
+                # Cleared values and collections are left to the server
+                continue
+            check = _is_uuid if prop.is_reference else _DATATYPE_CHECKS.get(prop.type) if prop.attributeType == "DATATYPE" else None
+            if check is not None and not check(value):
+                raise ValidationError(f"{entity_name}: value {value!r} does not match the type {prop.type} of {name!r}")
+
+    def validate_conditions(self, entity_name: str, conditions: List[Any]) -> None:
+        """Checks the property names, operators and value types of :class:`EntitySearchCondition` trees."""
+        for condition in conditions:
+            if condition.group:
+                self.validate_conditions(entity_name, condition.conditions or [])
+                continue
+
+            prop = self.resolve_property(entity_name, condition.property)
+            operator: str = condition.operator.value
+
+            if operator in _STRING_OPERATORS and not (prop.attributeType == "DATATYPE" and prop.type == "string"):
+                raise ValidationError(f"{entity_name}: operator {operator!r} requires a string property, {prop.name!r} is {prop.type}")
+            if operator == "notEmpty":
+                continue
+
+            if operator in _LIST_OPERATORS:
+                if not isinstance(condition.value, (list, tuple)):
+                    raise ValidationError(f"{entity_name}: operator {operator!r} requires a list value for {condition.property!r}")
+                values = condition.value
+            else:
+                values = [condition.value]
+
+            check = _is_uuid if prop.is_reference else _DATATYPE_CHECKS.get(prop.type) if prop.attributeType == "DATATYPE" else None
+            if check is None:
+                continue
+            for value in values:
+                if value is not None and not check(value):
+                    raise ValidationError(f"{entity_name}: value {value!r} does not match the type {prop.type} of {condition.property!r}")
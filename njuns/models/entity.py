@@ -1,14 +1,25 @@
-from typing import Dict, Any
+from typing import Dict, Any, FrozenSet, List
+
+_UNSET = object()
 
 
 class Entity:
-    """A class representing an entity. More can be found after logging in to NJUNS -> Help -> Data Model"""
+    """A class representing an entity. More can be found after logging in to NJUNS -> Help -> Data Model
+
+    Assignments to an entity are tracked, so that :meth:`EntitiesRoute.update_entity` can send only the changed
+    fields. In-place changes to mutable values, ex. appending to a list, are not seen; assign the value again instead.
+    """
+
+    # The change set lives in a slot, so it never shows up in the entity JSON
+    __slots__ = ("__dict__", "__changed")
 
     def __init__(self, *_, **kwargs):
+        object.__setattr__(self, "_Entity__changed", set())
         self.id = kwargs.get("id")
         self.entity_name = kwargs.get("_entity_name")
         self.instance_name = kwargs.get("_instance_name")
         self.__dict__.update(kwargs)
+        self.__changed.clear()
 
     # @classmethod
     # def build(cls, *_, **kwargs) -> "Entity":
@@ -28,8 +39,58 @@ class Entity:
             raise AttributeError(name=name)
 
     def __setattr__(self, key, value):
+        if key == "_Entity__changed":
+            # Restored by pickle when an entity is sent back from a process pool
+            object.__setattr__(self, key, value)
+            return
+        current = self.__dict__.get(key, _UNSET)
+        if current is _UNSET or current is not value and current != value:
+            self.__changed.add(key)
         self.__dict__[key] = value
 
+    def __delattr__(self, key):
+        del self.__dict__[key]
+        self.__changed.discard(key)
+
+    def __copy__(self) -> "Entity":
+        # The change set is copied too, so saving one of the entities does not mark the other one clean
+        copy = type(self).__new__(type(self))
+        object.__setattr__(copy, "_Entity__changed", set(self.__changed))
+        copy.__dict__.update(self.__dict__)
+        return copy
+
     @property
     def json(self) -> Dict[str, Any]:
         return self.__dict__
+
+    @property
+    def changed(self) -> FrozenSet[str]:
+        """The names of the fields assigned since the entity was loaded or last saved."""
+        return frozenset(self.__changed)
+
+    @property
+    def is_dirty(self) -> bool:
+        """Whether any field was assigned since the entity was loaded or last saved."""
+        return bool(self.__changed)
+
+    def changes(self) -> Dict[str, Any]:
+        """Returns the changed fields and their current values."""
+        return {key: self.__dict__[key] for key in self.__changed}
+
+    def mark_clean(self) -> None:
+        """Forgets the recorded changes, ex. after the entity was saved."""
+        self.__changed.clear()
+
+    def _apply_saved(self, sent: Dict[str, Any], data: Dict[str, Any]) -> None:
+        """Takes over the fields returned by the server after a save of ``sent`` and clears the saved changes.
+
+        Fields assigned again while the save was in flight keep their new value and stay changed.
+        """
+        pending = {key for key in self.__changed if key not in sent or self.__dict__.get(key, _UNSET) is not sent[key]}
+        self.__dict__.update({key: value for key, value in data.items() if key not in pending})
+        self.__changed.intersection_update(pending)
+
+
+def entities_from_json(data: List[Dict[str, Any]]) -> List[Entity]:
+    """Builds entities from a decoded JSON list. Module level, so it can be sent to a process pool."""
+    return [Entity(**e) for e in data]
@@ -0,0 +1,331 @@
+import operator
+import sys
+from array import array
+from functools import partial
+from itertools import compress
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Union
+
+from .entity import Entity
+
+# Column kinds and the array typecodes they are stored in. Columns that fit none of them are kept as lists.
+_TYPECODES: Dict[type, str] = {bool: "b", int: "q", float: "d"}
+
+# Comparisons used by EntityFrame.where, keyed by EntitySearchOperator value.
+_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "=": operator.eq,
+    "<>": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    # String operators ignore case, like the search endpoint
+    "startsWith": lambda a, b: isinstance(a, str) and isinstance(b, str) and a.lower().startswith(b.lower()),
+    "endsWith": lambda a, b: isinstance(a, str) and isinstance(b, str) and a.lower().endswith(b.lower()),
+    "contains": lambda a, b: isinstance(a, str) and isinstance(b, str) and b.lower() in a.lower(),
+    "notEmpty": lambda a, _: a is not None and a != "",
+    "in": lambda a, b: a in b,
+    "notin": lambda a, b: a not in b,
+}
+
+_NULL_SAFE = frozenset(("=", "<>", "notEmpty", "in", "notin"))
+
+# Comparisons with the compared value as their first argument, so partial(op, value) can be mapped over a column
+# without a Python call per row. "column < value" is "value > column".
+_REFLECTED: Dict[str, Callable[[Any, Any], bool]] = {
+    "=": operator.eq,
+    "<>": operator.ne,
+    "<": operator.gt,
+    "<=": operator.ge,
+    ">": operator.lt,
+    ">=": operator.le,
+}
+
+# The comparisons that are also mapped over list columns, as they hold for None like the row by row check.
+_LIST_SAFE = frozenset(("=", "<>"))
+
+
+def _pack(values: List[Any]) -> Union[array, List[Any]]:
+    """Stores a column in a typed array if every value has the same primitive type, interning strings otherwise."""
+    kinds = {type(v) for v in values}
+    if len(kinds) == 1:
+        kind = kinds.pop()
+        typecode = _TYPECODES.get(kind)
+        if typecode is not None:
+            try:
+                return array(typecode, values)
+            except OverflowError:
+                pass
+    return [sys.intern(v) if type(v) is str else v for v in values]
+
+
+def _append(column: Union[array, List[Any]], values: List[Any]) -> Union[array, List[Any]]:
+    """Appends values to a packed column, turning a typed array into a list if the values do not fit into it.
+
+    The result is the same as packing every value of the column at once.
+    """
+    packed = _pack(values)
+    if isinstance(column, array):
+        if isinstance(packed, array) and packed.typecode == column.typecode:
+            column.extend(packed)
+            return column
+        column = [bool(v) for v in column] if column.typecode == "b" else column.tolist()
+    if isinstance(packed, array):
+        packed = [bool(v) for v in packed] if packed.typecode == "b" else packed.tolist()
+    column.extend(packed)
+    return column
+
+
+class EntityRow:
+    """A read-only view of one row of an :class:`EntityFrame` that behaves like an :class:`Entity`."""
+
+    __slots__ = ("_frame", "_index")
+
+    def __init__(self, frame: "EntityFrame", index: int):
+        object.__setattr__(self, "_frame", frame)
+        object.__setattr__(self, "_index", index)
+
+    def __getattr__(self, name):
+        if name == "entity_name":
+            name = "_entity_name"
+        elif name == "instance_name":
+            name = "_instance_name"
+        try:
+            return self._frame.value(name, self._index)
+        except KeyError:
+            raise AttributeError(name=name)
+
+    def __getitem__(self, name: str) -> Any:
+        return self._frame.value(name, self._index)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("EntityFrame rows are read-only, use to_entity() for a mutable copy")
+
+    def __repr__(self) -> str:
+        return f"<EntityRow {self._index} of {self._frame.value('_entity_name', self._index) if '_entity_name' in self._frame else '?'}>"
+
+    @property
+    def json(self) -> Dict[str, Any]:
+        return {name: self._frame.value(name, self._index) for name in self._frame.columns}
+
+    def to_entity(self) -> Entity:
+        """Copies this row into a standalone :class:`Entity`."""
+        return Entity(**self.json)
+
+
+class EntityFrame:
+    """A columnar collection of entities.
+
+    Each property is stored as one column: a typed :class:`array.array` when every value is a bool, int or float,
+    otherwise a list with interned strings. Rows missing a property hold ``None`` in its column. Filtering,
+    projection and grouping return new frames; rows are handed out as :class:`EntityRow` views, so a frame of a
+    million entries does not keep a million ``__dict__`` objects alive.
+    """
+
+    def __init__(self, columns: Dict[str, Sequence[Any]], length: int) -> None:
+        """Initializes a frame from already packed columns. Use :meth:`from_records` or :class:`EntityFrameBuilder` instead.
+
+        :param columns: The column values keyed by property name. Every column must have ``length`` values.
+        :type columns: Dict[str, Sequence[Any]]
+        :param length: The amount of rows.
+        :type length: int
+        """
+        self.__columns: Dict[str, Sequence[Any]] = columns
+        self.__length: int = length
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "EntityFrame":
+        """Builds a frame from decoded entity JSON objects."""
+        builder = EntityFrameBuilder()
+        builder.extend(records)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.__columns
+
+    def __iter__(self) -> Iterator[EntityRow]:
+        return (EntityRow(self, i) for i in range(self.__length))
+
+    def __getitem__(self, key: Union[int, str]) -> Union[EntityRow, Sequence[Any]]:
+        """Returns the row at an index, or the column with a name."""
+        if isinstance(key, str):
+            return self.column(key)
+        if key < 0:
+            key += self.__length
+        if not 0 <= key < self.__length:
+            raise IndexError(key)
+        return EntityRow(self, key)
+
+    def __repr__(self) -> str:
+        return f"<EntityFrame rows={self.__length} columns={len(self.__columns)}>"
+
+    @property
+    def columns(self) -> List[str]:
+        """The property names of this frame."""
+        return list(self.__columns)
+
+    def column(self, name: str) -> Sequence[Any]:
+        """Returns the stored values of a column. Boolean columns are returned as their stored 0/1 array."""
+        return self.__columns[name]
+
+    def value(self, name: str, index: int) -> Any:
+        """Returns a single value, restoring booleans from their packed form."""
+        column = self.__columns[name]
+        value = column[index]
+        if isinstance(column, array) and column.typecode == "b":
+            return bool(value)
+        return value
+
+    def take(self, indices: Sequence[int]) -> "EntityFrame":
+        """Returns a new frame with the rows at ``indices``, in that order."""
+        columns: Dict[str, Sequence[Any]] = {}
+        for name, column in self.__columns.items():
+            values = [column[i] for i in indices]
+            columns[name] = array(column.typecode, values) if isinstance(column, array) else values
+        return EntityFrame(columns, len(indices))
+
+    def filter(self, mask: Union[Sequence[bool], Callable[[EntityRow], bool]]) -> "EntityFrame":
+        """Returns the rows for which ``mask`` is true.
+
+        :param mask: A sequence of booleans, one per row, or a predicate called with each row.
+        :type mask: Union[Sequence[bool], Callable[[EntityRow], bool]]
+        """
+        if callable(mask):
+            return self.take([i for i in range(self.__length) if mask(EntityRow(self, i))])
+        if len(mask) != self.__length:
+            raise ValueError(f"Mask has {len(mask)} values, expected {self.__length}")
+        return self.take([i for i, keep in enumerate(mask) if keep])
+
+    def where(self, name: str, op: Any, value: Any = None) -> "EntityFrame":
+        """Returns the rows whose column ``name`` satisfies a comparison.
+
+        Comparisons on typed columns, and ``=``, ``<>``, ``in`` and ``notin`` on any column, are mapped over the
+        column as a whole with builtin functions, without a Python call per row. Other comparisons, ex. string
+        operators, are checked row by row. String operators ignore case, like the search endpoint. A referenced
+        entity is compared by its ID, as in :meth:`group_by`.
+
+        :param name: The column to compare.
+        :type name: str
+        :param op: An :class:`EntitySearchOperator` or its string value, ex. ``"="`` or ``"startsWith"``.
+        :type op: Union[EntitySearchOperator, str]
+        :param value: The value to compare with. A collection for ``in`` and ``notin``.
+        :type value: Any
+        """
+        op = getattr(op, "value", op)
+        compare = _OPERATORS[op]
+        if op in ("in", "notin"):
+            try:
+                value = set(value)
+            except TypeError:
+                value = list(value)
+        column = self.__columns[name]
+        if not isinstance(column, array) and any(isinstance(v, Mapping) for v in column):
+            column = [v.get("id") if isinstance(v, Mapping) else v for v in column]
+        if isinstance(column, array) and column.typecode == "b" and isinstance(value, bool):
+            value = int(value)
+
+        mask: Optional[Iterable[bool]] = None
+        if op in ("in", "notin"):
+            mask = map(value.__contains__, column)
+            if op == "notin":
+                mask = map(operator.not_, mask)
+        elif op in _REFLECTED and (isinstance(column, array) or op in _LIST_SAFE):
+            mask = map(partial(_REFLECTED[op], value), column)
+        if mask is not None:
+            try:
+                return self.take(list(compress(range(self.__length), mask)))
+            except TypeError:
+                # Values that do not support this, ex. unhashable references, are left to the row by row check
+                pass
+
+        if op in _NULL_SAFE:
+            return self.take([i for i, v in enumerate(column) if compare(v, value)])
+        return self.take([i for i, v in enumerate(column) if v is not None and compare(v, value)])
+
+    def select(self, *names: str) -> "EntityFrame":
+        """Returns a frame with only the given columns. The column data is shared, not copied."""
+        return EntityFrame({name: self.__columns[name] for name in names}, self.__length)
+
+    def group_by(self, name: str) -> Dict[Any, "EntityFrame"]:
+        """Splits the frame by the values of a column. A reference column is grouped by the ID of the referenced entity.
+
+        :return: A frame per distinct value or ID, in order of first appearance.
+        """
+        groups: Dict[Any, List[int]] = {}
+        for i in range(self.__length):
+            key = self.value(name, i)
+            if isinstance(key, Mapping):
+                key = key.get("id")
+            groups.setdefault(key, []).append(i)
+        return {key: self.take(indices) for key, indices in groups.items()}
+
+    def to_numpy(self) -> Dict[str, Any]:
+        """Converts every column to a NumPy array. Typed columns are converted without copying.
+
+        Requires the optional ``numpy`` package.
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("EntityFrame.to_numpy requires numpy, install it with 'pip install numpy'") from None
+
+        dtypes = {"b": numpy.bool_, "q": numpy.int64, "d": numpy.float64}
+        return {
+            name: (
+                numpy.frombuffer(column, dtype=numpy.int8).astype(numpy.bool_)
+                if isinstance(column, array) and column.typecode == "b"
+                else numpy.frombuffer(column, dtype=dtypes[column.typecode])
+                if isinstance(column, array)
+                else numpy.array(column, dtype=object)
+            )
+            for name, column in self.__columns.items()
+        }
+
+    def to_pandas(self) -> Any:
+        """Converts the frame to a :class:`pandas.DataFrame`. Requires the optional ``pandas`` package."""
+        try:
+            import pandas
+        except ImportError:
+            raise ImportError("EntityFrame.to_pandas requires pandas, install it with 'pip install pandas'") from None
+        return pandas.DataFrame(self.to_numpy() if self.__columns else {})
+
+
+class EntityFrameBuilder:
+    """Accumulates entity JSON objects page by page and packs each page into the columns of an :class:`EntityFrame`."""
+
+    def __init__(self) -> None:
+        self.__columns: Dict[str, Union[array, List[Any]]] = {}
+        self.__length: int = 0
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def extend(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Appends decoded entity JSON objects.
+
+        The records are packed into the columns right away, so they can be dropped once this returns.
+        """
+        records = list(records)
+        if not records:
+            return
+        names = set(self.__columns)
+        for record in records:
+            names.update(record.keys())
+        for name in names:
+            values = [record.get(name) for record in records]
+            column = self.__columns.get(name)
+            if column is None:
+                # A property first seen now is missing from every earlier row
+                self.__columns[name] = _pack([None] * self.__length + values) if self.__length else _pack(values)
+            else:
+                self.__columns[name] = _append(column, values)
+        self.__length += len(records)
+
+    def build(self) -> EntityFrame:
+        """Returns the frame of the accumulated rows. The builder can be reused afterwards."""
+        frame = EntityFrame(self.__columns, self.__length)
+        self.__columns = {}
+        self.__length = 0
+        return frame
@@ -0,0 +1,12 @@
+from typing import Optional
+
+
+class FileDescriptor:
+    """A class representing a file stored in NJUNS. Its ID can be attached to ticket comments."""
+
+    def __init__(self, *_, **kwargs):
+        self.id: str = kwargs.get("id")
+        self.name: str = kwargs.get("name")
+        self.size: Optional[int] = kwargs.get("size")
+        self.extension: Optional[str] = kwargs.get("extension")
+        self.createDate: Optional[str] = kwargs.get("createDate")
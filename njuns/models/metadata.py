@@ -0,0 +1,41 @@
+from typing import Dict, List, Optional
+
+
+class PropertyMetadata:
+    """A class representing a property of an entity as described by the metadata route."""
+
+    def __init__(self, *_, **kwargs):
+        self.name: str = kwargs.get("name")
+        # One of DATATYPE, ENUM, ASSOCIATION or COMPOSITION.
+        self.attributeType: str = kwargs.get("attributeType")
+        # The datatype name (ex. "string", "int", "uuid") or the referenced enum or entity name.
+        self.type: str = kwargs.get("type")
+        self.cardinality: str = kwargs.get("cardinality")
+        self.mandatory: bool = kwargs.get("mandatory", False)
+        self.readOnly: bool = kwargs.get("readOnly", False)
+        self.description: Optional[str] = kwargs.get("description")
+
+    @property
+    def is_reference(self) -> bool:
+        """Whether this property references another entity."""
+        return self.attributeType in ("ASSOCIATION", "COMPOSITION")
+
+
+class EntityMetadata:
+    """A class representing the metadata of an entity type."""
+
+    def __init__(self, *_, **kwargs):
+        self.entityName: str = kwargs.get("entityName")
+        self.ancestor: Optional[str] = kwargs.get("ancestor")
+        self.properties: Dict[str, PropertyMetadata] = {
+            p["name"]: PropertyMetadata(**p) for p in kwargs.get("properties", [])
+        }
+
+
+class ViewMetadata:
+    """A class representing a view of an entity type."""
+
+    def __init__(self, *_, **kwargs):
+        self.name: str = kwargs.get("name")
+        self.entity: str = kwargs.get("entity")
+        self.properties: List[dict] = kwargs.get("properties", [])
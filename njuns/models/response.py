@@ -0,0 +1,36 @@
+from typing import Any, Mapping, Optional
+
+from ..route import Route
+
+
+class ResponseEnvelope:
+    """A class representing a completed response: its decoded body together with the status, headers and timings
+    that :meth:`HTTPClient.request` drops. Returned by :meth:`HTTPClient.request_envelope`.
+
+    Timings are in seconds. ``queue_time`` adds up the waits for the scheduler and rate limiter over every attempt,
+    ``server_time``, ``transfer_time`` and ``decode_time`` cover the final attempt only.
+    """
+
+    def __init__(self, *_, **kwargs):
+        self.route: Route = kwargs.get("route")
+        self.status: int = kwargs.get("status")
+        self.headers: Mapping[str, str] = kwargs.get("headers", {})
+        self.data: Any = kwargs.get("data")
+        self.attempts: int = kwargs.get("attempts", 1)
+        self.elapsed: float = kwargs.get("elapsed", 0.0)
+        self.queue_time: float = kwargs.get("queue_time", 0.0)
+        self.server_time: float = kwargs.get("server_time", 0.0)
+        self.transfer_time: float = kwargs.get("transfer_time", 0.0)
+        self.decode_time: float = kwargs.get("decode_time", 0.0)
+
+    def __repr__(self) -> str:
+        return f"<ResponseEnvelope {self.status} {self.route} attempts={self.attempts} elapsed={self.elapsed:.3f}>"
+
+    @property
+    def total_count(self) -> Optional[int]:
+        """The ``X-Total-Count`` header sent for requests with ``returnCount``, or ``None`` if it is missing."""
+        value = self.headers.get("X-Total-Count")
+        try:
+            return int(value) if value is not None else None
+        except ValueError:
+            return None
@@ -0,0 +1,664 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from enum import Enum
+from logging import Logger
+from typing import Any, Dict, List, Optional, Set
+from uuid import UUID
+
+import aiohttp
+
+from .exceptions import AuthenticationException, HTTPException, NotFound
+from .models.entity import Entity
+from .scheduler import Priority
+
+_log: Logger = logging.getLogger(__name__)
+
+
+class OutboxStatus(str, Enum):
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class OutboxEntry:
+    """A class representing a write queued in an :class:`Outbox`."""
+
+    def __init__(self, *_, **kwargs):
+        self.seq: int = kwargs.get("seq")
+        # The idempotency key: adding a write with a known key returns the existing entry instead.
+        self.key: str = kwargs.get("key")
+        # "comment" or "create"
+        self.kind: str = kwargs.get("kind")
+        # Writes with the same ordering key are sent one at a time, in the order they were added. A failed write holds
+        # back the later ones until it is retried or discarded, see :meth:`Outbox.retry` and :meth:`Outbox.discard`.
+        self.ordering_key: str = kwargs.get("ordering_key")
+        self.payload: Dict[str, Any] = kwargs.get("payload")
+        self.status: OutboxStatus = OutboxStatus(kwargs.get("status", OutboxStatus.PENDING))
+        self.attempts: int = kwargs.get("attempts", 0)
+        # Unix timestamp before which the entry is not sent, set after a failed attempt.
+        self.not_before: float = kwargs.get("not_before", 0.0)
+        self.last_error: Optional[str] = kwargs.get("last_error")
+        # The response of the successful attempt.
+        self.result: Any = kwargs.get("result")
+        self.created_at: float = kwargs.get("created_at", 0.0)
+        self.updated_at: float = kwargs.get("updated_at", 0.0)
+        # Unix timestamp at which the claim of a sending entry expires. Identifies the claim, so a worker whose claim
+        # expired and was taken over cannot record the outcome of its attempt over the newer one.
+        self.claimed_until: Optional[float] = kwargs.get("claimed_until")
+
+    def __repr__(self) -> str:
+        return f"<OutboxEntry {self.seq} {self.kind} {self.key!r} {self.status.value} attempts={self.attempts}>"
+
+    @property
+    def done(self) -> bool:
+        """Whether the entry was sent or gave up."""
+        return self.status in (OutboxStatus.SENT, OutboxStatus.FAILED)
+
+
+class OutboxStore(ABC):
+    """Base class for the durable storage of an :class:`Outbox`.
+
+    Every method blocks, so the outbox calls them in an executor. Stores may be shared by several processes; an entry
+    is handed to one of them at a time by :meth:`claim`.
+    """
+
+    @abstractmethod
+    def add(self, entry: OutboxEntry) -> OutboxEntry:
+        """Stores a new entry, or returns the stored entry with the same key."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[OutboxEntry]:
+        """Returns the entry with an idempotency key, if any."""
+
+    @abstractmethod
+    def claim(self, limit: int, lease: float) -> List[OutboxEntry]:
+        """Marks up to ``limit`` due entries as being sent and returns them with their :attr:`OutboxEntry.claimed_until`.
+
+        Only the oldest unfinished entry of each ordering key is due, and none while an older entry of the key failed.
+        Entries claimed more than ``lease`` seconds ago
+        without an outcome, ex. by a process that died, are handed out again.
+        """
+
+    @abstractmethod
+    def complete(self, entry: OutboxEntry, result: Any) -> bool:
+        """Marks a claimed entry as sent.
+
+        :return: Whether the claim was still held. If not, the entry was handed out again and is left unchanged.
+        """
+
+    @abstractmethod
+    def fail(self, entry: OutboxEntry, error: str, retry_at: Optional[float]) -> bool:
+        """Records a failed attempt of a claimed entry. The entry is retried at ``retry_at``, or given up if that is ``None``.
+
+        :return: Whether the claim was still held. If not, the entry was handed out again and is left unchanged.
+        """
+
+    @abstractmethod
+    def release(self, entry: OutboxEntry) -> bool:
+        """Hands back a claimed entry without an attempt, ex. when its outbox is closed.
+
+        :return: Whether the claim was still held.
+        """
+
+    @abstractmethod
+    def retry(self, key: str) -> Optional[OutboxEntry]:
+        """Queues a failed entry again, with a new set of attempts.
+
+        :return: The entry, or ``None`` if there is no failed entry with this key.
+        """
+
+    @abstractmethod
+    def discard(self, key: str) -> bool:
+        """Deletes a failed entry, so the later entries of its ordering key are sent.
+
+        :return: Whether there was a failed entry with this key.
+        """
+
+    @abstractmethod
+    def entries(self, status: Optional[OutboxStatus] = None, limit: int = 100) -> List[OutboxEntry]:
+        """Returns the oldest entries, optionally only those with a status."""
+
+    @abstractmethod
+    def counts(self) -> Dict[OutboxStatus, int]:
+        """Returns the amount of entries per status."""
+
+    @abstractmethod
+    def held(self) -> int:
+        """Returns the amount of pending entries held back by a failed entry of their ordering key."""
+
+    @abstractmethod
+    def purge(self, older_than: float) -> int:
+        """Deletes sent entries last updated more than ``older_than`` seconds ago and returns how many there were."""
+
+    def close(self) -> None:
+        """Releases the resources of the store."""
+
+
+class SQLiteOutboxStore(OutboxStore):
+    """Stores outbox entries in a SQLite database, which can be shared by the processes of a host."""
+
+    _COLUMNS = (
+        "seq, key, kind, ordering_key, payload, status, attempts, not_before, last_error, result, created_at, updated_at"
+    )
+
+    def __init__(self, path: str, *, timeout: float = 30.0) -> None:
+        """Initializes a SQLite outbox store.
+
+        :param path: The database file.
+        :type path: str
+        :param timeout: How long, in seconds, to wait for another process holding the database lock.
+        :type timeout: float
+        """
+        self.path: str = os.fspath(path)
+        # Autocommit mode, claims open their own write transaction
+        self.__connection: sqlite3.Connection = sqlite3.connect(self.path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.__connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL,
+                ordering_key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                not_before REAL NOT NULL DEFAULT 0,
+                claimed_until REAL,
+                last_error TEXT,
+                result TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS outbox_ordering ON outbox (ordering_key, seq);
+            CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, seq);
+            """
+        )
+        # The connection is shared by the executor threads, which cannot nest transactions on it.
+        self.__thread_lock: threading.Lock = threading.Lock()
+
+    def __entry(self, row: tuple) -> OutboxEntry:
+        seq, key, kind, ordering_key, payload, status, attempts, not_before, last_error, result, created_at, updated_at = row
+        return OutboxEntry(
+            seq=seq,
+            key=key,
+            kind=kind,
+            ordering_key=ordering_key,
+            payload=json.loads(payload),
+            status=status,
+            attempts=attempts,
+            not_before=not_before,
+            last_error=last_error,
+            result=json.loads(result) if result is not None else None,
+            created_at=created_at,
+            updated_at=updated_at,
+        )
+
+    def add(self, entry: OutboxEntry) -> OutboxEntry:
+        now = time.time()
+        with self.__thread_lock:
+            self.__connection.execute(
+                "INSERT OR IGNORE INTO outbox (key, kind, ordering_key, payload, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (entry.key, entry.kind, entry.ordering_key, json.dumps(entry.payload), OutboxStatus.PENDING.value, now, now),
+            )
+            row = self.__connection.execute(f"SELECT {self._COLUMNS} FROM outbox WHERE key = ?", (entry.key,)).fetchone()
+        return self.__entry(row)
+
+    def get(self, key: str) -> Optional[OutboxEntry]:
+        with self.__thread_lock:
+            row = self.__connection.execute(f"SELECT {self._COLUMNS} FROM outbox WHERE key = ?", (key,)).fetchone()
+        return self.__entry(row) if row else None
+
+    def claim(self, limit: int, lease: float) -> List[OutboxEntry]:
+        now = time.time()
+        with self.__thread_lock:
+            self.__connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.__connection.execute(
+                    f"""
+                    SELECT {self._COLUMNS} FROM outbox AS o
+                    WHERE (
+                        (o.status = 'pending' AND o.not_before <= :now)
+                        OR (o.status = 'sending' AND o.claimed_until < :now)
+                    )
+                    AND NOT EXISTS (
+                        SELECT 1 FROM outbox AS p
+                        WHERE p.ordering_key = o.ordering_key AND p.seq < o.seq AND p.status IN ('pending', 'sending', 'failed')
+                    )
+                    ORDER BY o.seq
+                    LIMIT :limit
+                    """,
+                    {"now": now, "limit": limit},
+                ).fetchall()
+                self.__connection.executemany(
+                    "UPDATE outbox SET status = 'sending', claimed_until = ?, updated_at = ? WHERE seq = ?",
+                    [(now + lease, now, row[0]) for row in rows],
+                )
+            except BaseException:
+                self.__connection.execute("ROLLBACK")
+                raise
+            else:
+                self.__connection.execute("COMMIT")
+        entries = [self.__entry(row[:5] + ("sending",) + row[6:]) for row in rows]
+        for entry in entries:
+            entry.claimed_until = now + lease
+        return entries
+
+    # Outcomes are only recorded while the claim they belong to is held
+    _CLAIMED = "seq = ? AND status = 'sending' AND claimed_until = ?"
+
+    def complete(self, entry: OutboxEntry, result: Any) -> bool:
+        with self.__thread_lock:
+            cursor = self.__connection.execute(
+                "UPDATE outbox SET status = 'sent', attempts = attempts + 1, claimed_until = NULL, result = ?, "
+                f"last_error = NULL, updated_at = ? WHERE {self._CLAIMED}",
+                (json.dumps(result), time.time(), entry.seq, entry.claimed_until),
+            )
+        return cursor.rowcount > 0
+
+    def fail(self, entry: OutboxEntry, error: str, retry_at: Optional[float]) -> bool:
+        with self.__thread_lock:
+            cursor = self.__connection.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, claimed_until = NULL, not_before = ?, "
+                f"last_error = ?, updated_at = ? WHERE {self._CLAIMED}",
+                (
+                    OutboxStatus.PENDING.value if retry_at is not None else OutboxStatus.FAILED.value,
+                    retry_at or 0.0,
+                    error,
+                    time.time(),
+                    entry.seq,
+                    entry.claimed_until,
+                ),
+            )
+        return cursor.rowcount > 0
+
+    def release(self, entry: OutboxEntry) -> bool:
+        with self.__thread_lock:
+            cursor = self.__connection.execute(
+                f"UPDATE outbox SET status = 'pending', claimed_until = NULL, updated_at = ? WHERE {self._CLAIMED}",
+                (time.time(), entry.seq, entry.claimed_until),
+            )
+        return cursor.rowcount > 0
+
+    def retry(self, key: str) -> Optional[OutboxEntry]:
+        with self.__thread_lock:
+            cursor = self.__connection.execute(
+                "UPDATE outbox SET status = 'pending', attempts = 0, not_before = 0, updated_at = ? WHERE key = ? AND status = 'failed'",
+                (time.time(), key),
+            )
+            if not cursor.rowcount:
+                return None
+            row = self.__connection.execute(f"SELECT {self._COLUMNS} FROM outbox WHERE key = ?", (key,)).fetchone()
+        return self.__entry(row)
+
+    def discard(self, key: str) -> bool:
+        with self.__thread_lock:
+            cursor = self.__connection.execute("DELETE FROM outbox WHERE key = ? AND status = 'failed'", (key,))
+        return cursor.rowcount > 0
+
+    def entries(self, status: Optional[OutboxStatus] = None, limit: int = 100) -> List[OutboxEntry]:
+        with self.__thread_lock:
+            if status is None:
+                rows = self.__connection.execute(f"SELECT {self._COLUMNS} FROM outbox ORDER BY seq LIMIT ?", (limit,)).fetchall()
+            else:
+                rows = self.__connection.execute(
+                    f"SELECT {self._COLUMNS} FROM outbox WHERE status = ? ORDER BY seq LIMIT ?", (OutboxStatus(status).value, limit)
+                ).fetchall()
+        return [self.__entry(row) for row in rows]
+
+    def counts(self) -> Dict[OutboxStatus, int]:
+        with self.__thread_lock:
+            rows = self.__connection.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        counts = {status: 0 for status in OutboxStatus}
+        counts.update({OutboxStatus(status): count for status, count in rows})
+        return counts
+
+    def held(self) -> int:
+        with self.__thread_lock:
+            (count,) = self.__connection.execute(
+                """
+                SELECT COUNT(*) FROM outbox AS o
+                WHERE o.status = 'pending' AND EXISTS (
+                    SELECT 1 FROM outbox AS p WHERE p.ordering_key = o.ordering_key AND p.seq < o.seq AND p.status = 'failed'
+                )
+                """
+            ).fetchone()
+        return count
+
+    def purge(self, older_than: float) -> int:
+        with self.__thread_lock:
+            cursor = self.__connection.execute(
+                "DELETE FROM outbox WHERE status = 'sent' AND updated_at < ?", (time.time() - older_than,)
+            )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        self.__connection.close()
+
+
+def _retryable(error: BaseException) -> bool:
+    """Whether a failed write may succeed when sent again."""
+    if isinstance(error, AuthenticationException):
+        # Expired or revoked sessions recover once the client logs in again
+        return True
+    if isinstance(error, HTTPException):
+        return error.response is None or error.response.status >= 500 or error.response.status == 429
+    # Timeouts, deadlines and dropped connections
+    return isinstance(error, (OSError, asyncio.TimeoutError, aiohttp.ClientError))
+
+
+class Outbox:
+    """A durable write-behind queue for ticket comments and entity creates.
+
+    Writes are stored in an :class:`OutboxStore` and acknowledged at once; a background worker sends them with
+    bounded concurrency and retries failed attempts with exponential backoff. Writes sharing an ordering key, by
+    default the ID of the ticket or entity they concern, are sent one at a time in the order they were added::
+
+        async with Outbox(client, SQLiteOutboxStore("outbox.db")) as outbox:
+            entry = await outbox.post_comment(ticket_id=ticket_id, comment="On site", key=request_id)
+            ...
+            entry = await outbox.status(request_id)
+
+    A write that is given up keeps the later writes of its ordering key queued until it is sent again with :meth:`retry`
+    or dropped with :meth:`discard`, so they are never applied without it.
+
+    Delivery is at least once. Creates get a client side ``id`` and are checked for before being sent again, so they
+    are not duplicated; a comment whose attempt failed after the server applied it may be posted twice.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        store: OutboxStore,
+        *,
+        concurrency: int = 4,
+        batch_size: int = 20,
+        max_attempts: int = 8,
+        retry_delay: float = 2.0,
+        max_retry_delay: float = 300.0,
+        poll_interval: float = 1.0,
+        lease: float = 300.0,
+        priority: Priority = Priority.BACKGROUND,
+    ) -> None:
+        """Initializes an outbox. The worker starts with :meth:`start`, or when the outbox is entered.
+
+        :param client: The logged-in :class:`NJUNSClient` to send the writes with.
+        :param store: The storage of the queued writes.
+        :type store: OutboxStore
+        :param concurrency: The maximum amount of writes sent at once. No more writes than that are claimed at a time.
+        :type concurrency: int
+        :param batch_size: The maximum amount of writes claimed from the store at once.
+        :type batch_size: int
+        :param max_attempts: How often a write is attempted before it is given up.
+        :type max_attempts: int
+        :param retry_delay: The delay, in seconds, before the first retry. It doubles with every further attempt.
+        :type retry_delay: float
+        :param max_retry_delay: The longest delay, in seconds, between two attempts.
+        :type max_retry_delay: float
+        :param poll_interval: How often, in seconds, the store is checked for writes added by other processes and due retries.
+        :type poll_interval: float
+        :param lease: How long, in seconds, a claimed write is reserved before another worker may take it over. Must
+                exceed the time a single attempt takes, including its retries within the client.
+        :type lease: float
+        :param priority: The scheduling priority of the writes.
+        :type priority: Priority
+        :raises ValueError: ``concurrency`` or ``batch_size`` is less than 1.
+        """
+        if concurrency < 1 or batch_size < 1:
+            raise ValueError("concurrency and batch_size must be at least 1")
+
+        self.client: Any = client
+        self.store: OutboxStore = store
+        self.concurrency: int = concurrency
+        self.batch_size: int = batch_size
+        self.max_attempts: int = max_attempts
+        self.retry_delay: float = retry_delay
+        self.max_retry_delay: float = max_retry_delay
+        self.poll_interval: float = poll_interval
+        self.lease: float = lease
+        self.priority: Priority = priority
+        self.__wake: asyncio.Event = asyncio.Event()
+        self.__worker: Optional[asyncio.Task] = None
+        self.__closing: bool = False
+        self.__deliveries: Set[asyncio.Task] = set()
+
+    async def __aenter__(self) -> "Outbox":
+        self.start()
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        await self.close()
+
+    async def __call(self, method, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+    def start(self) -> None:
+        """Starts the background worker."""
+        if self.__worker is None:
+            self.__closing = False
+            self.__worker = asyncio.get_running_loop().create_task(self.__run())
+
+    async def close(self) -> None:
+        """Stops the worker after the writes in flight are finished. Queued writes stay in the store."""
+        self.__closing = True
+        self.__wake.set()
+        if self.__worker is not None:
+            await self.__worker
+            self.__worker = None
+
+    async def post_comment(
+        self,
+        *,
+        ticket_id: UUID,
+        comment: str,
+        file_descriptor_ids: List[UUID] = (),
+        flagged: bool = False,
+        key: Optional[str] = None,
+        ordering_key: Optional[str] = None,
+    ) -> OutboxEntry:
+        """Queues a comment for :meth:`ServicesRoute.post_comment_to_ticket`.
+
+        :param ticket_id: The ticket to comment on.
+        :type ticket_id: UUID
+        :param comment: The comment text.
+        :type comment: str
+        :param file_descriptor_ids: Files to attach, see :meth:`FilesRoute.upload_file`.
+        :type file_descriptor_ids: List[UUID]
+        :param flagged: Whether the comment is flagged.
+        :type flagged: bool
+        :param key: The idempotency key. Queuing a write with a key already in the store returns the stored entry.
+        :type key: Optional[str]
+        :param ordering_key: Writes with the same ordering key are sent in order. Defaults to the ticket ID.
+        :type ordering_key: Optional[str]
+        :return: The stored entry.
+        """
+        return await self.__add(
+            OutboxEntry(
+                key=key or uuid.uuid4().hex,
+                kind="comment",
+                ordering_key=ordering_key or str(ticket_id),
+                payload={
+                    "ticket_id": str(ticket_id),
+                    "comment": comment,
+                    "file_descriptor_ids": [str(i) for i in file_descriptor_ids],
+                    "flagged": flagged,
+                },
+            )
+        )
+
+    async def create_entity(
+        self,
+        entity_name: str,
+        *,
+        entity: Entity,
+        key: Optional[str] = None,
+        ordering_key: Optional[str] = None,
+    ) -> OutboxEntry:
+        """Queues an entity for :meth:`EntitiesRoute.create_entity`.
+
+        An entity without an ``id`` is given a new UUID, so it can be referenced, ex. by comments on a new ticket,
+        before it is sent.
+
+        :param entity_name: Entity name.
+        :type entity_name: str
+        :param entity: The entity to create.
+        :type entity: Entity
+        :param key: The idempotency key. Queuing a write with a key already in the store returns the stored entry.
+        :type key: Optional[str]
+        :param ordering_key: Writes with the same ordering key are sent in order. Defaults to the entity ID.
+        :type ordering_key: Optional[str]
+        :return: The stored entry.
+        """
+        if not entity.id:
+            entity.id = str(uuid.uuid4())
+        return await self.__add(
+            OutboxEntry(
+                key=key or uuid.uuid4().hex,
+                kind="create",
+                ordering_key=ordering_key or str(entity.id),
+                payload={"entity_name": entity_name, "entity": entity.json},
+            )
+        )
+
+    async def __add(self, entry: OutboxEntry) -> OutboxEntry:
+        stored = await self.__call(self.store.add, entry)
+        if stored.payload != entry.payload:
+            _log.warning(f"Outbox key {entry.key!r} is already used by another write, returning the stored one")
+        self.__wake.set()
+        return stored
+
+    async def status(self, key: str) -> Optional[OutboxEntry]:
+        """Returns the entry queued with an idempotency key, if it is still stored."""
+        return await self.__call(self.store.get, key)
+
+    async def entries(self, status: Optional[OutboxStatus] = None, *, limit: int = 100) -> List[OutboxEntry]:
+        """Returns the oldest stored entries, optionally only those with a status, ex. ``OutboxStatus.FAILED``."""
+        return await self.__call(self.store.entries, status, limit)
+
+    async def counts(self) -> Dict[OutboxStatus, int]:
+        """Returns the amount of stored entries per status."""
+        return await self.__call(self.store.counts)
+
+    async def retry(self, key: str) -> Optional[OutboxEntry]:
+        """Queues a write that was given up again, with ``max_attempts`` new attempts.
+
+        :param key: The idempotency key of the write.
+        :type key: str
+        :return: The queued entry, or ``None`` if no write with this key failed.
+        """
+        entry = await self.__call(self.store.retry, key)
+        if entry is not None:
+            self.__wake.set()
+        return entry
+
+    async def discard(self, key: str) -> bool:
+        """Drops a write that was given up, so the writes queued after it for the same ordering key are sent.
+
+        :param key: The idempotency key of the write.
+        :type key: str
+        :return: Whether a write with this key had failed and was dropped.
+        """
+        discarded = await self.__call(self.store.discard, key)
+        if discarded:
+            self.__wake.set()
+        return discarded
+
+    async def flush(self) -> None:
+        """Waits until every queued write, including writes waiting for a retry, was sent or given up.
+
+        Writes held back by a failed write of their ordering key are not waited for, see :meth:`retry`.
+        """
+        while True:
+            counts = await self.counts()
+            if not counts[OutboxStatus.SENDING] and counts[OutboxStatus.PENDING] <= await self.__call(self.store.held):
+                return
+            self.__wake.set()
+            await asyncio.sleep(min(self.poll_interval, 0.05))
+
+    async def __run(self) -> None:
+        while not self.__closing:
+            self.__wake.clear()
+            # Only claim writes that can be sent right away, claims waiting for a free slot would expire unsent
+            room = min(self.batch_size, self.concurrency - len(self.__deliveries))
+            if room <= 0:
+                await asyncio.wait(self.__deliveries, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            try:
+                entries = await self.__call(self.store.claim, room, self.lease)
+            except Exception:
+                _log.exception("Claiming outbox entries failed")
+                entries = []
+
+            for entry in entries:
+                task = asyncio.get_running_loop().create_task(self.__deliver(entry))
+                self.__deliveries.add(task)
+                task.add_done_callback(self.__deliveries.discard)
+
+            if len(entries) < room:
+                # Drained, sleep until a write is added, a delivery finishes or the next poll
+                try:
+                    await asyncio.wait_for(self.__wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+        if self.__deliveries:
+            await asyncio.gather(*self.__deliveries, return_exceptions=True)
+
+    async def __deliver(self, entry: OutboxEntry) -> None:
+        try:
+            if self.__closing:
+                await self.__call(self.store.release, entry)
+                return
+            result = await self.__send(entry)
+        except asyncio.CancelledError:
+            asyncio.get_running_loop().run_in_executor(None, self.store.release, entry)
+            raise
+        except Exception as e:
+            attempts = entry.attempts + 1
+            if _retryable(e) and attempts < self.max_attempts:
+                delay = min(self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay)
+                _log.warning(f"Outbox {entry.kind} {entry.key!r} failed, retrying in {delay} seconds: {e}")
+                held = await self.__call(self.store.fail, entry, str(e), time.time() + delay)
+            else:
+                _log.error(f"Outbox {entry.kind} {entry.key!r} failed after {attempts} attempts: {e}")
+                held = await self.__call(self.store.fail, entry, str(e), None)
+        else:
+            _log.debug(f"Outbox {entry.kind} {entry.key!r} sent")
+            held = await self.__call(self.store.complete, entry, result)
+        if not held:
+            _log.warning(f"Outbox {entry.kind} {entry.key!r} outlived its lease of {self.lease} seconds and was handed out again")
+        # The next write of the same ordering key is due now
+        self.__wake.set()
+
+    async def __send(self, entry: OutboxEntry) -> Any:
+        payload = entry.payload
+        if entry.kind == "comment":
+            return await self.client.post_comment_to_ticket(
+                ticket_id=payload["ticket_id"],
+                comment=payload["comment"],
+                file_descriptor_ids=payload["file_descriptor_ids"],
+                flagged=payload["flagged"],
+                priority=self.priority,
+            )
+        if entry.kind == "create":
+            entity = Entity(**payload["entity"])
+            if entry.attempts:
+                # An earlier attempt may have been applied before it failed, ex. by a timeout
+                try:
+                    existing = await self.client.fetch_entity(payload["entity_name"], entity.id, view="_minimal", priority=self.priority)
+                except NotFound:
+                    pass
+                else:
+                    _log.info(f"Outbox create {entry.key!r} was already applied")
+                    return existing.json
+            return await self.client.create_entity(payload["entity_name"], entity=entity, priority=self.priority)
+        raise ValueError(f"Unknown outbox entry kind {entry.kind!r}")
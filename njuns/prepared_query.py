@@ -0,0 +1,287 @@
+import json
+import logging
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+from logging import Logger
+from typing import Any, Callable, Dict, List, Mapping, Optional
+from urllib.parse import urlencode
+from uuid import UUID
+
+from . import timeouts
+from .exceptions import ValidationError
+from .models.entity import Entity, entities_from_json
+from .models.predefined_query import PredefinedQuery, QueryParameter
+from .route import Route
+from .scheduler import Priority
+from .utils import MISSING
+
+_log: Logger = logging.getLogger(__name__)
+
+# Converts a parameter value to the string sent in the query URL, raising ValueError or TypeError if it does not fit
+Coercion = Callable[[Any], str]
+
+
+def _to_int(value: Any) -> str:
+    if isinstance(value, bool):
+        raise TypeError("booleans are not integers")
+    if isinstance(value, (float, Decimal)):
+        try:
+            fractional = value % 1
+        except ArithmeticError:
+            raise ValueError("not a finite number") from None
+        if fractional:
+            # Also true for NaN and infinity
+            raise ValueError("value has a fractional part")
+    return str(int(value))
+
+
+def _to_decimal(value: Any) -> str:
+    if isinstance(value, bool):
+        raise TypeError("booleans are not numbers")
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError("not a number") from None
+    if not number.is_finite():
+        raise ValueError("not a finite number")
+    return str(number)
+
+
+def _to_bool(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower()
+    raise ValueError("not a boolean")
+
+
+def _to_uuid(value: Any) -> str:
+    return str(value if isinstance(value, UUID) else UUID(str(_to_id(value))))
+
+
+def _to_id(value: Any) -> str:
+    """Reduces an entity, entity JSON or ID to the ID, for parameters typed with an entity class."""
+    if isinstance(value, Entity):
+        value = value.id
+    elif isinstance(value, Mapping):
+        value = value.get("id")
+    if value is None:
+        raise ValueError("entity has no id")
+    return str(value)
+
+
+def _to_datetime(value: Any) -> str:
+    # The date format of the NJUNS REST API
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S.") + f"{value.microsecond // 1000:03d}"
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%d 00:00:00.000")
+    if isinstance(value, str):
+        return value
+    raise TypeError("not a date")
+
+
+def _to_date(value: Any) -> str:
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, str):
+        return value
+    raise TypeError("not a date")
+
+
+def _to_time(value: Any) -> str:
+    if isinstance(value, (time, datetime)):
+        return value.strftime("%H:%M:%S")
+    if isinstance(value, str):
+        return value
+    raise TypeError("not a time")
+
+
+def _to_string(value: Any) -> str:
+    if not isinstance(value, str):
+        raise TypeError("not a string")
+    return value
+
+
+# Keyed by the Java class or datatype name given as QueryParameter.type
+_COERCIONS: Dict[str, Coercion] = {
+    "java.lang.String": _to_string,
+    "string": _to_string,
+    "java.lang.Integer": _to_int,
+    "java.lang.Long": _to_int,
+    "java.lang.Short": _to_int,
+    "java.lang.Byte": _to_int,
+    "int": _to_int,
+    "long": _to_int,
+    "java.lang.Double": _to_decimal,
+    "java.lang.Float": _to_decimal,
+    "java.math.BigDecimal": _to_decimal,
+    "double": _to_decimal,
+    "decimal": _to_decimal,
+    "java.lang.Boolean": _to_bool,
+    "boolean": _to_bool,
+    "java.util.UUID": _to_uuid,
+    "uuid": _to_uuid,
+    "java.util.Date": _to_datetime,
+    "java.time.LocalDateTime": _to_datetime,
+    "java.time.OffsetDateTime": _to_datetime,
+    "dateTime": _to_datetime,
+    "java.time.LocalDate": _to_date,
+    "java.sql.Date": _to_date,
+    "date": _to_date,
+    "java.time.LocalTime": _to_time,
+    "java.sql.Time": _to_time,
+    "time": _to_time,
+}
+
+_COLLECTION_TYPES = frozenset(("java.util.List", "java.util.Collection", "java.util.Set"))
+
+
+def parameter_coercion(parameter: QueryParameter) -> Coercion:
+    """Returns the function converting values of a query parameter to their URL form, based on its declared type.
+
+    Array and collection types take lists, which are sent as JSON arrays. Types naming an entity class take an
+    :class:`Entity`, entity JSON or an ID. Unknown types are sent as ``str(value)``.
+    """
+    kind: str = parameter.type or ""
+    if kind.endswith("[]") or kind in _COLLECTION_TYPES:
+        element = parameter_coercion(QueryParameter(name=parameter.name, type=kind[:-2] if kind.endswith("[]") else ""))
+
+        def coerce_list(value: Any) -> str:
+            if isinstance(value, (str, bytes, Mapping)) or not hasattr(value, "__iter__"):
+                raise TypeError("not a list")
+            return json.dumps([element(v) for v in value])
+
+        return coerce_list
+
+    coercion = _COERCIONS.get(kind)
+    if coercion is not None:
+        return coercion
+    if "." in kind and not kind.startswith("java."):
+        # An entity class
+        return _to_id
+    return str
+
+
+class PreparedQuery:
+    """A predefined query with its URL and parameter conversions resolved, for repeated executions.
+
+    Created with :meth:`QueriesRoute.prepare_query`. Executing it sends the request right away, without looking up
+    the query catalog or the parameter types again::
+
+        by_status = await client.prepare_query("njuns$Ticket", "ticketsByStatus")
+        for status in ("OPEN", "CLOSED"):
+            tickets = await by_status.execute({"status": status})
+    """
+
+    def __init__(self, client: Any, query: PredefinedQuery, entity_name: str) -> None:
+        """Initializes a prepared query.
+
+        :param client: The :class:`HTTPClient` to send the query with.
+        :param query: The query description from the query catalog.
+        :type query: PredefinedQuery
+        :param entity_name: The entity the query belongs to.
+        :type entity_name: str
+        """
+        self.client: Any = client
+        self.query: PredefinedQuery = query
+        self.entity_name: str = entity_name
+        self.__path: str = "/queries/{}/{}".format(entity_name, query.name)
+        self.__coercions: Dict[str, Coercion] = {p.name: parameter_coercion(p) for p in query.params}
+
+    def __repr__(self) -> str:
+        return f"<PreparedQuery {self.entity_name}/{self.query.name} params={list(self.__coercions)}>"
+
+    @property
+    def name(self) -> str:
+        return self.query.name
+
+    @property
+    def parameters(self) -> List[str]:
+        """The names of the parameters of the query."""
+        return list(self.__coercions)
+
+    def bind(self, params: Optional[Mapping[str, Any]] = None) -> Dict[str, str]:
+        """Converts parameter values to the strings sent to the server.
+
+        :param params: A value for every parameter of the query.
+        :type params: Optional[Mapping[str, Any]]
+        :return: The converted values.
+        :raises ValidationError: A parameter is missing or unknown, or a value does not fit the parameter type.
+        """
+        params = params or {}
+        if not isinstance(params, Mapping):
+            raise ValidationError(f"Parameters for query {self.query.name!r} must be a mapping, got {type(params).__name__}")
+        unknown = params.keys() - self.__coercions.keys()
+        if unknown:
+            raise ValidationError(f"Unknown parameters for query {self.query.name!r}: {', '.join(sorted(unknown))}")
+        missing = self.__coercions.keys() - params.keys()
+        if missing:
+            raise ValidationError(f"Missing parameters for query {self.query.name!r}: {', '.join(sorted(missing))}")
+
+        bound: Dict[str, str] = {}
+        for name, coercion in self.__coercions.items():
+            try:
+                bound[name] = coercion(params[name])
+            except (TypeError, ValueError) as e:
+                kind = next(p.type for p in self.query.params if p.name == name)
+                raise ValidationError(
+                    f"Parameter {name!r} of query {self.query.name!r} expects {kind}, got {params[name]!r}: {e}"
+                ) from None
+        return bound
+
+    async def execute(
+        self,
+        params: Optional[Mapping[str, Any]] = None,
+        *,
+        limit: Optional[int] = MISSING,
+        offset: Optional[int] = MISSING,
+        view: Optional[str] = MISSING,
+        return_nulls: Optional[bool] = MISSING,
+        return_count: Optional[bool] = MISSING,
+        dynamic_attributes: Optional[bool] = MISSING,
+        priority: Priority = Priority.NORMAL,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> List[Entity]:
+        """Executes the query with a set of parameter values and retrieves up to 50 results.
+
+        :param params: A value for every parameter of the query, see :meth:`bind`.
+        :type params: Optional[Mapping[str, Any]]
+        :param limit: Number of extracted entities. Max is capped to 50.
+        :type limit: int
+        :param offset: Position of the first result to retrieve.
+        :type offset: int
+        :param view: Name of the view which is used for loading the entity, instead of the view of the query.
+        :type view: str
+        :param return_nulls: Specifies whether null fields will be written to the result JSON.
+        :type return_nulls: bool
+        :param return_count: Specifies whether the total count of entities should be returned in the 'X-Total-Count' header.
+        :type return_count: bool
+        :param dynamic_attributes: Specifies whether entity dynamic attributes should be returned.
+        :type dynamic_attributes: bool
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        :return: A list of entities.
+        :raises ValidationError: The parameter values do not match the query, see :meth:`bind`.
+        """
+        with timeouts.deadline(timeout, at=deadline):
+            if isinstance(limit, int) and limit > 50:
+                raise ValueError("Limit must be less than or equal to 50")
+
+            path = self.__path + Route.assemble_params(
+                limit=min(limit, 50) if isinstance(limit, int) else 50,
+                offset=offset if isinstance(offset, int) else MISSING,
+                view=view,
+                returnNulls=return_nulls,
+                returnCount=return_count,
+                dynamicAttributes=dynamic_attributes,
+            )
+            bound = self.bind(params)
+            if bound:
+                path += "&" + urlencode(bound)
+            return await self.client.request(Route("GET", path), priority=priority, transform=entities_from_json)
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from logging import Logger
+from typing import Optional, Tuple
+
+_log: Logger = logging.getLogger(__name__)
+
+
+class RateLimiter(ABC):
+    """Base class for rate limiters consulted by :class:`HTTPClient` before every request attempt.
+
+    Limiters hand out reservations from a token bucket: ``rate`` requests per ``per`` seconds with bursts of up to
+    ``burst`` requests. A 429 response blocks every user of the limiter until the server's ``Retry-After`` has passed.
+    """
+
+    def __init__(self, rate: float, per: float = 1.0, *, burst: Optional[int] = None) -> None:
+        """Initializes a rate limiter.
+
+        :param rate: The amount of requests allowed per ``per`` seconds.
+        :type rate: float
+        :param per: The period of ``rate`` in seconds.
+        :type per: float
+        :param burst: The amount of requests that may be sent at once after an idle period. Defaults to ``rate``.
+        :type burst: Optional[int]
+        """
+        if rate <= 0 or per <= 0:
+            raise ValueError("rate and per must be positive")
+        self.rate: float = rate / per
+        self.burst: float = float(burst if burst is not None else max(1.0, rate))
+
+    def _reserve(self, tokens: float, updated_at: float, blocked_until: float, now: float) -> Tuple[float, float]:
+        """Reserves one request from a bucket state.
+
+        :return: The new amount of tokens and how long the caller must wait before sending.
+        """
+        if now < blocked_until:
+            return tokens, blocked_until - now
+        tokens = min(self.burst, tokens + (now - max(updated_at, blocked_until)) * self.rate) - 1
+        return tokens, max(0.0, -tokens / self.rate)
+
+    @abstractmethod
+    async def acquire(self) -> None:
+        """Waits until a request may be sent."""
+
+    @abstractmethod
+    async def penalize(self, retry_after: float) -> None:
+        """Blocks every user of this limiter for ``retry_after`` seconds after a 429 response."""
+
+
+class LocalRateLimiter(RateLimiter):
+    """A rate limiter shared by the clients of one process."""
+
+    def __init__(self, rate: float, per: float = 1.0, *, burst: Optional[int] = None) -> None:
+        super().__init__(rate, per, burst=burst)
+        self.__tokens: float = self.burst
+        self.__updated_at: float = time.time()
+        self.__blocked_until: float = 0.0
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.time()
+            if now < self.__blocked_until:
+                await asyncio.sleep(self.__blocked_until - now)
+                continue
+            self.__tokens, wait = self._reserve(self.__tokens, self.__updated_at, self.__blocked_until, now)
+            self.__updated_at = now
+            if wait > 0:
+                await asyncio.sleep(wait)
+            return
+
+    async def penalize(self, retry_after: float) -> None:
+        self.__blocked_until = max(self.__blocked_until, time.time() + retry_after)
+        self.__tokens = 0.0
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """A rate limiter shared by every process on a host that opens the same SQLite file.
+
+    Each reservation is a single immediate write transaction on the bucket row, run in an executor.
+    Clocks are compared with :func:`time.time`, which all processes of a host share.
+    """
+
+    def __init__(self, path: str, rate: float, per: float = 1.0, *, burst: Optional[int] = None, timeout: float = 30.0) -> None:
+        """Initializes a shared rate limiter.
+
+        :param path: The SQLite database coordinating the processes.
+        :type path: str
+        :param rate: The amount of requests allowed per ``per`` seconds across all processes.
+        :type rate: float
+        :param per: The period of ``rate`` in seconds.
+        :type per: float
+        :param burst: The amount of requests that may be sent at once after an idle period. Defaults to ``rate``.
+        :type burst: Optional[int]
+        :param timeout: How long, in seconds, to wait for the database lock.
+        :type timeout: float
+        """
+        super().__init__(rate, per, burst=burst)
+        self.path: str = os.fspath(path)
+        self.__connection: sqlite3.Connection = sqlite3.connect(self.path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS bucket (id INTEGER PRIMARY KEY CHECK (id = 0), tokens REAL, updated_at REAL, blocked_until REAL)"
+        )
+        self.__connection.execute("INSERT OR IGNORE INTO bucket VALUES (0, ?, ?, 0)", (self.burst, time.time()))
+        # The connection is shared by every client of this process, which cannot nest transactions on it.
+        self.__lock: threading.Lock = threading.Lock()
+
+    def __transaction(self, retry_after: Optional[float]) -> Tuple[float, bool]:
+        """Reserves a request, or records a block if ``retry_after`` is given.
+
+        :return: How long to wait, and whether a request was reserved. Nothing is reserved while blocked.
+        """
+        with self.__lock:
+            self.__connection.execute("BEGIN IMMEDIATE")
+            try:
+                tokens, updated_at, blocked_until = self.__connection.execute(
+                    "SELECT tokens, updated_at, blocked_until FROM bucket WHERE id = 0"
+                ).fetchone()
+                now = time.time()
+                if retry_after is not None:
+                    blocked_until = max(blocked_until, now + retry_after)
+                    self.__connection.execute("UPDATE bucket SET tokens = 0, updated_at = ?, blocked_until = ? WHERE id = 0", (now, blocked_until))
+                    result = (0.0, False)
+                elif now < blocked_until:
+                    result = (blocked_until - now, False)
+                else:
+                    tokens, wait = self._reserve(tokens, updated_at, blocked_until, now)
+                    self.__connection.execute("UPDATE bucket SET tokens = ?, updated_at = ? WHERE id = 0", (tokens, now))
+                    result = (wait, True)
+            except BaseException:
+                self.__connection.execute("ROLLBACK")
+                raise
+            self.__connection.execute("COMMIT")
+            return result
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            wait, reserved = await loop.run_in_executor(None, self.__transaction, None)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if reserved:
+                return
+
+    async def penalize(self, retry_after: float) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.__transaction, retry_after)
+
+    def close(self) -> None:
+        self.__connection.close()
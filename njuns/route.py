@@ -10,16 +10,29 @@ _log: Logger = logging.getLogger(__name__)
 Method = Literal["GET", "POST", "PUT", "DELETE"]
 
 
+def api_base_url(*, host: str = "njuns.com", app: str = "app") -> str:
+    """Builds the base URL of an API environment. Defaults to the production environment.
+
+    :param host: The host to connect to.
+    :type host: str
+    :param app: The app instance name to use.
+    :type app: str
+    :return: The base URL that routes are appended to.
+    """
+    return f"https://{host}/{app}/rest/v2"
+
+
 def _set_api_environment(*, host: str = "njuns.com", app: str = "app") -> None:
-    """Alter the :class:`Route` API environment. Defaults to the production environment.
+    """Alter the default :class:`Route` API environment for every client that was not given its own ``base_url``.
+    Defaults to the production environment.
 
     :param host: The host to connect to.
     :type host: str
     :param app: The app instance name to use.
     :type app: str
     """
-    _log.info(f"Setting base API environment to {host}/{app}...")
-    Route.BASE = f"https://{host}/{app}/rest/v2"
+    _log.info(f"Setting default base API environment to {host}/{app}...")
+    Route.BASE = api_base_url(host=host, app=app)
 
 
 class Route:
@@ -39,18 +52,29 @@ class Route:
         """
         self.path: str = path
         self.method: Method = method
+        # The client sending the route binds it to its own environment, see :meth:`HTTPClient.request`.
+        self.base: str = self.BASE
 
-        url = self.BASE + self.path
-        # Assemble URL with parameters if present
+        # Assemble path with parameters if present
         if params:
-            url = url.format_map(
+            path = path.format_map(
                 {k: quote(v) if isinstance(v, str) else v for k, v in params.items()}
             )
-        self.url: str = url
+        self.__formatted_path: str = path
+
+    @property
+    def url(self) -> str:
+        """The full URL of the route in its bound environment."""
+        return self.base + self.__formatted_path
 
     def __str__(self) -> str:
         return f"{self.method} {self.url}"
 
+    @property
+    def key(self) -> str:
+        """The route path without its query string, used to group requests to the same endpoint."""
+        return self.path.partition("?")[0]
+
     @staticmethod
     def assemble_params(*_, **kwargs) -> str:
         params = "&".join(
@@ -1,7 +1,7 @@
 import logging
 from abc import ABC
 from logging import Logger
-from typing import Any, Callable, Awaitable
+from typing import Any, AsyncContextManager, Callable, Awaitable
 
 from ..route import Route
 from ..utils import Response
@@ -18,4 +18,15 @@ class BaseRoute(ABC):
         :param client: The :class:`HTTPClient` instance.
         """
         self.request: Callable[[Route, ...], Awaitable[Response]] = client.request
+        self.request_envelope: Callable[[Route, ...], Awaitable[Any]] = client.request_envelope
+        self.stream: Callable[[Route, ...], AsyncContextManager[Any]] = client.stream
         _log.debug(f"Initializing {__name__}")
+
+    async def _validate(self, entity_name: str, **kwargs: Any) -> None:
+        """Hook to validate an entity request before it is sent. Does nothing unless a route overrides it.
+
+        :param entity_name: The entity the request targets.
+        :type entity_name: str
+        :param kwargs: The ``view``, ``sort`` and ``conditions`` of the request, if any.
+        """
+        return None
@@ -4,8 +4,14 @@ from logging import Logger
 from typing import Optional, Any, List, Union
 
 from ._base import BaseRoute
-from ..models.entity import Entity
+from .. import timeouts
+from ..batcher import SearchBatcher, current_search_batcher
+from ..exceptions import HTTPException
+from ..models.entity import Entity, entities_from_json
+from ..models.entity_frame import EntityFrame, EntityFrameBuilder
+from ..loader import EntityLoader, current_entity_loader
 from ..route import Route
+from ..scheduler import Priority
 from ..utils import MISSING, Response
 
 _log: Logger = logging.getLogger(__name__)
@@ -85,6 +91,43 @@ class EntitySearchCondition:
             }
 
 
+def _search_body(
+        conditions: List[EntitySearchCondition],
+        *,
+        view: Optional[str] = MISSING,
+        limit: Optional[int] = MISSING,
+        offset: Optional[int] = MISSING,
+        sort: Optional[str] = MISSING,
+        return_nulls: Optional[bool] = MISSING,
+        return_count: Optional[bool] = MISSING,
+        dynamic_attributes: Optional[bool] = MISSING,
+) -> dict:
+    """Builds the JSON body of a search request. The options are named like the query parameters of ``GET /entities``,
+    but the search endpoint expects them under different keys, ex. ``count`` instead of ``returnCount``.
+
+    :return: The request body.
+    """
+    json: dict = {
+        "filter": {"conditions": list(map(lambda e: e.as_dict, conditions))},
+    }
+
+    if isinstance(limit, int):
+        json["limit"] = min(limit, 50)
+    if isinstance(offset, int):
+        json["offset"] = offset
+    if view:
+        json["view"] = view
+    if sort:
+        json["sort"] = sort
+    if return_nulls:
+        json["nulls"] = return_nulls
+    if return_count:
+        json["count"] = return_count
+    if dynamic_attributes:
+        json["dynamicAttributes"] = dynamic_attributes
+    return json
+
+
 class EntitiesRoute(BaseRoute):
     """Represents endpoints to the entity route"""
 
@@ -99,6 +142,9 @@ class EntitiesRoute(BaseRoute):
             return_nulls: Optional[bool] = MISSING,
             return_count: Optional[bool] = MISSING,
             dynamic_attributes: Optional[bool] = MISSING,
+            priority: Priority = Priority.NORMAL,
+            timeout: Optional[float] = None,
+            deadline: Optional[float] = None,
     ) -> List[Entity]:
         """Gets a list of entities, up to 50.
 
@@ -122,30 +168,85 @@ class EntitiesRoute(BaseRoute):
         :type return_count: bool
         :param dynamic_attributes: Specifies whether entity dynamic attributes should be returned.
         :type dynamic_attributes: bool
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
         :return:
         """
-        if isinstance(limit, int) and limit > 50:
-            raise ValueError("Limit must be less than or equal to 50")
-        return list(
-            map(
-                lambda e: Entity(**e),
-                await self.request(
-                    Route(
-                        "GET",
-                        "/entities/{}".format(entity_name)
-                        + Route.assemble_params(
-                            limit=min(limit, 50) if isinstance(limit, int) else MISSING,
-                            offset=offset if isinstance(offset, int) else MISSING,
-                            view=view,
-                            sort=sort,
-                            returnNulls=return_nulls,
-                            returnCount=return_count,
-                            dynamicAttributes=dynamic_attributes,
-                        ),
-                    )
+        with timeouts.deadline(timeout, at=deadline):
+            if isinstance(limit, int) and limit > 50:
+                raise ValueError("Limit must be less than or equal to 50")
+            await self._validate(entity_name, view=view, sort=sort)
+            return await self.request(
+                Route(
+                    "GET",
+                    "/entities/{}".format(entity_name)
+                    + Route.assemble_params(
+                        limit=min(limit, 50) if isinstance(limit, int) else MISSING,
+                        offset=offset if isinstance(offset, int) else MISSING,
+                        view=view,
+                        sort=sort,
+                        returnNulls=return_nulls,
+                        returnCount=return_count,
+                        dynamicAttributes=dynamic_attributes,
+                    ),
                 ),
+                priority=priority,
+                transform=entities_from_json,
             )
-        )
+
+    def entity_loader(self, *, delay: float = 0.002, max_batch: int = 50) -> EntityLoader:
+        """Creates a scope in which :meth:`fetch_entity` calls are batched.
+
+        Lookups made by any coroutine of the scope within ``delay`` seconds are sent as one ``in`` search per entity
+        type and view, and each ID is loaded at most once::
+
+            async with client.entity_loader():
+                tickets = await asyncio.gather(*(client.fetch_entity("njuns$Ticket", e.ticket["id"]) for e in wall))
+
+        :param delay: How long, in seconds, to collect lookups before sending them.
+        :type delay: float
+        :param max_batch: The maximum amount of IDs per search, at most 50.
+        :type max_batch: int
+        :return: The loader, to be used as an asynchronous context manager.
+        """
+        return EntityLoader(self, delay=delay, max_batch=max_batch)
+
+    def search_batcher(
+            self,
+            *,
+            delay: float = 0.002,
+            max_batch: int = 20,
+            page_size: int = 50,
+            max_rows: int = 5000,
+    ) -> SearchBatcher:
+        """Creates a scope in which compatible :meth:`search_entities` calls are merged.
+
+        Searches made by any coroutine of the scope within ``delay`` seconds are sent as one OR-grouped search per
+        entity type, view and sort, and each caller receives the rows matching its own conditions::
+
+            async with client.search_batcher():
+                walls = await asyncio.gather(*(
+                    client.search_entities("njuns$TicketWallEntry", [EntitySearchCondition("ticket", EntitySearchOperator.EQ, t)])
+                    for t in ticket_ids
+                ))
+
+        See :class:`SearchBatcher` for the searches that can be merged.
+
+        :param delay: How long, in seconds, to collect searches before sending them.
+        :type delay: float
+        :param max_batch: The maximum amount of distinct searches merged into one request.
+        :type max_batch: int
+        :param page_size: The amount of rows per page of a merged search, at most 50.
+        :type page_size: int
+        :param max_rows: The maximum amount of rows paged through for one merged search.
+        :type max_rows: int
+        :return: The batcher, to be used as an asynchronous context manager.
+        """
+        return SearchBatcher(self, delay=delay, max_batch=max_batch, page_size=page_size, max_rows=max_rows)
 
     async def fetch_entity(
             self,
@@ -154,6 +255,9 @@ class EntitiesRoute(BaseRoute):
             *,
             view: Optional[str] = MISSING,
             dynamic_attributes: Optional[bool] = MISSING,
+            priority: Priority = Priority.NORMAL,
+            timeout: Optional[float] = None,
+            deadline: Optional[float] = None,
     ):
         """Fetch a single entity by UUID
 
@@ -165,19 +269,33 @@ class EntitiesRoute(BaseRoute):
         :type view: str
         :param dynamic_attributes: Specifies whether entity dynamic attributes should be returned.
         :type dynamic_attributes: bool
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
         :return:
         """
-        return Entity(
-            **await self.request(
-                Route(
-                    "GET",
-                    "/entities/{}/{}".format(entity_name, entity_id)
-                    + Route.assemble_params(
-                        view=view, dynamicAttributes=dynamic_attributes
+        with timeouts.deadline(timeout, at=deadline):
+            loader = current_entity_loader()
+            if loader is not None and dynamic_attributes is MISSING:
+                # Batched with the other lookups of this context into one search, see entity_loader()
+                return await loader.load(entity_name, entity_id, view=view, priority=priority)
+
+            await self._validate(entity_name, view=view)
+            return Entity(
+                **await self.request(
+                    Route(
+                        "GET",
+                        "/entities/{}/{}".format(entity_name, entity_id)
+                        + Route.assemble_params(
+                            view=view, dynamicAttributes=dynamic_attributes
+                        ),
                     ),
+                    priority=priority,
                 )
             )
-        )
 
     async def search_entities(
             self,
@@ -191,10 +309,15 @@ class EntitiesRoute(BaseRoute):
             return_nulls: Optional[bool] = MISSING,
             return_count: Optional[bool] = MISSING,
             dynamic_attributes: Optional[bool] = MISSING,
+            priority: Priority = Priority.NORMAL,
+            timeout: Optional[float] = None,
+            deadline: Optional[float] = None,
     ) -> List[Entity]:
         """Search for a list of entities, up to 50.
 
         Entities are found in the data model descriptions under "Help -> Data Model -> Known entities" after logging in.
+        Inside ``async with client.search_batcher():``, searches that can be merged are sent together with the other
+        searches of the context, see :class:`SearchBatcher`.
 
         :param entity_name: Entity name.
         :type entity_name: str
@@ -216,40 +339,175 @@ class EntitiesRoute(BaseRoute):
         :type return_count: bool
         :param dynamic_attributes: Specifies whether entity dynamic attributes should be returned.
         :type dynamic_attributes: bool
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
         :return:
         """
-        if isinstance(limit, int) and limit > 50:
-            raise ValueError("Limit must be less than or equal to 50")
-
-        json: dict = {
-            "filter": {"conditions": list(map(lambda e: e.as_dict, conditions))},
-        }
-
-        if isinstance(limit, int):
-            json["limit"] = min(limit, 50)
-        if isinstance(offset, int):
-            json["offset"] = offset
-        if view:
-            json["view"] = view
-        if sort:
-            json["sort"] = sort
-        if return_nulls:
-            json["nulls"] = return_nulls
-        if return_count:
-            json["count"] = return_count
-        if dynamic_attributes:
-            json["dynamicAttributes"] = dynamic_attributes
-
-        return list(
-            map(
-                lambda e: Entity(**e),
-                await self.request(
-                    Route("POST", "/entities/{}/search".format(entity_name)), json=json
-                ),
+        with timeouts.deadline(timeout, at=deadline):
+            if isinstance(limit, int) and limit > 50:
+                raise ValueError("Limit must be less than or equal to 50")
+            await self._validate(entity_name, view=view, sort=sort, conditions=conditions)
+
+            batcher = current_search_batcher()
+            if (
+                batcher is not None
+                and offset is MISSING
+                and not return_count
+                and dynamic_attributes is MISSING
+                and batcher.accepts(conditions)
+            ):
+                # Merged with the other searches of this context into one request, see search_batcher()
+                return await batcher.search(
+                    entity_name, conditions, view=view, limit=limit, sort=sort, return_nulls=return_nulls, priority=priority
+                )
+
+            json = _search_body(
+                conditions,
+                view=view,
+                limit=limit,
+                offset=offset,
+                sort=sort,
+                return_nulls=return_nulls,
+                return_count=return_count,
+                dynamic_attributes=dynamic_attributes,
             )
-        )
 
-    async def create_entity(self, entity_name: str, *, entity: Entity) -> Response:
+            return await self.request(
+                Route("POST", "/entities/{}/search".format(entity_name)),
+                json=json,
+                priority=priority,
+                transform=entities_from_json,
+            )
+
+    async def count_entities(
+            self,
+            entity_name: str,
+            conditions: Optional[List[EntitySearchCondition]] = None,
+            *,
+            priority: Priority = Priority.NORMAL,
+            timeout: Optional[float] = None,
+            deadline: Optional[float] = None,
+    ) -> int:
+        """Counts the entities of a type, or those matching ``conditions``, without paging through them.
+
+        A single entity is requested with the ``_minimal`` view and the total is read from the ``X-Total-Count``
+        response header, so page planners and progress bars can size their work with one cheap request.
+
+        :param entity_name: Entity name.
+        :type entity_name: str
+        :param conditions: If given, only entities matching these conditions are counted.
+        :type conditions: Optional[List[EntitySearchCondition]]
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        :return: The amount of matching entities.
+        :raises HTTPException: The server did not send the count header.
+        """
+        with timeouts.deadline(timeout, at=deadline):
+            await self._validate(entity_name, conditions=conditions)
+            if conditions:
+                route = Route("POST", "/entities/{}/search".format(entity_name))
+                json = _search_body(conditions, limit=1, view="_minimal", return_count=True)
+                response = await self.request_envelope(route, json=json, priority=priority)
+            else:
+                route = Route(
+                    "GET",
+                    "/entities/{}".format(entity_name) + Route.assemble_params(limit=1, view="_minimal", returnCount=True),
+                )
+                response = await self.request_envelope(route, priority=priority)
+
+            count = response.total_count
+            if count is None:
+                if not response.data:
+                    return 0
+                raise HTTPException("Response is missing the X-Total-Count header", route, None, None)
+            return count
+
+    async def fetch_frame(
+            self,
+            entity_name: str,
+            conditions: Optional[List[EntitySearchCondition]] = None,
+            *,
+            view: Optional[str] = MISSING,
+            sort: Optional[str] = MISSING,
+            page_size: int = 50,
+            max_rows: Optional[int] = None,
+            return_nulls: Optional[bool] = MISSING,
+            timeout: Optional[float] = None,
+            deadline: Optional[float] = None,
+            priority: Priority = Priority.NORMAL,
+    ) -> EntityFrame:
+        """Pages through every matching entity and collects them in a columnar :class:`EntityFrame`.
+
+        Pages are packed into columns as they arrive, no :class:`Entity` objects are created.
+
+        :param entity_name: Entity name.
+        :type entity_name: str
+        :param conditions: If given, only entities matching these conditions are fetched through the search endpoint.
+        :type conditions: Optional[List[EntitySearchCondition]]
+        :param view: Name of the view which is used for loading the entities.
+        :type view: str
+        :param sort: Name of the field to be sorted by, see :meth:`fetch_entities`. Should be set for a stable paging order.
+        :type sort: str
+        :param page_size: Number of entities per request. The max is capped at 50.
+        :type page_size: int
+        :param max_rows: Stop after this many entities.
+        :type max_rows: Optional[int]
+        :param return_nulls: Specifies whether null fields will be written to the result JSON.
+        :type return_nulls: bool
+        :param timeout: The time budget in seconds for fetching every page, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        :param priority: The scheduling priority of the requests.
+        :type priority: Priority
+        :return: The fetched entities.
+        :raises ValueError: ``page_size`` is less than 1.
+        :raises DeadlineExceeded: The pages could not be fetched within ``timeout``.
+        """
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1")
+        page_size = min(page_size, 50)
+        with timeouts.deadline(timeout, at=deadline):
+            await self._validate(entity_name, view=view, sort=sort, conditions=conditions)
+
+            builder = EntityFrameBuilder()
+            while max_rows is None or len(builder) < max_rows:
+                limit = page_size if max_rows is None else min(page_size, max_rows - len(builder))
+                if conditions:
+                    json = _search_body(conditions, view=view, limit=limit, offset=len(builder), sort=sort, return_nulls=return_nulls)
+                    page = await self.request(Route("POST", "/entities/{}/search".format(entity_name)), json=json, priority=priority)
+                else:
+                    page = await self.request(
+                        Route(
+                            "GET",
+                            "/entities/{}".format(entity_name)
+                            + Route.assemble_params(limit=limit, offset=len(builder), view=view, sort=sort, returnNulls=return_nulls),
+                        ),
+                        priority=priority,
+                    )
+                builder.extend(page)
+                if len(page) < limit:
+                    break
+
+        return builder.build()
+
+    async def create_entity(
+            self,
+            entity_name: str,
+            *,
+            entity: Entity,
+            priority: Priority = Priority.NORMAL,
+            timeout: Optional[float] = None,
+            deadline: Optional[float] = None,
+    ) -> Response:
         """Creates new entity. The method expects a JSON with entity object in the request body. The entity object
         may contain references to other entities. These references are processed according to the following rules:
 
@@ -261,5 +519,64 @@ class EntitiesRoute(BaseRoute):
         :type entity_name: str
         :param entity: The entity to be created.
         :type entity: Entity
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        """
+        with timeouts.deadline(timeout, at=deadline):
+            return await self.request(Route("POST", "/entities/{}".format(entity_name)), json=entity.json, priority=priority)
+
+    async def update_entity(
+            self,
+            entity_name: str,
+            *,
+            entity: Entity,
+            check_version: bool = True,
+            priority: Priority = Priority.NORMAL,
+            timeout: Optional[float] = None,
+            deadline: Optional[float] = None,
+    ) -> Entity:
+        """Saves the fields of an entity that changed since it was loaded, see :attr:`Entity.changed`.
+
+        Only the changed fields are sent, so a sync job changing one status field does not send the whole view back.
+        No request is made if nothing changed. The fields returned by the server, ex. the new ``version``, are copied
+        into ``entity`` and its changes are cleared.
+
+        :param entity_name: Entity name.
+        :type entity_name: str
+        :param entity: The entity to save. Must have an ``id``.
+        :type entity: Entity
+        :param check_version: Whether to send the loaded ``version`` along, so the server rejects the update if the
+                              entity was changed by someone else in the meantime. Ignored for entities without a version.
+        :type check_version: bool
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        :return: The updated entity.
+        :raises Conflict: The entity was changed since its version was loaded.
+        :raises ValidationError: A changed property does not exist, is read-only or its value has the wrong type, checked when
+                                 ``validate_requests`` is enabled.
         """
-        return await self.request(Route("POST", "/entities/{}".format(entity_name)), json=entity.json)
+        with timeouts.deadline(timeout, at=deadline):
+            if not entity.id:
+                raise ValueError("Only entities with an id can be updated, use create_entity for new entities")
+            if not entity.is_dirty:
+                _log.debug(f"Skipping update of unchanged {entity_name} {entity.id}")
+                return entity
+
+            json = entity.changes()
+            await self._validate(entity_name, changes=json)
+            if check_version and entity.json.get("version") is not None:
+                json["version"] = entity.json["version"]
+
+            data = await self.request(
+                Route("PUT", "/entities/{}/{}".format(entity_name, entity.id)), json=json, priority=priority
+            )
+            entity._apply_saved(json, data if isinstance(data, dict) else {})
+            return entity
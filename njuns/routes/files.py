@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import os
+import uuid
+from contextlib import asynccontextmanager
+from logging import Logger
+from typing import Any, AsyncIterator, BinaryIO, Callable, List, Optional, Sequence, Union
+
+from ._base import BaseRoute
+from .. import timeouts
+from ..models.file_descriptor import FileDescriptor
+from ..route import Route
+from ..scheduler import Priority
+from ..utils import MISSING
+
+_log: Logger = logging.getLogger(__name__)
+
+# Called with the file name, the amount of bytes transferred so far and the total size if known.
+ProgressCallback = Callable[[str, int, Optional[int]], Any]
+
+DEFAULT_CHUNK_SIZE: int = 256 * 1024
+
+
+class _FileSender:
+    """Streams a file from disk as a request body.
+
+    Every iteration reopens the file, so the body can be sent again when a request is retried.
+    """
+
+    def __init__(self, path: str, name: str, chunk_size: int, progress: Optional[ProgressCallback]):
+        self.path: str = path
+        self.name: str = name
+        self.chunk_size: int = chunk_size
+        self.progress: Optional[ProgressCallback] = progress
+        self.size: int = os.path.getsize(path)
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self.__chunks()
+
+    async def __chunks(self) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        sent = 0
+        file: BinaryIO = await loop.run_in_executor(None, open, self.path, "rb")
+        try:
+            while True:
+                chunk: bytes = await loop.run_in_executor(None, file.read, self.chunk_size)
+                if not chunk:
+                    break
+                sent += len(chunk)
+                yield chunk
+                if self.progress is not None:
+                    self.progress(self.name, sent, self.size)
+        finally:
+            await loop.run_in_executor(None, file.close)
+
+
+class FilesRoute(BaseRoute):
+    """Represents endpoints to the files route"""
+
+    async def upload_file(
+        self,
+        path: Union[str, "os.PathLike[str]"],
+        *,
+        name: Optional[str] = MISSING,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        progress: Optional[ProgressCallback] = None,
+        priority: Priority = Priority.NORMAL,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> FileDescriptor:
+        """Uploads a file from disk. The file is streamed in chunks and is never fully held in memory.
+
+        The upload has no overall time limit, only the client's ``read_timeout`` while waiting for the response, unless
+        ``timeout`` or ``deadline`` is given, it runs inside a :func:`njuns.deadline` block or the client has a ``timeout``.
+
+        :param path: The path of the file to upload.
+        :type path: Union[str, os.PathLike]
+        :param name: The file name stored in NJUNS. Defaults to the base name of ``path``.
+        :type name: str
+        :param chunk_size: The amount of bytes read from disk at a time.
+        :type chunk_size: int
+        :param progress: Called with the file name, the bytes sent so far and the file size after every chunk.
+        :type progress: Optional[ProgressCallback]
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        :return: The descriptor of the stored file. Its ID can be passed to ``post_comment_to_ticket``.
+        """
+        with timeouts.deadline(timeout, at=deadline):
+            path = os.fspath(path)
+            if name is MISSING:
+                name = os.path.basename(path)
+
+            sender = _FileSender(path, name, chunk_size, progress)
+            _log.debug(f"Uploading {path} ({sender.size} bytes) as {name}")
+            return FileDescriptor(
+                **await self.request(
+                    Route("POST", "/files" + Route.assemble_params(name="{name}"), name=name),
+                    data=sender,
+                    headers={"Content-Type": "application/octet-stream", "Content-Length": str(sender.size)},
+                    priority=priority,
+                )
+            )
+
+    async def upload_files(
+        self,
+        paths: Sequence[Union[str, "os.PathLike[str]"]],
+        *,
+        concurrency: int = 4,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        progress: Optional[ProgressCallback] = None,
+        priority: Priority = Priority.NORMAL,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> List[FileDescriptor]:
+        """Uploads several files concurrently.
+
+        :param paths: The paths of the files to upload.
+        :type paths: Sequence[Union[str, os.PathLike]]
+        :param concurrency: The maximum amount of uploads in flight at once.
+        :type concurrency: int
+        :param chunk_size: The amount of bytes read from disk at a time.
+        :type chunk_size: int
+        :param progress: Called with the file name, the bytes sent so far and the file size after every chunk.
+        :type progress: Optional[ProgressCallback]
+        :param priority: The scheduling priority of the requests.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        :return: The descriptors of the stored files, in the same order as ``paths``.
+        """
+        with timeouts.deadline(timeout, at=deadline):
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def upload(path: Union[str, "os.PathLike[str]"]) -> FileDescriptor:
+                async with semaphore:
+                    return await self.upload_file(path, chunk_size=chunk_size, progress=progress, priority=priority)
+
+            return list(await asyncio.gather(*map(upload, paths)))
+
+    @asynccontextmanager
+    async def open_file(
+        self,
+        file_id: str,
+        *,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        priority: Priority = Priority.NORMAL,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> AsyncIterator[AsyncIterator[bytes]]:
+        """Downloads a file as an asynchronous iterator of chunks, which is valid until the block exits::
+
+            async with client.open_file(file_id) as chunks:
+                async for chunk in chunks:
+                    ...
+
+        The scheduler slot and the connection are handed back when the block exits, even if the file was not read to
+        the end.
+
+        :param file_id: The ID of the file descriptor.
+        :type file_id: str
+        :param chunk_size: The maximum size of each yielded chunk.
+        :type chunk_size: int
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the whole download.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        """
+        async with self.stream(Route("GET", "/files/{}".format(file_id)), priority=priority, timeout=timeout, deadline=deadline) as response:
+            yield response.content.iter_chunked(chunk_size)
+
+    async def iter_file(
+        self,
+        file_id: str,
+        *,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        priority: Priority = Priority.NORMAL,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> AsyncIterator[bytes]:
+        """Downloads a file as an asynchronous iterator of chunks.
+
+        The iterator holds a scheduler slot and the connection until it is exhausted or closed. If it may be left
+        early, use :meth:`open_file`, or close it with ``aclose()``, ex. ``async with contextlib.aclosing(...)``.
+
+        :param file_id: The ID of the file descriptor.
+        :type file_id: str
+        :param chunk_size: The maximum size of each yielded chunk.
+        :type chunk_size: int
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the whole download.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        """
+        async with self.open_file(file_id, chunk_size=chunk_size, priority=priority, timeout=timeout, deadline=deadline) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+    async def download_file(
+        self,
+        file_id: str,
+        destination: Union[str, "os.PathLike[str]"],
+        *,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        progress: Optional[ProgressCallback] = None,
+        priority: Priority = Priority.NORMAL,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> int:
+        """Downloads a file to disk in chunks.
+
+        The file is written to a temporary file next to ``destination``, which replaces ``destination`` only once the
+        download completed, so a failed download leaves no partial file behind.
+
+        :param file_id: The ID of the file descriptor.
+        :type file_id: str
+        :param destination: The path to write the file to. It is overwritten if it exists.
+        :type destination: Union[str, os.PathLike]
+        :param chunk_size: The maximum amount of bytes held in memory at a time.
+        :type chunk_size: int
+        :param progress: Called with the destination, the bytes received so far and the size from the response headers.
+        :type progress: Optional[ProgressCallback]
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the whole download.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        :return: The amount of bytes written.
+        """
+        destination = os.fspath(destination)
+        loop = asyncio.get_running_loop()
+        received = 0
+
+        # Created like the destination would be, so the downloaded file gets the usual permissions
+        tmp = f"{destination}.{uuid.uuid4().hex}.part"
+        fd: int = await loop.run_in_executor(None, os.open, tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            file: BinaryIO = os.fdopen(fd, "wb")
+            try:
+                async with self.stream(Route("GET", "/files/{}".format(file_id)), priority=priority, timeout=timeout, deadline=deadline) as response:
+                    total: Optional[int] = response.content_length
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        await loop.run_in_executor(None, file.write, chunk)
+                        received += len(chunk)
+                        if progress is not None:
+                            progress(destination, received, total)
+            finally:
+                await loop.run_in_executor(None, file.close)
+            await loop.run_in_executor(None, os.replace, tmp, destination)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+        return received
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from logging import Logger
+from typing import Any, Dict, List, Optional
+
+from ._base import BaseRoute
+from .. import timeouts
+from ..exceptions import ValidationError
+from ..metadata import BUILTIN_VIEWS, MetadataCache
+from ..models.metadata import EntityMetadata, ViewMetadata
+from ..route import Route
+from ..scheduler import Priority
+from ..utils import MISSING
+
+_log: Logger = logging.getLogger(__name__)
+
+
+class MetadataRoute(BaseRoute):
+    """Represents endpoints to the metadata route and validates entity requests against it."""
+
+    def __init__(self, client: Any):
+        super().__init__(client)
+        # Whether entity requests are checked against the cached metadata before being sent.
+        self.validate_requests: bool = False
+        # Where the metadata cache is persisted. If None, it is only kept in memory.
+        self.metadata_cache_path: Optional[str] = None
+        self.metadata_max_age: float = 86400.0
+        self.__metadata: MetadataCache = MISSING
+        self.__metadata_lock: asyncio.Lock = asyncio.Lock()
+
+    async def fetch_entities_metadata(
+        self,
+        *,
+        priority: Priority = Priority.NORMAL,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> List[EntityMetadata]:
+        """Gets the metadata of every entity type.
+
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        :return: The metadata of every entity type.
+        """
+        with timeouts.deadline(timeout, at=deadline):
+            return list(map(lambda e: EntityMetadata(**e), await self.request(Route("GET", "/metadata/entities"), priority=priority)))
+
+    async def fetch_views(
+        self,
+        entity_name: str,
+        /,
+        *,
+        priority: Priority = Priority.NORMAL,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> List[ViewMetadata]:
+        """Gets the views of an entity type.
+
+        :param entity_name: Entity name.
+        :type entity_name: str
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        :return: The views declared for the entity.
+        """
+        with timeouts.deadline(timeout, at=deadline):
+            return list(
+                map(lambda v: ViewMetadata(**v), await self.request(Route("GET", "/metadata/entities/{}/views".format(entity_name)), priority=priority))
+            )
+
+    async def load_metadata(self, *, refresh: bool = False) -> MetadataCache:
+        """Loads the entity metadata from the cache file, or from the API if the file is missing, stale or ``refresh`` is set.
+
+        :param refresh: Whether to fetch the metadata from the API regardless of the cache file.
+        :type refresh: bool
+        :return: The metadata cache.
+        """
+        async with self.__metadata_lock:
+            loop = asyncio.get_running_loop()
+            if self.__metadata is MISSING or self.__metadata.base_url != self.base_url:
+                self.__metadata = MetadataCache(self.base_url, path=self.metadata_cache_path, max_age=self.metadata_max_age)
+                if not refresh and await loop.run_in_executor(None, self.__metadata.load):
+                    _log.debug(f"Loaded entity metadata from {self.metadata_cache_path}")
+                    return self.__metadata
+
+            if refresh or not self.__metadata.loaded:
+                _log.info("Fetching entity metadata...")
+                self.__metadata.set_entities(await self.request(Route("GET", "/metadata/entities")))
+                await loop.run_in_executor(None, self.__metadata.save, self.__metadata.snapshot())
+            return self.__metadata
+
+    async def __load_views(self, metadata: MetadataCache, entity_name: str) -> None:
+        views = await self.request(Route("GET", "/metadata/entities/{}/views".format(entity_name)))
+        # Saves are serialized with the other updates of the cache, and write a snapshot taken on the event loop
+        async with self.__metadata_lock:
+            metadata.set_views(entity_name, views)
+            await asyncio.get_running_loop().run_in_executor(None, metadata.save, metadata.snapshot())
+
+    async def _validate(
+        self,
+        entity_name: str,
+        *,
+        view: Optional[str] = MISSING,
+        sort: Optional[str] = MISSING,
+        conditions: Optional[List[Any]] = None,
+        changes: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Validates an entity request against the cached metadata when :attr:`validate_requests` is enabled.
+
+        If validation fails against metadata read from disk, the metadata is fetched again once in case the server
+        changed since the cache file was written.
+
+        :raises ValidationError: The view, sort, a filter or an updated property does not exist, or a filter or updated
+                value has the wrong type.
+        """
+        if not self.validate_requests:
+            return
+
+        metadata = await self.load_metadata()
+        if view and view not in BUILTIN_VIEWS and view not in metadata.views.get(entity_name, {}) and entity_name in metadata.entities:
+            await self.__load_views(metadata, entity_name)
+
+        def check() -> None:
+            if view:
+                metadata.validate_view(entity_name, view)
+            if sort:
+                metadata.validate_sort(entity_name, sort)
+            if conditions:
+                metadata.validate_conditions(entity_name, conditions)
+            if changes:
+                metadata.validate_changes(entity_name, changes)
+
+        try:
+            check()
+        except ValidationError as e:
+            if metadata.is_fresh(entity_name):
+                raise
+            _log.info(f"Refreshing cached metadata after failed validation: {e}")
+            metadata = await self.load_metadata(refresh=True)
+            if view:
+                await self.__load_views(metadata, entity_name)
+            check()
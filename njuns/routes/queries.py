@@ -1,26 +1,161 @@
-from typing import Optional
+import asyncio
+import logging
+import time
+from logging import Logger
+from typing import Optional, Any, Dict, List, Mapping, Tuple
 
 from ._base import BaseRoute
+from .. import timeouts
+from ..exceptions import NotFound, ValidationError
+from ..models.entity import Entity
+from ..models.predefined_query import PredefinedQuery
+from ..prepared_query import PreparedQuery
 from ..route import Route
-from ..utils import Response, MISSING
+from ..scheduler import Priority
+from ..utils import MISSING
+
+_log: Logger = logging.getLogger(__name__)
 
 
 class QueriesRoute(BaseRoute):
     """Represents endpoints to the queries route"""
 
-    async def fetch_queries(self, entity_name: str, /) -> Response:
-        """Gets a list of queries.
+    def __init__(self, client: Any):
+        super().__init__(client)
+        # How long, in seconds, a loaded query catalog stays valid before it is fetched again.
+        self.query_catalog_ttl: float = 300.0
+        self.__query_catalogs: Dict[str, Tuple[float, Dict[str, PredefinedQuery]]] = {}
+        self.__query_catalog_locks: Dict[str, asyncio.Lock] = {}
+        self.__prepared_queries: Dict[Tuple[str, str], PreparedQuery] = {}
+
+    async def fetch_queries(
+        self,
+        entity_name: str,
+        /,
+        *,
+        priority: Priority = Priority.NORMAL,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> List[PredefinedQuery]:
+        """Gets a list of queries. This always sends a request, use :meth:`fetch_query_catalog` for the cached catalog.
+
+        :param entity_name: Entity name.
+        :type entity_name: str
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        :return: The predefined queries of the entity.
+        """
+        with timeouts.deadline(timeout, at=deadline):
+            queries = list(
+                map(
+                    lambda q: PredefinedQuery(**q),
+                    await self.request(Route("GET", "/queries/{}".format(entity_name)), priority=priority),
+                )
+            )
+            self.__query_catalogs[entity_name] = (time.monotonic(), {q.name: q for q in queries})
+            return queries
+
+    async def fetch_query_catalog(
+        self,
+        entity_name: str,
+        /,
+        *,
+        refresh: bool = False,
+        priority: Priority = Priority.NORMAL,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict[str, PredefinedQuery]:
+        """Gets the predefined queries of an entity keyed by query name.
+
+        The catalog is loaded once and reused until :attr:`query_catalog_ttl` seconds have passed.
+        Concurrent callers share a single request.
+
+        :param entity_name: Entity name.
+        :type entity_name: str
+        :param refresh: Whether to ignore the cached catalog and fetch it again.
+        :type refresh: bool
+        :param priority: The scheduling priority of the request, if one is needed.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        :return: The predefined queries keyed by name.
+        """
+        with timeouts.deadline(timeout, at=deadline):
+            lock = self.__query_catalog_locks.setdefault(entity_name, asyncio.Lock())
+            async with lock:
+                cached = self.__query_catalogs.get(entity_name)
+                if refresh or cached is None or time.monotonic() - cached[0] >= self.query_catalog_ttl:
+                    _log.debug(f"Loading query catalog for {entity_name}")
+                    await self.fetch_queries(entity_name, priority=priority)
+                return self.__query_catalogs[entity_name][1]
+
+    def invalidate_query_catalog(self, entity_name: Optional[str] = None, /) -> None:
+        """Drops a cached query catalog so that the next lookup fetches it again.
+
+        :param entity_name: Entity name. If omitted, every cached catalog is dropped.
+        :type entity_name: Optional[str]
+        """
+        if entity_name is None:
+            self.__query_catalogs.clear()
+        else:
+            self.__query_catalogs.pop(entity_name, None)
+
+    async def prepare_query(
+        self,
+        entity_name: str,
+        query_name: str,
+        /,
+        *,
+        priority: Priority = Priority.NORMAL,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> PreparedQuery:
+        """Gets a :class:`PreparedQuery` for repeated executions of a predefined query with different parameters.
+
+        Prepared queries are cached and rebuilt when the query catalog is reloaded, see :meth:`fetch_query_catalog`.
 
         :param entity_name: Entity name.
         :type entity_name: str
-        :return:
+        :param query_name: Query name.
+        :type query_name: str
+        :param priority: The scheduling priority of the catalog request, if one is needed.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        :return: The prepared query.
+        :raises ValidationError: The entity does not exist or has no query with this name.
         """
-        return await self.request(Route("GET", "/queries/{}".format(entity_name)))
+        with timeouts.deadline(timeout, at=deadline):
+            try:
+                catalog = await self.fetch_query_catalog(entity_name, priority=priority)
+            except NotFound:
+                raise ValidationError(f"Unknown entity {entity_name!r}, it has no query catalog") from None
+            query = catalog.get(query_name)
+            if query is None:
+                raise ValidationError(
+                    f"Unknown query {query_name!r} for entity {entity_name}, expected one of: {', '.join(sorted(catalog)) or 'none'}"
+                )
+
+            prepared = self.__prepared_queries.get((entity_name, query_name))
+            if prepared is None or prepared.query is not query:
+                _log.debug(f"Preparing query {entity_name}/{query_name}")
+                prepared = PreparedQuery(self, query, entity_name)
+                self.__prepared_queries[(entity_name, query_name)] = prepared
+            return prepared
 
     async def execute_query(
         self,
         entity_name: str,
         query_name: str,
+        params: Optional[Mapping[str, Any]] = None,
         *,
         limit: Optional[int] = MISSING,
         offset: Optional[int] = MISSING,
@@ -28,13 +163,23 @@ class QueriesRoute(BaseRoute):
         return_nulls: Optional[bool] = MISSING,
         return_count: Optional[bool] = MISSING,
         dynamic_attributes: Optional[bool] = MISSING,
-    ) -> Response:
+        priority: Priority = Priority.NORMAL,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> List[Entity]:
         """Executes a query and retrieve up to 50 results.
 
+        The query name and parameters are checked against the cached query catalog first, so an unknown name or a
+        value of the wrong type fails without a request to the query itself. Use :meth:`prepare_query` to skip these
+        checks for repeated executions.
+
         :param entity_name: Entity name.
         :type entity_name: str
         :param query_name: Query name.
         :type query_name: str
+        :param params: A value for every parameter of the query. Values are converted according to the parameter types of
+                    the query, ex. ``datetime`` objects for ``java.util.Date`` parameters and entities for entity parameters.
+        :type params: Optional[Mapping[str, Any]]
         :param limit: Number of extracted entities. Max is capped to 50.
         :type limit: int
         :param offset: Position of the first result to retrieve
@@ -48,24 +193,27 @@ class QueriesRoute(BaseRoute):
         :type return_count: bool
         :param dynamic_attributes: Specifies whether entity dynamic attributes should be returned
         :type dynamic_attributes: bool
-        :return: A list of entities is returned in the response body.
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        :return: A list of entities.
+        :raises ValidationError: The query does not exist or the parameter values do not match it.
         """
-        if isinstance(limit, int) and limit >= 50:
-            raise ValueError("Limit must be less than or equal to 50")
-        return await self.request(
-            Route(
-                "GET",
-                "/queries/{}/{}".format(
-                    entity_name,
-                    query_name,
-                )
-                + Route.assemble_params(
-                    limit=min(limit, 50) if isinstance(limit, int) else 50,
-                    offset=offset if isinstance(offset, int) else MISSING,
-                    view=view,
-                    returnNulls=return_nulls,
-                    returnCount=return_count,
-                    dynamicAttributes=dynamic_attributes,
-                ),
+        with timeouts.deadline(timeout, at=deadline):
+            if isinstance(limit, int) and limit > 50:
+                raise ValueError("Limit must be less than or equal to 50")
+
+            prepared = await self.prepare_query(entity_name, query_name, priority=priority)
+            return await prepared.execute(
+                params,
+                limit=limit,
+                offset=offset,
+                view=view,
+                return_nulls=return_nulls,
+                return_count=return_count,
+                dynamic_attributes=dynamic_attributes,
+                priority=priority,
             )
-        )
@@ -1,10 +1,12 @@
 import logging
 from logging import Logger
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
 from ._base import BaseRoute
+from .. import timeouts
 from ..route import Route
+from ..scheduler import Priority
 from ..utils import Response
 
 _log: Logger = logging.getLogger(__name__)
@@ -19,15 +21,36 @@ class ServicesRoute(BaseRoute):
             ticket_id: UUID,
             comment: str,
             file_descriptor_ids: List[UUID] = (),
-            flagged: bool = False
+            flagged: bool = False,
+            priority: Priority = Priority.NORMAL,
+            timeout: Optional[float] = None,
+            deadline: Optional[float] = None,
     ) -> Response:
-        return await self.request(Route(
-            "GET",
-            "/services/njuns_TicketService/addPosting"
-            + Route.assemble_params(
-                ticketId=ticket_id,
-                comment=comment,
-                fileDescriptorIds=f"[{",".join([str(i) for i in file_descriptor_ids])}]",
-                isFlagged=flagged
-            )
-        ))
+        """Posts a comment to a ticket.
+
+        :param ticket_id: The ID of the ticket.
+        :type ticket_id: UUID
+        :param comment: The text of the comment.
+        :type comment: str
+        :param file_descriptor_ids: The IDs of uploaded files to attach, see :meth:`FilesRoute.upload_file`.
+        :type file_descriptor_ids: List[UUID]
+        :param flagged: Whether the comment is flagged.
+        :type flagged: bool
+        :param priority: The scheduling priority of the request.
+        :type priority: Priority
+        :param timeout: The time budget in seconds for the requests of this call, including retries.
+        :type timeout: Optional[float]
+        :param deadline: An absolute deadline in :func:`time.monotonic` seconds, see :func:`njuns.deadline`.
+        :type deadline: Optional[float]
+        """
+        with timeouts.deadline(timeout, at=deadline):
+            return await self.request(Route(
+                "GET",
+                "/services/njuns_TicketService/addPosting"
+                + Route.assemble_params(
+                    ticketId=ticket_id,
+                    comment=comment,
+                    fileDescriptorIds="[{}]".format(",".join(str(i) for i in file_descriptor_ids)),
+                    isFlagged=flagged
+                )
+            ), priority=priority)
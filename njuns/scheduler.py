@@ -0,0 +1,170 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import Enum
+from logging import Logger
+from typing import Deque, Dict, Optional, AsyncIterator
+
+_log: Logger = logging.getLogger(__name__)
+
+
+class Priority(Enum):
+    """Priority classes used by :class:`RequestScheduler`. Higher values get a larger share of the concurrency budget."""
+
+    BACKGROUND = 1
+    NORMAL = 4
+    INTERACTIVE = 16
+
+
+class _Waiter:
+    __slots__ = ("tag", "priority", "key", "future")
+
+    def __init__(self, tag: float, priority: Priority, key: str, future: asyncio.Future):
+        self.tag: float = tag
+        self.priority: Priority = priority
+        self.key: str = key
+        self.future: asyncio.Future = future
+
+
+class RequestScheduler:
+    """Hands out request slots from one shared concurrency budget.
+
+    Waiting requests are ordered with weighted fair queuing between :class:`Priority` classes, so interactive calls are
+    dispatched ahead of a backlog of background work without starving it. Optional per-route caps limit how many slots
+    a single route may hold at once.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = 64,
+        route_limits: Optional[Dict[str, int]] = None,
+        weights: Optional[Dict[Priority, int]] = None,
+    ) -> None:
+        """Initializes a scheduler.
+
+        :param max_concurrency: The maximum amount of requests in flight across all routes.
+        :type max_concurrency: int
+        :param route_limits: Per-route caps, keyed by path prefix (ex. ``"/entities/njuns$Ticket"`` or ``"/queries"``).
+                The longest matching prefix applies.
+        :type route_limits: Optional[Dict[str, int]]
+        :param weights: Overrides for the relative share of each priority class. Defaults to the :class:`Priority` values.
+        :type weights: Optional[Dict[Priority, int]]
+        :raises ValueError: ``max_concurrency`` is below 1 or a weight is not positive.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        for priority, weight in (weights or {}).items():
+            if not weight > 0:
+                raise ValueError(f"Weight of {priority!r} must be positive, got {weight!r}")
+
+        self.max_concurrency: int = max_concurrency
+        self.route_limits: Dict[str, int] = dict(route_limits or {})
+        self.weights: Dict[Priority, int] = {p: p.value for p in Priority}
+        self.weights.update(weights or {})
+
+        self._in_flight: int = 0
+        self._route_in_flight: Dict[str, int] = {}
+        self._queues: Dict[Priority, Deque[_Waiter]] = {p: deque() for p in Priority}
+        self._last_tag: Dict[Priority, float] = {p: 0.0 for p in Priority}
+        self._virtual_time: float = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        """The amount of slots currently held."""
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        """The amount of requests waiting for a slot."""
+        return sum(len(q) for q in self._queues.values())
+
+    def _route_limit(self, key: str) -> Optional[str]:
+        """Returns the configured prefix that caps ``key``, if any."""
+        match: Optional[str] = None
+        for prefix in self.route_limits:
+            if key.startswith(prefix) and (match is None or len(prefix) > len(match)):
+                match = prefix
+        return match
+
+    def _has_capacity(self, key: str) -> bool:
+        if self._in_flight >= self.max_concurrency:
+            return False
+        prefix = self._route_limit(key)
+        return prefix is None or self._route_in_flight.get(prefix, 0) < self.route_limits[prefix]
+
+    def _take(self, key: str) -> None:
+        self._in_flight += 1
+        prefix = self._route_limit(key)
+        if prefix is not None:
+            self._route_in_flight[prefix] = self._route_in_flight.get(prefix, 0) + 1
+
+    def _dispatch(self) -> None:
+        """Grants slots to waiters in finish-tag order while capacity remains."""
+        while self._in_flight < self.max_concurrency:
+            best: Optional[_Waiter] = None
+            for queue in self._queues.values():
+                # The first eligible waiter of each class; waiters blocked by a route cap do not block the rest of their class.
+                for waiter in queue:
+                    if waiter.future.done():
+                        continue
+                    if self._has_capacity(waiter.key):
+                        if best is None or waiter.tag < best.tag:
+                            best = waiter
+                        break
+            if best is None:
+                return
+
+            self._queues[best.priority].remove(best)
+            self._virtual_time = max(self._virtual_time, best.tag)
+            self._take(best.key)
+            best.future.set_result(None)
+
+    async def acquire(self, key: str, priority: Priority = Priority.NORMAL) -> None:
+        """Waits for a slot for a request to ``key``. Every successful call must be paired with :meth:`release`.
+
+        :param key: The route key, see :attr:`Route.key`.
+        :type key: str
+        :param priority: The priority class of the request.
+        :type priority: Priority
+        """
+        if not any(self._queues.values()) and self._has_capacity(key):
+            self._take(key)
+            return
+
+        tag = max(self._virtual_time, self._last_tag[priority]) + 1 / self.weights[priority]
+        self._last_tag[priority] = tag
+        waiter = _Waiter(tag, priority, key, asyncio.get_running_loop().create_future())
+        self._queues[priority].append(waiter)
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was granted right before the cancellation landed, hand it back.
+                self.release(key)
+            else:
+                try:
+                    self._queues[priority].remove(waiter)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self, key: str) -> None:
+        """Returns a slot acquired with :meth:`acquire` and wakes up the next waiter."""
+        self._in_flight -= 1
+        prefix = self._route_limit(key)
+        if prefix is not None:
+            self._route_in_flight[prefix] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, key: str, priority: Priority = Priority.NORMAL) -> AsyncIterator[None]:
+        """An asynchronous context manager holding a slot for the duration of the block."""
+        await self.acquire(key, priority)
+        try:
+            yield
+        finally:
+            self.release(key)
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from .exceptions import DeadlineExceeded
+from .route import Route
+
+# The absolute deadline, in time.monotonic() seconds, of the requests sent from the current context.
+_current_deadline: ContextVar[Optional[float]] = ContextVar("njuns_deadline", default=None)
+
+
+def current_deadline() -> Optional[float]:
+    """Returns the deadline of the current context in :func:`time.monotonic` seconds, if one is set."""
+    return _current_deadline.get()
+
+
+def resolve_deadline(timeout: Optional[float] = None, at: Optional[float] = None) -> Optional[float]:
+    """Combines a relative timeout and an absolute deadline with the deadline of the current context.
+
+    :param timeout: A time budget in seconds, counted from now.
+    :type timeout: Optional[float]
+    :param at: An absolute deadline in :func:`time.monotonic` seconds.
+    :type at: Optional[float]
+    :return: The earliest of the given deadlines, or ``None`` if there is none.
+    """
+    candidates = [_current_deadline.get(), at, time.monotonic() + timeout if timeout is not None else None]
+    return min((c for c in candidates if c is not None), default=None)
+
+
+async def wait_shared(future: "asyncio.Future[Any]", route: Route, *, timeout: Optional[float] = None) -> Any:
+    """Waits for the result of a request shared with other callers, ex. a batched search, within the caller's deadline.
+
+    The future is shielded, so a caller that gives up or is cancelled does not cancel the result for the others.
+
+    :param future: The shared result.
+    :type future: asyncio.Future
+    :param route: The route of the shared request, for the raised exception.
+    :type route: Route
+    :param timeout: A time budget in seconds, combined with the deadline of the current context.
+    :type timeout: Optional[float]
+    :return: The result of the future.
+    :raises DeadlineExceeded: The deadline passed before the result was available.
+    """
+    limit = resolve_deadline(timeout)
+    if limit is None:
+        return await asyncio.shield(future)
+    remaining = limit - time.monotonic()
+    if remaining <= 0 and not future.done():
+        raise DeadlineExceeded("Deadline passed before the request was sent", route)
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), max(remaining, 0))
+    except asyncio.TimeoutError:
+        if future.done() or time.monotonic() < limit:
+            raise
+        raise DeadlineExceeded("Shared request did not complete before the caller's deadline", route) from None
+
+
+@contextmanager
+def deadline(timeout: Optional[float] = None, *, at: Optional[float] = None) -> Iterator[Optional[float]]:
+    """Bounds every request sent from the enclosed block, including retries, token refreshes and further pages::
+
+        with njuns.deadline(2.5):
+            ticket = await client.fetch_entity("njuns$Ticket", ticket_id)
+            comments = await client.fetch_frame("njuns$Comment", conditions)
+
+    Tasks started inside the block inherit its deadline. Nested blocks can only shorten it.
+
+    :param timeout: A time budget in seconds, counted from entering the block.
+    :type timeout: Optional[float]
+    :param at: An absolute deadline in :func:`time.monotonic` seconds.
+    :type at: Optional[float]
+    :return: The resulting deadline.
+    """
+    limit = resolve_deadline(timeout, at)
+    token = _current_deadline.set(limit)
+    try:
+        yield limit
+    finally:
+        _current_deadline.reset(token)
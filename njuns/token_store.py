@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from logging import Logger
+from typing import Any, Dict, Iterator, Optional
+
+_log: Logger = logging.getLogger(__name__)
+
+
+class StoredToken:
+    """A class representing an OAuth session persisted in a :class:`TokenStore`."""
+
+    def __init__(self, *_, **kwargs):
+        self.access_token: str = kwargs.get("access_token")
+        self.refresh_token: Optional[str] = kwargs.get("refresh_token")
+        # Unix timestamp at which the access token expires.
+        self.expires_at: float = kwargs.get("expires_at", 0.0)
+        self.scope: Optional[str] = kwargs.get("scope")
+        # The raw user info of the session, so a restored session does not need to fetch it again.
+        self.user_info: Optional[Dict[str, Any]] = kwargs.get("user_info")
+
+    def expires_within(self, seconds: float) -> bool:
+        """Whether the access token expires in less than ``seconds``."""
+        return self.expires_at - time.time() < seconds
+
+    @property
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "access_token": self.access_token,
+            "refresh_token": self.refresh_token,
+            "expires_at": self.expires_at,
+            "scope": self.scope,
+            "user_info": self.user_info,
+        }
+
+
+class TokenStore(ABC):
+    """Base class for token stores shared by clients across process restarts and between processes on one host.
+
+    Every method blocks, so clients call them in an executor. :meth:`lock` is held while a client decides whether
+    to reuse, refresh or replace a token, which lets one process log in while the others wait and reuse the result.
+    """
+
+    @abstractmethod
+    def load(self, key: str) -> Optional[StoredToken]:
+        """Returns the token stored under ``key``, if any."""
+
+    @abstractmethod
+    def save(self, key: str, token: StoredToken) -> None:
+        """Stores ``token`` under ``key``, replacing any previous token."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Removes the token stored under ``key``, if any."""
+
+    @abstractmethod
+    def lock(self) -> Iterator[None]:
+        """A context manager holding an exclusive lock on the store across processes."""
+
+
+class FileTokenStore(TokenStore):
+    """Stores tokens in a JSON file, guarded by an advisory lock on a ``.lock`` file next to it."""
+
+    def __init__(self, path: str) -> None:
+        """Initializes a file token store.
+
+        :param path: The JSON file to store tokens in. It is created with owner-only permissions.
+        :type path: str
+        """
+        self.path: str = os.fspath(path)
+        self.lock_path: str = self.path + ".lock"
+
+    def __read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            _log.warning(f"Ignoring corrupt token store {self.path}")
+            return {}
+
+    def __write(self, tokens: Dict[str, Dict[str, Any]]) -> None:
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(tokens, f)
+        os.replace(tmp, self.path)
+
+    def load(self, key: str) -> Optional[StoredToken]:
+        data = self.__read().get(key)
+        return StoredToken(**data) if data else None
+
+    def save(self, key: str, token: StoredToken) -> None:
+        tokens = self.__read()
+        tokens[key] = token.as_dict
+        self.__write(tokens)
+
+    def delete(self, key: str) -> None:
+        tokens = self.__read()
+        if tokens.pop(key, None) is not None:
+            self.__write(tokens)
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if sys.platform == "win32":
+                import msvcrt
+
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+class SQLiteTokenStore(TokenStore):
+    """Stores tokens in a SQLite database. The lock is an immediate write transaction."""
+
+    def __init__(self, path: str, *, timeout: float = 30.0) -> None:
+        """Initializes a SQLite token store.
+
+        :param path: The database file.
+        :type path: str
+        :param timeout: How long, in seconds, to wait for another process holding the lock.
+        :type timeout: float
+        """
+        self.path: str = os.fspath(path)
+        self.timeout: float = timeout
+        # Autocommit mode, transactions are only opened explicitly by lock()
+        self.__connection: sqlite3.Connection = sqlite3.connect(self.path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.__connection.execute("CREATE TABLE IF NOT EXISTS tokens (key TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        # The connection is shared by every client of this process, which cannot nest transactions on it.
+        self.__thread_lock: threading.Lock = threading.Lock()
+
+    def load(self, key: str) -> Optional[StoredToken]:
+        row = self.__connection.execute("SELECT data FROM tokens WHERE key = ?", (key,)).fetchone()
+        return StoredToken(**json.loads(row[0])) if row else None
+
+    def save(self, key: str, token: StoredToken) -> None:
+        self.__connection.execute("INSERT OR REPLACE INTO tokens (key, data) VALUES (?, ?)", (key, json.dumps(token.as_dict)))
+
+    def delete(self, key: str) -> None:
+        self.__connection.execute("DELETE FROM tokens WHERE key = ?", (key,))
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        with self.__thread_lock:
+            self.__connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.__connection.execute("ROLLBACK")
+                raise
+            else:
+                self.__connection.execute("COMMIT")
+
+    def close(self) -> None:
+        self.__connection.close()
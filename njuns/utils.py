@@ -88,7 +88,7 @@ def setup_logging(
     level: int = MISSING,
     root: bool = True,
 ) -> None:
-    """A helper to set up logging.
+    """A helper to set up logging. Calling it again replaces and closes the handler it installed before.
 
     :param handler: The log handler to use for logging. Default is :class:`logging.StreamHandler`.
     :type handler: logging.Handler
@@ -122,6 +122,14 @@ def setup_logging(
         library, _, _ = str(__name__).partition(".")
         logger = logging.getLogger(library)
 
+    # Replace the handler installed by a previous call instead of stacking another one, so calling this repeatedly
+    # does not duplicate every log line. The replaced handler is closed, so file handlers release their file.
+    for existing in list(logger.handlers):
+        if getattr(existing, "_njuns_handler", False):
+            logger.removeHandler(existing)
+            existing.close()
+
     handler.setFormatter(formatter)
+    handler._njuns_handler = True
     logger.setLevel(level)
     logger.addHandler(handler)
@@ -0,0 +1,119 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Dict, List, TypeVar
+
+from aiohttp import web
+
+from njuns.http import HTTPClient
+
+T = TypeVar("T")
+
+
+def run(coroutine: Awaitable[T]) -> T:
+    """Runs a coroutine to completion on a fresh event loop."""
+    return asyncio.run(coroutine)
+
+
+@asynccontextmanager
+async def serve(app: web.Application) -> AsyncIterator[str]:
+    """Serves an application on a free local port and yields its base URL."""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    try:
+        host, port = runner.addresses[0][:2]
+        yield f"http://{host}:{port}"
+    finally:
+        await runner.cleanup()
+
+
+@asynccontextmanager
+async def client_for(app: web.Application, **kwargs: Any) -> AsyncIterator[HTTPClient]:
+    """Yields an :class:`HTTPClient` sending its requests to a local server running ``app``."""
+    async with serve(app) as url:
+        client = HTTPClient(base_url=url, **kwargs)
+        client._ensure_session()
+        try:
+            yield client
+        finally:
+            await client.close()
+
+
+
+def _matches(condition: dict, row: dict) -> bool:
+    """Evaluates a search condition against the full server-side row, like the NJUNS search endpoint."""
+    if "group" in condition:
+        results = (_matches(c, row) for c in condition["conditions"])
+        return all(results) if condition["group"] == "AND" else any(results)
+    value: Any = row
+    for name in condition["property"].split("."):
+        value = value.get(name) if isinstance(value, dict) else None
+    if isinstance(value, dict):
+        value = value.get("id")
+    if value is None:
+        return False
+    operator, other = condition["operator"], condition["value"]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Condition values are converted to the type of the property, so "5" matches the number 5
+        other = [float(o) for o in other] if isinstance(other, list) else float(other)
+    elif isinstance(value, str) and operator in ("=", "<>", "in", "notin"):
+        # And numbers given for string properties are compared as text
+        other = [str(o) for o in other] if isinstance(other, list) else str(other)
+    if operator == "=":
+        return value == other
+    if operator == "<>":
+        return value != other
+    if operator == "in":
+        return value in other
+    if operator == "notin":
+        return value not in other
+    if operator == "notEmpty":
+        return True
+    if operator == ">":
+        return value > other
+    if operator == "<":
+        return value < other
+    if operator == ">=":
+        return value >= other
+    if operator == "<=":
+        return value <= other
+    # String operators ignore case, as the search endpoint compares lowercased values
+    if operator == "contains":
+        return other.lower() in value.lower()
+    if operator == "startsWith":
+        return value.lower().startswith(other.lower())
+    if operator == "endsWith":
+        return value.lower().endswith(other.lower())
+    raise AssertionError(f"Unsupported operator {operator}")
+
+
+def _minimal(row: dict) -> dict:
+    """Returns a row as the API sends it, with references reduced to their ID."""
+    return {k: {"id": v["id"]} if isinstance(v, dict) else v for k, v in row.items()}
+
+
+class SearchServer:
+    """A local stand-in for the entity search endpoints, serving a fixed list of rows per entity."""
+
+    # The amount of rows returned for a search without a limit
+    DEFAULT_LIMIT = 50
+
+    def __init__(self, entities: Dict[str, List[dict]], *, delay: float = 0.0) -> None:
+        self.entities: Dict[str, List[dict]] = entities
+        self.delay: float = delay
+        self.searches: List[dict] = []
+        self.app: web.Application = web.Application()
+        self.app.router.add_post("/entities/{name}/search", self.search)
+
+    async def search(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.searches.append(body)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        rows = [r for r in self.entities[request.match_info["name"]] if all(_matches(c, r) for c in body["filter"]["conditions"])]
+        for field in reversed(body.get("sort", "").split(",") if body.get("sort") else []):
+            name = field.strip().lstrip("+-")
+            rows.sort(key=lambda r: (r.get(name) is None, r.get(name)), reverse=field.strip().startswith("-"))
+        offset = body.get("offset", 0)
+        return web.json_response([_minimal(r) for r in rows[offset:offset + body.get("limit", self.DEFAULT_LIMIT)]])
@@ -0,0 +1,170 @@
+import asyncio
+import random
+
+from njuns.batcher import SearchBatcher
+from njuns.exceptions import DeadlineExceeded
+from njuns.routes.entities import EntitySearchCondition as Condition, EntitySearchOperator as Operator
+from njuns.timeouts import deadline
+
+from helpers import SearchServer, client_for, run
+
+
+def wall_entries(count: int = 600) -> list:
+    rng = random.Random(3)
+    rows = []
+    for i in range(count):
+        row = {
+            "id": f"W{i}",
+            "_entityName": "njuns$TicketWallEntry",
+            "ticket": {"id": f"T{i % 30}", "status": "OPEN" if i % 4 else "CLOSED"},
+            "number": i,
+        }
+        status = rng.choice(["A", "B", None])
+        if status is not None:
+            row["status"] = status
+        rows.append(row)
+    return rows
+
+
+SEARCHES = (
+    [([Condition("ticket", Operator.EQ, f"T{t}")], None) for t in range(30)]
+    + [
+        ([Condition("ticket", Operator.EQ, "T1"), Condition("status", Operator.LTGT, "A")], 5),
+        ([Condition("number", Operator.GT, 590)], None),
+        ([Condition("status", Operator.NOTIN, ["A"])], None),
+        ([Condition("ticket", Operator.EQ, "T2")], 3),
+        ([Condition("status", Operator.CONTAINS, "a")], None),
+    ]
+)
+
+
+async def search(client, conditions, limit):
+    kwargs = {"limit": limit} if limit is not None else {}
+    return await client.search_entities("njuns$TicketWallEntry", conditions, **kwargs)
+
+
+def compare(searches):
+    """Returns the IDs found with and without a batcher, and the amount of requests each took."""
+    server = SearchServer({"njuns$TicketWallEntry": wall_entries()})
+
+    async def main():
+        async with client_for(server.app) as client:
+            expected = [[e.id for e in await search(client, c, l)] for c, l in searches]
+            unbatched = len(server.searches)
+            async with client.search_batcher():
+                found = await asyncio.gather(*(search(client, c, l) for c, l in searches))
+            return expected, [[e.id for e in entities] for entities in found], unbatched, len(server.searches) - unbatched
+
+    return run(main())
+
+
+def test_batched_results_equal_unbatched_results():
+    expected, found, unbatched, batched = compare(SEARCHES)
+    assert found == expected
+    assert batched < unbatched
+
+
+def test_unlimited_search_returns_the_default_page():
+    expected, found, _, _ = compare([([Condition("status", Operator.NOTEMPTY, None)], None), ([Condition("number", Operator.LT, 10)], None)])
+    assert found == expected
+    assert len(found[0]) == SearchServer.DEFAULT_LIMIT
+
+
+def test_nested_property_missing_from_the_view_is_searched_alone():
+    searches = [
+        ([Condition("ticket.status", Operator.EQ, "CLOSED"), Condition("number", Operator.LT, 100)], None),
+        ([Condition("ticket.status", Operator.EQ, "OPEN"), Condition("number", Operator.LT, 10)], None),
+    ]
+    expected, found, _, _ = compare(searches)
+    assert [len(ids) for ids in expected] == [25, 7]
+    assert found == expected
+
+
+def test_callers_get_their_own_entities():
+    server = SearchServer({"njuns$TicketWallEntry": wall_entries()})
+    conditions = [Condition("ticket", Operator.EQ, "T1")]
+
+    async def main():
+        async with client_for(server.app) as client:
+            async with client.search_batcher():
+                first, second = await asyncio.gather(search(client, conditions, None), search(client, conditions, None))
+            assert len(server.searches) == 1
+            assert [e.id for e in first] == [e.id for e in second]
+            assert all(a is not b for a, b in zip(first, second))
+
+    run(main())
+
+
+def test_each_caller_keeps_its_own_deadline():
+    server = SearchServer({"njuns$TicketWallEntry": wall_entries()}, delay=0.3)
+
+    async def hurried(client):
+        with deadline(0.05):
+            return await search(client, [Condition("ticket", Operator.EQ, "T1")], None)
+
+    async def patient(client):
+        await asyncio.sleep(0)
+        return await search(client, [Condition("ticket", Operator.EQ, "T2")], None)
+
+    async def main():
+        async with client_for(server.app) as client:
+            async with client.search_batcher():
+                # The hurried caller starts the batch, the merged request must not inherit its deadline
+                return await asyncio.gather(hurried(client), patient(client), return_exceptions=True)
+
+    hurried_result, patient_result = run(main())
+    assert isinstance(hurried_result, DeadlineExceeded)
+    assert len(patient_result) == 20
+
+
+def test_values_the_server_converts_are_not_merged():
+    for value in ("590", "2024-05-01", "01.05.2024", "true", "0F8FAD5B-D9CB-469F-A165-70867728950E", None):
+        assert not SearchBatcher.accepts([Condition("number", Operator.EQ, value)])
+    assert not SearchBatcher.accepts([Condition("number", Operator.IN, [590, "591"])])
+    assert SearchBatcher.accepts([Condition("ticket", Operator.IN, ["T1", "0f8fad5b-d9cb-469f-a165-70867728950e", 5, True])])
+
+
+def test_numeric_string_on_a_number_property_matches_like_unbatched():
+    searches = [([Condition("number", Operator.EQ, "590")], None), ([Condition("number", Operator.IN, ["5", "7"])], None)]
+    searches += [([Condition("ticket", Operator.EQ, "T1")], None)]
+    expected, found, _, batched = compare(searches)
+    assert [len(ids) for ids in expected] == [1, 2, 20]
+    assert found == expected
+    assert batched == 3
+
+
+def test_number_on_a_string_property_is_searched_alone():
+    rows = [{"id": f"C{i}", "_entityName": "njuns$Code", "code": str(i % 7), "number": i} for i in range(40)]
+    server = SearchServer({"njuns$Code": rows})
+    searches = [[Condition("code", Operator.EQ, 3)], [Condition("number", Operator.EQ, 10)]]
+
+    async def main():
+        async with client_for(server.app) as client:
+            expected = [[e.id for e in await client.search_entities("njuns$Code", c)] for c in searches]
+            del server.searches[:]
+            async with client.search_batcher():
+                found = await asyncio.gather(*(client.search_entities("njuns$Code", c) for c in searches))
+            return expected, [[e.id for e in entities] for entities in found]
+
+    expected, found = run(main())
+    assert len(expected[0]) == 6
+    assert found == expected
+    # The merged search, then the search whose rows hold strings where it compares a number
+    assert [len(s["filter"]["conditions"][0].get("conditions", [])) for s in server.searches] == [2, 0]
+
+
+def test_unsorted_searches_filling_their_limit_are_searched_alone():
+    searches = [[Condition("ticket", Operator.EQ, "T1")], [Condition("ticket", Operator.EQ, "T2")]]
+
+    async def main(sort, limits):
+        server = SearchServer({"njuns$TicketWallEntry": wall_entries()})
+        async with client_for(server.app) as client:
+            async with client.search_batcher():
+                await asyncio.gather(
+                    *(client.search_entities("njuns$TicketWallEntry", c, limit=l, sort=sort) for c, l in zip(searches, limits))
+                )
+            return len(server.searches)
+
+    # The first one fills its limit of 5 rows, the second one matches only 20 of its limit of 50
+    assert run(main(None, [5, 50])) == 2
+    assert run(main("-number", [5, 50])) == 1
@@ -0,0 +1,86 @@
+import gzip
+import json
+
+import pytest
+from aiohttp import web
+
+from njuns.exceptions import NotFound, ServerError
+from njuns.route import Route
+
+from helpers import client_for, run
+
+
+def gzipped(status: int, payload: dict) -> web.Response:
+    return web.Response(
+        status=status,
+        body=gzip.compress(json.dumps(payload).encode()),
+        headers={"Content-Encoding": "gzip", "Content-Type": "application/json"},
+    )
+
+
+def test_compressed_success_is_decoded():
+    async def handler(request: web.Request) -> web.Response:
+        assert "gzip" in request.headers["Accept-Encoding"]
+        return gzipped(200, {"id": "1", "description": "x" * 1000})
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/entity", handler)
+        async with client_for(app, compression=True) as client:
+            assert await client.request(Route("GET", "/entity")) == {"id": "1", "description": "x" * 1000}
+            stats = client.transfer_stats["/entity"]
+            assert stats.received < stats.received_uncompressed
+
+    run(main())
+
+
+def test_compressed_error_raises_matching_exception():
+    async def handler(request: web.Request) -> web.Response:
+        return gzipped(404, {"error": "Entity not found"})
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/entity", handler)
+        async with client_for(app, compression=True) as client:
+            with pytest.raises(NotFound) as caught:
+                await client.request(Route("GET", "/entity"))
+            assert "Entity not found" in caught.value.content
+
+    run(main())
+
+
+def test_compressed_server_error_is_not_retried_when_it_has_an_error_body():
+    calls = []
+
+    async def handler(request: web.Request) -> web.Response:
+        calls.append(request)
+        return gzipped(500, {"error": "Broken"})
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/entity", handler)
+        async with client_for(app, compression=True) as client:
+            with pytest.raises(ServerError) as caught:
+                await client.request(Route("GET", "/entity"))
+            assert "Broken" in caught.value.content
+
+    run(main())
+    assert len(calls) == 1
+
+
+def test_compressed_request_body():
+    received = []
+
+    async def handler(request: web.Request) -> web.Response:
+        received.append(request.headers.get("Content-Encoding"))
+        return web.json_response(await request.json())
+
+    async def main():
+        app = web.Application()
+        app.router.add_post("/echo", handler)
+        async with client_for(app, compression=True, compress_threshold=16) as client:
+            payload = {"text": "x" * 100}
+            assert await client.request(Route("POST", "/echo"), json=payload) == payload
+
+    run(main())
+    assert received == ["gzip"]
@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+from njuns.exceptions import DeadlineExceeded
+from njuns.timeouts import deadline
+
+from helpers import client_for, run
+
+
+def flaky_app(hits: list, responses: list, *, delay: float = 0.0) -> web.Application:
+    """Answers each request with the next of ``responses``, a status and a Retry-After header, then with a ticket."""
+
+    async def ticket(request: web.Request) -> web.Response:
+        hits.append(time.monotonic())
+        if delay:
+            await asyncio.sleep(delay)
+        if responses:
+            status, retry_after = responses.pop(0)
+            return web.json_response({}, status=status, headers={"Retry-After": str(retry_after)})
+        return web.json_response({"id": request.match_info["id"], "_entity_name": "njuns$Ticket"})
+
+    app = web.Application()
+    app.router.add_get("/entities/njuns$Ticket/{id}", ticket)
+    return app
+
+
+def test_per_call_timeout_bounds_a_slow_request():
+    hits = []
+
+    async def main():
+        async with client_for(flaky_app(hits, [], delay=1.0)) as client:
+            started = time.monotonic()
+            with pytest.raises(DeadlineExceeded):
+                await client.fetch_entity("njuns$Ticket", "T1", timeout=0.1)
+            return time.monotonic() - started
+
+    assert run(main()) < 0.5
+
+
+def test_retries_share_the_budget_of_the_call():
+    hits = []
+
+    async def main():
+        async with client_for(flaky_app(hits, [(429, 0.1), (429, 0.1)])) as client:
+            return await client.fetch_entity("njuns$Ticket", "T1", timeout=1.0)
+
+    assert run(main()).id == "T1"
+    assert len(hits) == 3
+
+    hits.clear()
+
+    async def hurried():
+        async with client_for(flaky_app(hits, [(429, 0.1), (429, 0.1)])) as client:
+            with pytest.raises(DeadlineExceeded):
+                await client.fetch_entity("njuns$Ticket", "T1", timeout=0.15)
+
+    run(hurried())
+    # The second retry would start after the deadline, so it is not sent
+    assert len(hits) == 2
+
+
+def test_backoff_longer_than_the_deadline_fails_right_away():
+    hits = []
+
+    async def main():
+        async with client_for(flaky_app(hits, [(500, 0)] * 5)) as client:
+            started = time.monotonic()
+            with pytest.raises(DeadlineExceeded):
+                await client.fetch_entity("njuns$Ticket", "T1", deadline=time.monotonic() + 0.5)
+            return time.monotonic() - started
+
+    # Server errors are retried after a second, which does not fit into the deadline
+    assert run(main()) < 0.3
+    assert len(hits) == 1
+
+
+def test_token_refresh_counts_against_the_deadline():
+    grants = []
+
+    async def token(request: web.Request) -> web.Response:
+        grants.append(request.query["grant_type"])
+        if request.query["grant_type"] == "refresh_token":
+            await asyncio.sleep(1.0)
+        # Expires right away, so the next request refreshes it first
+        return web.json_response({"access_token": "a", "refresh_token": "r", "expires_in": 0, "scope": "s"})
+
+    app = flaky_app([], [])
+    app.router.add_post("/oauth/token", token)
+
+    async def main():
+        async with client_for(app) as client:
+            await client._static_login(username="me", password="secret")
+            started = time.monotonic()
+            with deadline(0.1):
+                with pytest.raises(DeadlineExceeded):
+                    await client.fetch_entity("njuns$Ticket", "T1")
+            return time.monotonic() - started
+
+    assert run(main()) < 0.5
+    assert grants == ["password", "refresh_token"]
+
+
+def test_per_call_timeout_bounds_a_streamed_download():
+    async def slow_file(request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for _ in range(10):
+            await response.write(b"x" * 1024)
+            await asyncio.sleep(0.1)
+        return response
+
+    app = web.Application()
+    app.router.add_get("/files/{id}", slow_file)
+
+    async def main():
+        async with client_for(app) as client:
+            with pytest.raises(DeadlineExceeded):
+                async with client.open_file("F1", timeout=0.2) as chunks:
+                    async for _ in chunks:
+                        pass
+
+    run(main())
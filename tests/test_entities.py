@@ -0,0 +1,169 @@
+import asyncio
+import copy
+
+import pytest
+from aiohttp import web
+
+from njuns.exceptions import Conflict, ValidationError
+from njuns.models.entity import Entity
+from njuns.routes.entities import EntitySearchCondition, EntitySearchOperator
+
+from helpers import client_for, run
+
+ROWS = [{"id": f"T{i}", "status": "OPEN" if i % 4 else "CLOSED"} for i in range(10)]
+
+
+def app() -> web.Application:
+    """Sends the total count only when it is asked for the way the API documents it."""
+
+    async def fetch(request: web.Request) -> web.Response:
+        headers = {"X-Total-Count": str(len(ROWS))} if request.query.get("returnCount", "").lower() == "true" else {}
+        return web.json_response(ROWS[: int(request.query["limit"])], headers=headers)
+
+    async def search(request: web.Request) -> web.Response:
+        body = await request.json()
+        (condition,) = body["filter"]["conditions"]
+        rows = [r for r in ROWS if r[condition["property"]] == condition["value"]]
+        headers = {"X-Total-Count": str(len(rows))} if body.get("count") is True else {}
+        return web.json_response(rows[: body["limit"]], headers=headers)
+
+    application = web.Application()
+    application.router.add_get("/entities/{name}", fetch)
+    application.router.add_post("/entities/{name}/search", search)
+    return application
+
+
+def test_count_entities_asks_for_the_count():
+    async def main():
+        async with client_for(app()) as client:
+            assert await client.count_entities("njuns$Ticket") == 10
+            closed = [EntitySearchCondition("status", EntitySearchOperator.EQ, "CLOSED")]
+            assert await client.count_entities("njuns$Ticket", closed) == 3
+
+    run(main())
+
+
+class UpdateServer:
+    """Records entity updates and answers them like the API, bumping the version unless it is stale."""
+
+    def __init__(self, *, delay: float = 0.0) -> None:
+        self.delay: float = delay
+        self.version: int = 3
+        self.updates: list = []
+        self.app: web.Application = web.Application()
+        self.app.router.add_put("/entities/{name}/{id}", self.update)
+        self.app.router.add_get("/metadata/entities", self.metadata)
+
+    async def update(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.updates.append(body)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if "version" in body and body["version"] != self.version:
+            return web.json_response({"error": "Optimistic lock"}, status=409)
+        self.version += 1
+        return web.json_response({"id": request.match_info["id"], **body, "version": self.version})
+
+    async def metadata(self, request: web.Request) -> web.Response:
+        properties = [
+            {"name": "status", "attributeType": "DATATYPE", "type": "string"},
+            {"name": "priority", "attributeType": "DATATYPE", "type": "int"},
+            {"name": "version", "attributeType": "DATATYPE", "type": "int", "readOnly": True},
+        ]
+        return web.json_response([{"entityName": "njuns$Ticket", "properties": properties}])
+
+
+def loaded_ticket(version: int = 3) -> Entity:
+    return Entity(id="T1", _entity_name="njuns$Ticket", status="OPEN", priority=1, comment="long text", version=version)
+
+
+def test_update_without_changes_sends_nothing():
+    server = UpdateServer()
+
+    async def main():
+        async with client_for(server.app) as client:
+            ticket = loaded_ticket()
+            assert await client.update_entity("njuns$Ticket", entity=ticket) is ticket
+
+    run(main())
+    assert server.updates == []
+
+
+def test_update_sends_only_changed_fields_and_the_version():
+    server = UpdateServer()
+
+    async def main():
+        async with client_for(server.app) as client:
+            ticket = loaded_ticket()
+            ticket.status = "CLOSED"
+            await client.update_entity("njuns$Ticket", entity=ticket)
+            return ticket
+
+    ticket = run(main())
+    assert server.updates == [{"status": "CLOSED", "version": 3}]
+    assert ticket.version == 4 and not ticket.is_dirty
+
+
+def test_stale_version_raises_a_conflict_and_keeps_the_changes():
+    server = UpdateServer()
+
+    async def main():
+        async with client_for(server.app) as client:
+            ticket = loaded_ticket(version=2)
+            ticket.status = "CLOSED"
+            with pytest.raises(Conflict):
+                await client.update_entity("njuns$Ticket", entity=ticket)
+            return ticket
+
+    ticket = run(main())
+    assert ticket.changed == {"status"}
+
+
+def test_fields_assigned_during_the_update_stay_changed():
+    server = UpdateServer(delay=0.1)
+
+    async def main():
+        async with client_for(server.app) as client:
+            ticket = loaded_ticket()
+            ticket.status = "CLOSED"
+            ticket.priority = 2
+            update = asyncio.create_task(client.update_entity("njuns$Ticket", entity=ticket))
+            await asyncio.sleep(0.05)
+            ticket.status = "ON_HOLD"
+            await update
+            return ticket
+
+    ticket = run(main())
+    assert ticket.status == "ON_HOLD"
+    assert ticket.changed == {"status"}
+    assert ticket.priority == 2 and ticket.version == 4
+
+
+def test_changed_fields_are_validated_against_the_metadata():
+    server = UpdateServer()
+
+    async def main():
+        async with client_for(server.app) as client:
+            client.validate_requests = True
+            for field, value in (("statsu", "CLOSED"), ("priority", "high"), ("version", 9)):
+                ticket = loaded_ticket()
+                setattr(ticket, field, value)
+                with pytest.raises(ValidationError):
+                    await client.update_entity("njuns$Ticket", entity=ticket)
+            ticket = loaded_ticket()
+            ticket.priority = 2
+            await client.update_entity("njuns$Ticket", entity=ticket)
+
+    run(main())
+    assert server.updates == [{"priority": 2, "version": 3}]
+
+
+def test_copies_track_their_changes_separately():
+    ticket = loaded_ticket()
+    ticket.status = "CLOSED"
+    copied = copy.copy(ticket)
+    copied.mark_clean()
+    assert ticket.changed == {"status"}
+    copied.priority = 5
+    assert ticket.priority == 1 and ticket.changed == {"status"}
+    assert copied.changed == {"priority"}
@@ -0,0 +1,124 @@
+import random
+
+import pytest
+
+from njuns.models.entity_frame import EntityFrame, EntityFrameBuilder, _NULL_SAFE, _OPERATORS
+
+from helpers import client_for, run
+
+
+def frame() -> EntityFrame:
+    rng = random.Random(5)
+    records = []
+    for i in range(500):
+        record = {
+            "id": f"E{i}",
+            "number": rng.randint(0, 50),
+            "ratio": rng.random(),
+            "done": rng.random() < 0.5,
+            "ticket": {"id": f"T{i % 7}", "_entityName": "njuns$Ticket"},
+        }
+        if i % 3:
+            record["status"] = rng.choice(["OPEN", "CLOSED", "ON_HOLD"])
+        records.append(record)
+    return EntityFrame.from_records(records)
+
+
+def row_by_row(f: EntityFrame, name: str, op: str, value) -> list:
+    compare = _OPERATORS[op]
+    if op in ("in", "notin"):
+        value = set(value)
+    ids = []
+    for row in f:
+        v = row[name]
+        if (v is not None or op in _NULL_SAFE) and compare(v, value):
+            ids.append(row.id)
+    return ids
+
+
+@pytest.mark.parametrize(
+    "name, op, value",
+    [
+        ("number", "=", 7),
+        ("number", "<>", 7),
+        ("number", "<", 10),
+        ("number", "<=", 10),
+        ("number", ">", 40),
+        ("number", ">=", 40),
+        ("number", "in", [1, 2, 3]),
+        ("number", "notin", [1, 2, 3]),
+        ("ratio", ">", 0.5),
+        ("done", "=", True),
+        ("status", "=", "OPEN"),
+        ("status", "<>", "OPEN"),
+        ("status", "in", ["OPEN", "ON_HOLD"]),
+        ("status", "notin", ["OPEN"]),
+        ("status", "startsWith", "O"),
+        ("status", "notEmpty", None),
+    ],
+)
+def test_where_matches_row_by_row_evaluation(name, op, value):
+    f = frame()
+    assert [row.id for row in f.where(name, op, value)] == row_by_row(f, name, op, value)
+
+
+def test_group_by_reference_uses_the_id():
+    groups = frame().group_by("ticket")
+    assert list(groups) == [f"T{i}" for i in range(7)]
+    assert sum(len(g) for g in groups.values()) == 500
+    assert {row.ticket["id"] for row in groups["T3"]} == {"T3"}
+
+
+def test_fetch_frame_rejects_empty_pages():
+    async def main():
+        from aiohttp import web
+
+        async with client_for(web.Application()) as client:
+            with pytest.raises(ValueError):
+                await client.fetch_frame("njuns$Ticket", page_size=0)
+
+    run(main())
+
+
+def test_where_compares_references_by_id():
+    f = frame()
+    expected = [row.id for row in f if row.ticket["id"] in ("T1", "T2")]
+    assert [row.id for row in f.where("ticket", "in", ["T1", "T2"])] == expected
+    assert [row.id for row in f.where("ticket", "=", "T1")] == [row.id for row in f if row.ticket["id"] == "T1"]
+    assert len(f.where("ticket", "notin", ["T1", "T2"])) == len(f) - len(expected)
+    assert list(f.group_by("ticket")["T1"].column("id")) == list(f.where("ticket", "=", "T1").column("id"))
+
+
+def test_where_on_boolean_and_missing_values():
+    f = EntityFrame.from_records([{"id": "A", "done": True}, {"id": "B", "done": False}, {"id": "C"}, {"id": "D", "done": True}])
+    assert list(f.where("done", "=", True).column("id")) == ["A", "D"]
+    assert list(f.where("done", "<>", True).column("id")) == ["B", "C"]
+    assert list(f.where("done", "=", None).column("id")) == ["C"]
+    assert list(f.where("done", "notEmpty").column("id")) == ["A", "B", "D"]
+    assert list(f.where("done", "in", [False, None]).column("id")) == ["B", "C"]
+    packed = EntityFrame.from_records([{"done": True}, {"done": False}])
+    assert list(packed.where("done", "=", False).column("done")) == [0]
+
+
+@pytest.mark.parametrize(
+    "pages",
+    [
+        [[{"n": 1}, {"n": 2}], [{"n": 3}]],
+        [[{"n": 1}], [{"n": 2.5}]],
+        [[{"n": 1}], [{"n": 2 ** 70}]],
+        [[{"n": True}], [{"n": False}], [{"n": 1}]],
+        [[{"n": 1}], [{"m": "a"}], [{"n": 2, "m": "b"}]],
+        [[{"s": "x"}], [{"s": None}], []],
+    ],
+)
+def test_pages_are_packed_like_a_single_page(pages):
+    builder = EntityFrameBuilder()
+    for page in pages:
+        builder.extend(page)
+    paged = builder.build()
+    builder.extend([{**dict.fromkeys(k for p in pages for r in p for k in r), **r} for p in pages for r in p])
+    whole = builder.build()
+    assert len(paged) == len(whole)
+    for name in whole.columns:
+        assert type(paged.column(name)) is type(whole.column(name))
+        assert [row[name] for row in paged] == [row[name] for row in whole]
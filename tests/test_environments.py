@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from njuns import NJUNSClient
+from njuns.exceptions import DeadlineExceeded
+from njuns.route import Route
+
+from helpers import run, serve
+
+
+def environment_app(name: str, seen: list) -> web.Application:
+    """An API environment that records the users and requests it serves under ``name``."""
+
+    async def token(request: web.Request) -> web.Response:
+        seen.append((name, "token"))
+        return web.json_response({"access_token": name, "refresh_token": "r", "expires_in": 3600, "scope": "s"})
+
+    async def user_info(request: web.Request) -> web.Response:
+        seen.append((name, request.headers["Authorization"]))
+        await asyncio.sleep(0.01)
+        return web.json_response({"id": name, "login": name})
+
+    app = web.Application()
+    app.router.add_post("/oauth/token", token)
+    app.router.add_get("/userInfo", user_info)
+    return app
+
+
+def test_clients_of_different_environments_share_a_process():
+    seen = []
+
+    async def main():
+        async with serve(environment_app("uat", seen)) as uat_url, serve(environment_app("production", seen)) as production_url:
+            uat, production = NJUNSClient(base_url=uat_url), NJUNSClient(base_url=production_url)
+            try:
+                await asyncio.gather(uat.login(username="me", password="secret"), production.login(username="me", password="secret"))
+                users = await asyncio.gather(*(client.fetch_user_info() for client in (uat, production, uat, production)))
+                return [user.login for user in users], Route.BASE
+            finally:
+                await uat.close()
+                await production.close()
+
+    logins, default_base = run(main())
+    assert logins == ["uat", "production", "uat", "production"]
+    # Every request reached the environment of its client, with the token of that environment
+    assert sorted(set(seen)) == [("production", "Bearer production"), ("production", "token"), ("uat", "Bearer uat"), ("uat", "token")]
+    assert default_base == "https://njuns.com/app/rest/v2"
+
+
+def test_login_switches_to_uat_and_back(monkeypatch):
+    seen = []
+
+    async def main():
+        async with serve(environment_app("uat", seen)) as uat_url, serve(environment_app("production", seen)) as production_url:
+            monkeypatch.setattr("njuns.client.api_base_url", lambda **_: uat_url)
+            client = NJUNSClient(base_url=production_url)
+            try:
+                await client.login(username="me", password="secret", use_uat_environment=True)
+                on_uat = client.user_info.login
+                await client.login(username="me", password="secret")
+                return on_uat, client.user_info.login, client.base_url == production_url
+            finally:
+                await client.close()
+
+    assert run(main()) == ("uat", "production", True)
+
+
+def test_deadline_exceeded_names_the_client_environment():
+    async def main():
+        client = NJUNSClient(base_url="https://uat.example/app/rest/v2")
+        route = Route("GET", "/userInfo")
+        with pytest.raises(DeadlineExceeded) as raised:
+            await client.request(route, deadline=0)
+        return raised.value.route
+
+    assert str(run(main())) == "GET https://uat.example/app/rest/v2/userInfo"
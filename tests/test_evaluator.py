@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from njuns.evaluator import EntityIndex, compile_conditions, filter_entities
+from njuns.models.entity import Entity
+from njuns.models.entity_frame import EntityFrame
+from njuns.routes.entities import EntitySearchCondition as Condition, EntitySearchGroup as Group, EntitySearchOperator as Operator
+
+from helpers import _matches
+
+STATUSES = ["OPEN", "Open", "CLOSED", "on_hold", None]
+
+
+def tickets():
+    rng = random.Random(11)
+    rows = []
+    for i in range(300):
+        row = {"id": f"T{i}", "number": rng.randint(0, 40), "title": rng.choice(["Pole swap", "pole move", "Transfer", "Line drop"])}
+        status = rng.choice(STATUSES)
+        if status is not None:
+            row["status"] = status
+        if i % 5:
+            row["region"] = {"id": f"R{i % 4}", "_entity_name": "njuns$Region", "name": f"Region {i % 4}"}
+        rows.append(row)
+    return rows
+
+
+CONDITIONS = [
+    Condition("status", Operator.EQ, "OPEN"),
+    Condition("status", Operator.EQ, None),
+    Condition("status", Operator.LTGT, "OPEN"),
+    Condition("status", Operator.IN, ["OPEN", "CLOSED"]),
+    Condition("status", Operator.NOTIN, ["OPEN", "CLOSED"]),
+    Condition("status", Operator.NOTEMPTY, None),
+    Condition("status", Operator.STARTSWITH, "op"),
+    Condition("title", Operator.STARTSWITH, "POLE"),
+    Condition("title", Operator.ENDSWITH, "DROP"),
+    Condition("title", Operator.CONTAINS, "swap"),
+    Condition("number", Operator.EQ, 7),
+    Condition("number", Operator.EQ, "7"),
+    Condition("number", Operator.IN, [1, 2, 3]),
+    Condition("number", Operator.LT, 10),
+    Condition("number", Operator.LTEQ, 10),
+    Condition("number", Operator.GT, 30),
+    Condition("number", Operator.GTEQ, 30),
+    Condition("region", Operator.EQ, "R1"),
+    Condition("region", Operator.IN, ["R1", "R2"]),
+    Condition("region", Operator.NOTIN, ["R1"]),
+    Condition("region.id", Operator.EQ, "R3"),
+    Condition("region.name", Operator.STARTSWITH, "region 2"),
+    Condition(group=Group.OR, conditions=[Condition("status", Operator.EQ, "OPEN"), Condition("number", Operator.LT, 5)]),
+    Condition(group=Group.AND, conditions=[Condition("region", Operator.EQ, "R2"), Condition("title", Operator.CONTAINS, "pole")]),
+]
+
+
+@pytest.mark.parametrize("condition", CONDITIONS, ids=lambda c: repr(c.as_dict))
+def test_index_matches_a_scan(condition):
+    rows = tickets()
+    index = EntityIndex(rows, hash_on=("status", "number", "region"), sort_on=("title", "number", "region.name"))
+    expected = [row["id"] for row in rows if compile_conditions(condition)(row)]
+    assert [row["id"] for row in index.filter(condition)] == expected
+    assert index.count(condition) == len(expected)
+    assert [row["id"] for row in filter_entities(rows, [condition])] == expected
+
+
+@pytest.mark.parametrize("condition", CONDITIONS, ids=lambda c: repr(c.as_dict))
+def test_entities_and_frame_rows_match_like_json(condition):
+    rows = tickets()
+    predicate = compile_conditions(condition)
+    expected = [predicate(row) for row in rows]
+    assert [predicate(Entity(**row)) for row in rows] == expected
+    assert [predicate(row) for row in EntityFrame.from_records(rows)] == expected
+
+
+@pytest.mark.parametrize("condition", [c for c in CONDITIONS if c.value is not None and not c.group], ids=lambda c: repr(c.as_dict))
+def test_evaluation_agrees_with_the_search_endpoint(condition):
+    rows = [row for row in tickets() if condition.property.split(".")[0] in row]
+    predicate = compile_conditions(condition, sql_nulls=True)
+    assert [predicate(row) for row in rows] == [_matches(condition.as_dict, row) for row in rows]
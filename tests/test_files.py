@@ -0,0 +1,97 @@
+import os
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from helpers import client_for, run
+
+CONTENT = os.urandom(300 * 1024)
+
+
+def files_app(uploads: list) -> web.Application:
+    async def upload(request: web.Request) -> web.Response:
+        uploads.append((request.query["name"], await request.read()))
+        return web.json_response({"id": "f1", "name": request.query["name"], "size": len(uploads[-1][1])})
+
+    async def download(request: web.Request) -> web.StreamResponse:
+        return web.Response(body=CONTENT, content_type="application/octet-stream")
+
+    async def truncated(request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Length": str(len(CONTENT))})
+        await response.prepare(request)
+        await response.write(CONTENT[: len(CONTENT) // 2])
+        # Drop the connection halfway through the body
+        request.transport.close()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/files", upload)
+    app.router.add_get("/files/complete", download)
+    app.router.add_get("/files/truncated", truncated)
+    return app
+
+
+def test_upload_streams_the_file(tmp_path):
+    uploads = []
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(CONTENT)
+    progress = []
+
+    async def main():
+        async with client_for(files_app(uploads)) as client:
+            descriptor = await client.upload_file(path, chunk_size=64 * 1024, progress=lambda *a: progress.append(a))
+            assert descriptor.id == "f1"
+
+    run(main())
+    assert uploads == [("photo.jpg", CONTENT)]
+    assert progress[-1] == ("photo.jpg", len(CONTENT), len(CONTENT))
+
+
+def test_download_replaces_the_destination_when_complete(tmp_path):
+    destination = tmp_path / "photo.jpg"
+    destination.write_bytes(b"previous")
+
+    async def main():
+        async with client_for(files_app([])) as client:
+            return await client.download_file("complete", destination)
+
+    assert run(main()) == len(CONTENT)
+    assert destination.read_bytes() == CONTENT
+    assert os.listdir(tmp_path) == ["photo.jpg"]
+
+
+def test_failed_download_leaves_the_destination_untouched(tmp_path):
+    destination = tmp_path / "photo.jpg"
+    destination.write_bytes(b"previous")
+
+    async def main():
+        async with client_for(files_app([])) as client:
+            with pytest.raises(aiohttp.ClientPayloadError):
+                await client.download_file("truncated", destination)
+
+    run(main())
+    assert destination.read_bytes() == b"previous"
+    assert os.listdir(tmp_path) == ["photo.jpg"]
+
+
+def test_open_file_hands_back_its_slot_when_left_early():
+    async def main():
+        async with client_for(files_app([])) as client:
+            async with client.open_file("complete", chunk_size=1024) as chunks:
+                async for chunk in chunks:
+                    assert client.scheduler.in_flight == 1
+                    break
+            assert client.scheduler.in_flight == 0
+
+    run(main())
+
+
+def test_streamed_transfers_have_no_overall_time_limit():
+    async def main():
+        async with client_for(files_app([]), read_timeout=5) as client:
+            timeout = client._transfer_timeout()
+            assert timeout.total is None and timeout.sock_read == 5
+            assert client._transfer_timeout(10).total == 10
+
+    run(main())
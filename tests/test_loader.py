@@ -0,0 +1,72 @@
+import asyncio
+import uuid
+
+from njuns.exceptions import DeadlineExceeded
+from njuns.timeouts import deadline
+
+from helpers import SearchServer, client_for, run
+
+IDS = [str(uuid.UUID(int=0xABCDEF + i)) for i in range(5)]
+
+
+def tickets():
+    return [{"id": i, "_entity_name": "njuns$Ticket", "ticketNumber": str(n)} for n, i in enumerate(IDS)]
+
+
+def test_differently_written_ids_are_loaded_once():
+    server = SearchServer({"njuns$Ticket": tickets()})
+
+    async def main():
+        async with client_for(server.app) as client:
+            async with client.entity_loader():
+                return await asyncio.gather(
+                    client.fetch_entity("njuns$Ticket", IDS[0]),
+                    client.fetch_entity("njuns$Ticket", IDS[0].upper()),
+                    client.fetch_entity("njuns$Ticket", uuid.UUID(IDS[1])),
+                )
+
+    lower, upper, parsed = run(main())
+    assert lower.id == upper.id == IDS[0]
+    assert parsed.id == IDS[1]
+    assert len(server.searches) == 1
+    assert sorted(server.searches[0]["filter"]["conditions"][0]["value"]) == IDS[:2]
+
+
+def test_callers_get_their_own_entity():
+    server = SearchServer({"njuns$Ticket": tickets()})
+
+    async def main():
+        async with client_for(server.app) as client:
+            async with client.entity_loader():
+                first, second = await asyncio.gather(client.fetch_entity("njuns$Ticket", IDS[0]), client.fetch_entity("njuns$Ticket", IDS[0]))
+                first.ticketNumber = "changed"
+                third = await client.fetch_entity("njuns$Ticket", IDS[0])
+            return first, second, third
+
+    first, second, third = run(main())
+    assert first is not second
+    assert second.ticketNumber == third.ticketNumber == "0"
+    assert not second.is_dirty
+    assert len(server.searches) == 1
+
+
+def test_each_caller_keeps_its_own_deadline():
+    server = SearchServer({"njuns$Ticket": tickets()}, delay=0.3)
+
+    async def hurried(client):
+        with deadline(0.05):
+            return await client.fetch_entity("njuns$Ticket", IDS[0])
+
+    async def patient(client):
+        await asyncio.sleep(0)
+        return await client.fetch_entity("njuns$Ticket", IDS[1])
+
+    async def main():
+        async with client_for(server.app) as client:
+            async with client.entity_loader():
+                # The hurried caller starts the batch, the search must not inherit its deadline
+                return await asyncio.gather(hurried(client), patient(client), return_exceptions=True)
+
+    hurried_result, patient_result = run(main())
+    assert isinstance(hurried_result, DeadlineExceeded)
+    assert patient_result.id == IDS[1]
@@ -0,0 +1,40 @@
+import logging
+
+from njuns import NJUNSClient, setup_logging
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.closed = False
+
+    def emit(self, record: logging.LogRecord) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+        super().close()
+
+
+def njuns_handlers(logger: logging.Logger) -> list:
+    return [h for h in logger.handlers if getattr(h, "_njuns_handler", False)]
+
+
+def test_setup_logging_closes_the_replaced_handler():
+    logger = logging.getLogger("njuns")
+    first, second = RecordingHandler(), RecordingHandler()
+    try:
+        setup_logging(handler=first, root=False)
+        setup_logging(handler=second, root=False)
+        assert njuns_handlers(logger) == [second]
+        assert first.closed and not second.closed
+    finally:
+        for handler in njuns_handlers(logger):
+            logger.removeHandler(handler)
+            handler.close()
+
+
+def test_client_leaves_logging_alone_by_default():
+    before = list(logging.getLogger().handlers)
+    NJUNSClient()
+    assert logging.getLogger().handlers == before
@@ -0,0 +1,66 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from aiohttp import web
+
+from njuns.exceptions import ValidationError
+from njuns.metadata import MetadataCache
+
+from helpers import client_for, run
+
+ENTITIES = [
+    {
+        "entityName": f"njuns$Entity{i}",
+        "properties": [{"name": "id", "attributeType": "DATATYPE", "type": "uuid"}, {"name": "name", "attributeType": "DATATYPE", "type": "string"}],
+    }
+    for i in range(20)
+]
+
+
+def metadata_app() -> web.Application:
+    async def entities(request: web.Request) -> web.Response:
+        return web.json_response(ENTITIES)
+
+    async def views(request: web.Request) -> web.Response:
+        # Slow enough for the view loads of all entities to overlap
+        await asyncio.sleep(0.01)
+        name = request.match_info["name"]
+        return web.json_response([{"name": "detail", "entity": name, "properties": ["name"]}])
+
+    app = web.Application()
+    app.router.add_get("/metadata/entities", entities)
+    app.router.add_get("/metadata/entities/{name}/views", views)
+    return app
+
+
+def test_concurrent_view_loads_persist_every_view(tmp_path):
+    path = str(tmp_path / "metadata.json")
+
+    async def main():
+        async with client_for(metadata_app()) as client:
+            client.validate_requests = True
+            client.metadata_cache_path = path
+            await asyncio.gather(*(client._validate(e["entityName"], view="detail") for e in ENTITIES))
+            with pytest.raises(ValidationError):
+                await client._validate("njuns$Entity0", view="missing")
+
+    run(main())
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert sorted(saved["views"]) == sorted(e["entityName"] for e in ENTITIES)
+    assert [p for p in os.listdir(tmp_path) if p.endswith(".tmp")] == []
+
+
+def test_concurrent_saves_use_their_own_temporary_files(tmp_path):
+    cache = MetadataCache("http://localhost", path=str(tmp_path / "metadata.json"))
+    cache.set_entities(ENTITIES)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: cache.save(cache.snapshot()), range(64)))
+
+    reloaded = MetadataCache("http://localhost", path=str(tmp_path / "metadata.json"))
+    assert reloaded.load()
+    assert set(reloaded.entities) == {e["entityName"] for e in ENTITIES}
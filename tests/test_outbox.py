@@ -0,0 +1,139 @@
+import asyncio
+import time
+from collections import Counter
+
+from njuns.outbox import Outbox, OutboxStatus, SQLiteOutboxStore
+
+from helpers import run
+
+
+class CommentClient:
+    """Records the comments it is asked to post, taking ``delay`` seconds for each."""
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay: float = delay
+        self.posted: Counter = Counter()
+
+    async def post_comment_to_ticket(self, *, ticket_id, comment, file_descriptor_ids, flagged, priority):
+        await asyncio.sleep(self.delay)
+        self.posted[comment] += 1
+        return {"comment": comment}
+
+
+def test_claims_do_not_expire_while_waiting_for_a_slot(tmp_path):
+    client = CommentClient(delay=0.05)
+    store = SQLiteOutboxStore(tmp_path / "outbox.db")
+
+    async def main():
+        # 40 sequential sends take about 2 seconds, four times the lease
+        async with Outbox(client, store, concurrency=1, batch_size=5, lease=0.5, poll_interval=0.01) as outbox:
+            for i in range(40):
+                await outbox.post_comment(ticket_id=f"ticket-{i}", comment=f"comment {i}")
+            await outbox.flush()
+        return await outbox.counts()
+
+    counts = run(main())
+    assert counts[OutboxStatus.SENT] == 40
+    assert sum(client.posted.values()) == 40
+    assert set(client.posted.values()) == {1}
+
+
+def test_writes_of_a_ticket_are_sent_in_order(tmp_path):
+    client = CommentClient()
+    order = []
+    post = client.post_comment_to_ticket
+
+    async def recording(**kwargs):
+        order.append(kwargs["comment"])
+        return await post(**kwargs)
+
+    client.post_comment_to_ticket = recording
+
+    async def main():
+        async with Outbox(client, SQLiteOutboxStore(tmp_path / "outbox.db"), concurrency=4, poll_interval=0.01) as outbox:
+            for i in range(10):
+                await outbox.post_comment(ticket_id="ticket", comment=str(i))
+            await outbox.flush()
+
+    run(main())
+    assert order == [str(i) for i in range(10)]
+
+
+def test_stale_claim_cannot_overwrite_a_newer_claim(tmp_path):
+    store = SQLiteOutboxStore(tmp_path / "outbox.db")
+
+    async def main():
+        outbox = Outbox(CommentClient(), store)
+        await outbox.post_comment(ticket_id="ticket", comment="hello", key="k")
+
+    run(main())
+    stale, = store.claim(10, lease=0.01)
+    time.sleep(0.02)
+    current, = store.claim(10, lease=60)
+    assert current.seq == stale.seq
+
+    assert not store.fail(stale, "timed out", None)
+    assert not store.release(stale)
+    assert store.get("k").status == OutboxStatus.SENDING
+    assert store.complete(current, {"ok": True})
+    assert store.get("k").status == OutboxStatus.SENT
+    assert not store.complete(stale, {"ok": True})
+    assert store.get("k").attempts == 1
+
+
+class RejectingClient(CommentClient):
+    """Rejects the comments in ``rejected``, like a server refusing them, and records the order of the others."""
+
+    def __init__(self, rejected: set) -> None:
+        super().__init__()
+        self.rejected: set = rejected
+        self.order: list = []
+
+    async def post_comment_to_ticket(self, *, comment, **kwargs):
+        if comment in self.rejected:
+            raise ValueError(f"{comment} rejected")
+        self.order.append(comment)
+        return await super().post_comment_to_ticket(comment=comment, **kwargs)
+
+
+def test_failed_write_holds_back_its_ordering_key_until_resolved(tmp_path):
+    client = RejectingClient({"2"})
+
+    async def main():
+        async with Outbox(client, SQLiteOutboxStore(tmp_path / "outbox.db"), poll_interval=0.01) as outbox:
+            for i in range(1, 5):
+                await outbox.post_comment(ticket_id="ticket", comment=str(i), key=str(i))
+            await outbox.post_comment(ticket_id="other", comment="other")
+            await outbox.flush()
+            held = list(client.order), await outbox.counts()
+
+            assert await outbox.retry("3") is None
+            client.rejected.clear()
+            assert (await outbox.retry("2")).status is OutboxStatus.PENDING
+            await outbox.flush()
+            return held, await outbox.counts()
+
+    (order, counts), final = run(main())
+    assert order == ["1", "other"]
+    assert counts[OutboxStatus.FAILED] == 1 and counts[OutboxStatus.PENDING] == 2
+    assert client.order == ["1", "other", "2", "3", "4"]
+    assert final[OutboxStatus.SENT] == 5
+
+
+def test_discarded_write_releases_its_ordering_key(tmp_path):
+    client = RejectingClient({"2"})
+
+    async def main():
+        async with Outbox(client, SQLiteOutboxStore(tmp_path / "outbox.db"), poll_interval=0.01) as outbox:
+            for i in range(1, 5):
+                await outbox.post_comment(ticket_id="ticket", comment=str(i), key=str(i))
+            await outbox.flush()
+            assert not await outbox.discard("1")
+            assert await outbox.discard("2")
+            await outbox.flush()
+            return await outbox.status("2"), await outbox.counts()
+
+    status, counts = run(main())
+    assert status is None
+    assert client.order == ["1", "3", "4"]
+    assert counts[OutboxStatus.SENT] == 3 and counts[OutboxStatus.FAILED] == 0
@@ -0,0 +1,198 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from njuns.exceptions import ValidationError
+from njuns.models.entity import Entity
+from njuns.models.predefined_query import PredefinedQuery, QueryParameter
+from njuns.prepared_query import PreparedQuery, parameter_coercion
+
+from helpers import client_for, run
+
+TICKET_ID = "0f8fad5b-d9cb-469f-a165-70867728950e"
+
+
+class QueryServer:
+    """Serves the query catalog of ``njuns$Ticket`` and records every request."""
+
+    def __init__(self, *, delay: float = 0.0) -> None:
+        self.delay: float = delay
+        self.catalogs: int = 0
+        self.executions: list = []
+        self.names: list = ["ticketsByStatus"]
+        self.params: list = [{"name": "status", "type": "java.lang.String"}, {"name": "since", "type": "java.util.Date"}]
+        self.app: web.Application = web.Application()
+        self.app.router.add_get("/queries/{entity}", self.catalog)
+        self.app.router.add_get("/queries/{entity}/{query}", self.execute)
+
+    async def catalog(self, request: web.Request) -> web.Response:
+        if request.match_info["entity"] != "njuns$Ticket":
+            return web.json_response({"error": "Entity not found"}, status=404)
+        self.catalogs += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return web.json_response([{"name": name, "entityName": "njuns$Ticket", "params": self.params} for name in self.names])
+
+    async def execute(self, request: web.Request) -> web.Response:
+        self.executions.append((request.path, dict(request.query)))
+        return web.json_response([{"id": TICKET_ID, "_entityName": "njuns$Ticket", "status": request.query.get("status")}])
+
+
+def coerce(kind: str, value):
+    return parameter_coercion(QueryParameter(name="p", type=kind))(value)
+
+
+@pytest.mark.parametrize(
+    "kind, value, expected",
+    [
+        ("java.lang.Integer", 3, "3"),
+        ("java.lang.Long", 3.0, "3"),
+        ("long", Decimal("12"), "12"),
+        ("java.lang.Double", 2.5, "2.5"),
+        ("java.lang.Boolean", True, "true"),
+        ("boolean", "FALSE", "false"),
+        ("java.util.Date", datetime(2024, 5, 1, 13, 4, 5, 678900), "2024-05-01 13:04:05.678"),
+        ("java.util.Date", date(2024, 5, 1), "2024-05-01 00:00:00.000"),
+        ("java.time.LocalDate", datetime(2024, 5, 1, 13, 4), "2024-05-01"),
+        ("java.time.LocalTime", time(8, 30), "08:30:00"),
+        ("java.util.UUID", UUID(TICKET_ID), TICKET_ID),
+        ("com.njuns.entity.Ticket", Entity(id=TICKET_ID, _entity_name="njuns$Ticket"), TICKET_ID),
+        ("com.njuns.entity.Ticket", {"id": TICKET_ID}, TICKET_ID),
+        ("java.lang.String[]", ["a", "b"], '["a", "b"]'),
+    ],
+)
+def test_coercions_convert_values_of_the_declared_type(kind, value, expected):
+    assert coerce(kind, value) == expected
+
+
+@pytest.mark.parametrize(
+    "kind, value",
+    [
+        ("java.lang.Integer", 3.5),
+        ("java.lang.Long", Decimal("3.5")),
+        ("java.lang.Long", float("inf")),
+        ("java.lang.Long", Decimal("Infinity")),
+        ("java.lang.Integer", "3.5"),
+        ("java.lang.Integer", True),
+        ("java.lang.Double", "NaN"),
+        ("java.lang.Boolean", "yes"),
+        ("java.lang.Boolean", 1),
+        ("java.util.Date", 20240501),
+        ("java.time.LocalDate", 20240501),
+        ("java.util.UUID", "not-a-uuid"),
+        ("com.njuns.entity.Ticket", Entity(_entity_name="njuns$Ticket")),
+        ("com.njuns.entity.Ticket", {"status": "OPEN"}),
+        ("java.lang.String", 5),
+        ("java.lang.String[]", "a"),
+    ],
+)
+def test_values_of_another_type_are_rejected_by_bind(kind, value):
+    query = PreparedQuery(None, PredefinedQuery(name="q", params=[{"name": "p", "type": kind}]), "njuns$Ticket")
+    with pytest.raises(ValidationError, match="'p'"):
+        query.bind({"p": value})
+
+
+def test_bind_rejects_missing_unknown_and_non_mapping_parameters():
+    query = PreparedQuery(None, PredefinedQuery(name="q", params=[{"name": "p", "type": "string"}]), "njuns$Ticket")
+    for params in ({}, {"p": "a", "q": "b"}, [("p", "a")]):
+        with pytest.raises(ValidationError):
+            query.bind(params)
+
+
+def test_unknown_queries_and_entities_raise_validation_errors():
+    server = QueryServer()
+
+    async def main():
+        async with client_for(server.app) as client:
+            with pytest.raises(ValidationError, match="ticketsByStatus"):
+                await client.prepare_query("njuns$Ticket", "ticketsByStatu")
+            with pytest.raises(ValidationError, match="njuns\\$Tikcet"):
+                await client.prepare_query("njuns$Tikcet", "ticketsByStatus")
+
+    run(main())
+    assert server.executions == []
+
+
+def test_prepared_query_is_reused_until_the_catalog_changes():
+    server = QueryServer()
+
+    async def main():
+        async with client_for(server.app) as client:
+            first = await client.prepare_query("njuns$Ticket", "ticketsByStatus")
+            assert await client.prepare_query("njuns$Ticket", "ticketsByStatus") is first
+            for status in ("OPEN", "CLOSED"):
+                await client.execute_query("njuns$Ticket", "ticketsByStatus", {"status": status, "since": date(2024, 5, 1)})
+            await client.fetch_query_catalog("njuns$Ticket", refresh=True)
+            return first, await client.prepare_query("njuns$Ticket", "ticketsByStatus")
+
+    first, second = run(main())
+    assert second is not first
+    assert server.catalogs == 2
+    assert [path for path, _ in server.executions] == ["/queries/njuns$Ticket/ticketsByStatus"] * 2
+    assert [query["status"] for _, query in server.executions] == ["OPEN", "CLOSED"]
+    assert server.executions[0][1]["since"] == "2024-05-01 00:00:00.000"
+
+
+def test_query_catalog_is_reused_until_it_expires():
+    server = QueryServer()
+
+    async def main():
+        async with client_for(server.app) as client:
+            client.query_catalog_ttl = 0.2
+            await client.fetch_query_catalog("njuns$Ticket")
+            await client.fetch_query_catalog("njuns$Ticket")
+            cached = server.catalogs
+            await asyncio.sleep(0.25)
+            await client.fetch_query_catalog("njuns$Ticket")
+            return cached
+
+    assert run(main()) == 1
+    assert server.catalogs == 2
+
+
+def test_concurrent_first_use_fetches_the_catalog_once():
+    server = QueryServer(delay=0.05)
+
+    async def main():
+        async with client_for(server.app) as client:
+            return await asyncio.gather(*(client.fetch_query_catalog("njuns$Ticket") for _ in range(10)))
+
+    catalogs = run(main())
+    assert server.catalogs == 1
+    assert all(catalog is catalogs[0] for catalog in catalogs)
+
+
+def test_queries_added_on_the_server_are_found_after_the_ttl():
+    server = QueryServer()
+
+    async def main():
+        async with client_for(server.app) as client:
+            client.query_catalog_ttl = 0.2
+            await client.execute_query("njuns$Ticket", "ticketsByStatus", {"status": "OPEN", "since": "2024-05-01 00:00:00.000"})
+            server.names.append("openTickets")
+            with pytest.raises(ValidationError):
+                await client.prepare_query("njuns$Ticket", "openTickets")
+            await asyncio.sleep(0.25)
+            return await client.prepare_query("njuns$Ticket", "openTickets")
+
+    assert run(main()).name == "openTickets"
+    assert server.catalogs == 2
+
+
+def test_unknown_query_name_is_rejected_without_a_request():
+    server = QueryServer()
+
+    async def main():
+        async with client_for(server.app) as client:
+            await client.fetch_query_catalog("njuns$Ticket")
+            with pytest.raises(ValidationError, match="expected one of: ticketsByStatus"):
+                await client.execute_query("njuns$Ticket", "ticketsByStatu", {"status": "OPEN"})
+
+    run(main())
+    assert server.catalogs == 1
+    assert server.executions == []
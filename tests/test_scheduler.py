@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+from njuns.ratelimit import LocalRateLimiter
+from njuns.route import Route
+from njuns.scheduler import Priority, RequestScheduler
+
+from helpers import client_for, run
+
+
+def test_interactive_requests_overtake_background_backlog():
+    async def main():
+        scheduler = RequestScheduler(max_concurrency=1)
+        order = []
+
+        async def request(name, priority):
+            async with scheduler.slot("/entities", priority):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        await scheduler.acquire("/entities")
+        tasks = [asyncio.create_task(request(f"background {i}", Priority.BACKGROUND)) for i in range(5)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("interactive", Priority.INTERACTIVE)))
+        await asyncio.sleep(0)
+        scheduler.release("/entities")
+        await asyncio.gather(*tasks)
+        return order
+
+    order = run(main())
+    assert order[0] == "interactive"
+    assert order[1:] == [f"background {i}" for i in range(5)]
+
+
+def test_background_backlog_is_not_starved():
+    async def main():
+        scheduler = RequestScheduler(max_concurrency=1)
+        order = []
+
+        async def request(name, priority):
+            async with scheduler.slot("/entities", priority):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        await scheduler.acquire("/entities")
+        tasks = [asyncio.create_task(request("background", Priority.BACKGROUND))]
+        tasks += [asyncio.create_task(request("interactive", Priority.INTERACTIVE)) for _ in range(40)]
+        await asyncio.sleep(0)
+        scheduler.release("/entities")
+        await asyncio.gather(*tasks)
+        return order
+
+    order = run(main())
+    assert order.index("background") < 20
+
+
+def test_route_limits_cap_a_route_without_blocking_others():
+    async def main():
+        scheduler = RequestScheduler(max_concurrency=4, route_limits={"/files": 1})
+        await scheduler.acquire("/files/upload")
+        other = asyncio.create_task(scheduler.acquire("/entities"))
+        capped = asyncio.create_task(scheduler.acquire("/files/download"))
+        await asyncio.sleep(0)
+        assert other.done() and not capped.done()
+        scheduler.release("/files/upload")
+        await asyncio.sleep(0)
+        assert capped.done()
+
+    run(main())
+
+
+def test_retries_hand_back_their_slot_while_backing_off():
+    attempts = []
+
+    async def flaky(request: web.Request) -> web.Response:
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            return web.Response(status=502, text="Bad gateway")
+        return web.json_response({"ok": True})
+
+    async def fast(request: web.Request) -> web.Response:
+        return web.json_response({"ok": True})
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/flaky", flaky)
+        app.router.add_get("/fast", fast)
+        async with client_for(app, max_concurrency=1) as client:
+            background = asyncio.create_task(client.request(Route("GET", "/flaky"), priority=Priority.BACKGROUND))
+            while not attempts:
+                await asyncio.sleep(0.01)
+            started = time.monotonic()
+            assert await client.request(Route("GET", "/fast"), priority=Priority.INTERACTIVE) == {"ok": True}
+            waited = time.monotonic() - started
+            assert await background == {"ok": True}
+        return waited
+
+    # The first retry of the background request waits one second
+    assert run(main()) < 0.5
+    assert len(attempts) == 2
+
+
+def test_requests_held_back_by_the_rate_limiter_do_not_hold_a_slot():
+    async def ok(request: web.Request) -> web.Response:
+        return web.json_response({"ok": True})
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/ok", ok)
+        async with client_for(app, max_concurrency=1, rate_limiter=LocalRateLimiter(2, burst=1)) as client:
+            await client.request(Route("GET", "/ok"))
+            waiting = asyncio.create_task(client.request(Route("GET", "/ok"), priority=Priority.BACKGROUND))
+            await asyncio.sleep(0.1)
+            assert not waiting.done()
+            assert client.scheduler.in_flight == 0
+            assert await waiting == {"ok": True}
+
+    run(main())
+
+
+def test_weights_must_be_positive():
+    for weight in (0, -1):
+        with pytest.raises(ValueError, match="BACKGROUND"):
+            RequestScheduler(weights={Priority.BACKGROUND: weight})
+    assert RequestScheduler(weights={Priority.BACKGROUND: 0.5}).weights[Priority.BACKGROUND] == 0.5
@@ -0,0 +1,146 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from aiohttp import web
+
+from njuns.exceptions import HTTPException
+from njuns.http import HTTPClient
+from njuns.token_store import FileTokenStore, SQLiteTokenStore, StoredToken
+
+from helpers import run, serve
+
+
+def token_app(grants: list) -> web.Application:
+    async def token(request: web.Request) -> web.Response:
+        grants.append(request.query["grant_type"])
+        await asyncio.sleep(0.05)
+        return web.json_response({"access_token": f"a{len(grants)}", "refresh_token": "r", "expires_in": 3600, "scope": "s"})
+
+    async def user_info(request: web.Request) -> web.Response:
+        return web.json_response({"id": "u", "login": "me"})
+
+    app = web.Application()
+    app.router.add_post("/oauth/token", token)
+    app.router.add_get("/userInfo", user_info)
+    return app
+
+
+def test_clients_of_one_process_share_a_login_without_exhausting_the_executor(tmp_path):
+    grants = []
+    store = FileTokenStore(tmp_path / "tokens.json")
+
+    async def login(url):
+        client = HTTPClient(base_url=url, token_store=store)
+        try:
+            await client._stored_login(username="me", password="secret")
+            return client._current_token().access_token
+        finally:
+            await client.close()
+
+    async def main():
+        # Fewer executor threads than clients waiting for the store lock
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=2))
+        async with serve(token_app(grants)) as url:
+            return await asyncio.wait_for(asyncio.gather(*(login(url) for _ in range(8))), 10)
+
+    tokens = run(main())
+    assert grants == ["password"]
+    assert set(tokens) == {"a1"}
+
+
+def test_stores_round_trip_tokens(tmp_path):
+    token = StoredToken(access_token="a", refresh_token="r", expires_at=123.0, scope="s", user_info={"id": "u"})
+    for store in (FileTokenStore(tmp_path / "tokens.json"), SQLiteTokenStore(tmp_path / "tokens.db")):
+        with store.lock():
+            store.save("key", token)
+        assert store.load("key").as_dict == token.as_dict
+        store.delete("key")
+        assert store.load("key") is None
+
+
+def revoking_app(grants: list, valid: set) -> web.Application:
+    """Accepts only the access tokens in ``valid``, like a server that revoked or lost every other session."""
+
+    async def token(request: web.Request) -> web.Response:
+        grants.append(request.query["grant_type"])
+        if request.query["grant_type"] == "refresh_token" and request.query["refresh_token"] not in {f"r{t}" for t in valid}:
+            return web.json_response({"error": "invalid_grant"}, status=400)
+        access_token = f"a{len(grants)}"
+        valid.add(access_token)
+        return web.json_response({"access_token": access_token, "refresh_token": f"r{access_token}", "expires_in": 3600, "scope": "s"})
+
+    async def user_info(request: web.Request) -> web.Response:
+        if request.headers.get("Authorization", "")[len("Bearer "):] not in valid:
+            return web.json_response({"error": "invalid_token"}, status=401)
+        return web.json_response({"id": "u", "login": "me"})
+
+    app = web.Application()
+    app.router.add_post("/oauth/token", token)
+    app.router.add_get("/userInfo", user_info)
+    return app
+
+
+def test_rejected_stored_token_is_replaced_once(tmp_path):
+    grants, valid = [], set()
+    store = FileTokenStore(tmp_path / "tokens.json")
+
+    async def main():
+        async with serve(revoking_app(grants, valid)) as url:
+            with store.lock():
+                store.save(f"{url}|me", StoredToken(access_token="lost", refresh_token="rlost", expires_at=time.time() + 3600, user_info={"id": "u"}))
+            client = HTTPClient(base_url=url, token_store=store)
+            try:
+                await client._stored_login(username="me", password="secret")
+                assert grants == []
+                user = await client.fetch_user_info()
+                return user, store.load(f"{url}|me")
+            finally:
+                await client.close()
+
+    user, stored = run(main())
+    assert user.login == "me"
+    assert grants == ["refresh_token", "password"]
+    assert stored.access_token == "a2"
+
+
+def test_token_replaced_by_another_client_is_adopted(tmp_path):
+    grants, valid = [], set()
+    store = FileTokenStore(tmp_path / "tokens.json")
+
+    async def main():
+        async with serve(revoking_app(grants, valid)) as url:
+            with store.lock():
+                store.save(f"{url}|me", StoredToken(access_token="lost", refresh_token="rlost", expires_at=time.time() + 3600, user_info={"id": "u"}))
+            first, second = HTTPClient(base_url=url, token_store=store), HTTPClient(base_url=url, token_store=store)
+            try:
+                await first._stored_login(username="me", password="secret")
+                await second._stored_login(username="me", password="secret")
+                await first.fetch_user_info()
+                await second.fetch_user_info()
+                return first._current_token().access_token, second._current_token().access_token
+            finally:
+                await first.close()
+                await second.close()
+
+    assert run(main()) == ("a2", "a2")
+    assert grants == ["refresh_token", "password"]
+
+
+def test_rejected_token_without_a_store_still_raises():
+    grants, valid = [], set()
+
+    async def main():
+        async with serve(revoking_app(grants, valid)) as url:
+            client = HTTPClient(base_url=url)
+            try:
+                await client._static_login(username="me", password="secret")
+                valid.clear()
+                with pytest.raises(HTTPException):
+                    await client.fetch_user_info()
+            finally:
+                await client.close()
+
+    run(main())
+    assert grants == ["password"]